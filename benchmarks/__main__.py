@@ -0,0 +1,61 @@
+import argparse
+import sys
+
+from .harness import DEFAULT_TOLERANCE, find_regressions, format_table, load_results, save_results
+
+TOOL_COLUMNS = ["best_ms", "median_ms", "calls_per_round"]
+PIPELINE_COLUMNS = ["n", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "llm_calls_per_request", "cache_hits_per_request",
+                    "tokens_per_request"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the agent pipeline and tools.")
+    parser.add_argument("suite", nargs="?", choices=["tools", "pipeline", "all"], default="all")
+    parser.add_argument("--filter", help="only tool benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per tool benchmark")
+    parser.add_argument("--iterations", type=int, default=20, help="requests per console and agent scenario")
+    parser.add_argument("--requests", type=int, default=200, help="requests sent to the async runtime")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent requests in the async runtime")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random mock LLM latency in seconds")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the completion cache between console requests")
+    parser.add_argument("--trace-sample-rate", type=float,
+                        help="trace this share of pipeline requests into memory, to measure tracing overhead")
+    parser.add_argument("--save", metavar="PATH", help="write the results as JSON (e.g. a baseline)")
+    parser.add_argument("--compare", metavar="PATH", help="fail if results regress against this baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, 0.25 = 25%%")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = {}
+
+    if args.suite in ("tools", "all"):
+        from .bench_tools import run_tool_benchmarks
+        tool_results = run_tool_benchmarks(args.filter, args.repeat)
+        print(format_table(tool_results, TOOL_COLUMNS), end="\n\n")
+        results.update(tool_results)
+
+    if args.suite in ("pipeline", "all"):
+        from .bench_pipeline import run_pipeline_benchmarks
+        pipeline_results = run_pipeline_benchmarks(
+            args.iterations, args.requests, args.concurrency, args.latency, args.jitter, args.warm_cache,
+            args.trace_sample_rate,
+        )
+        print(format_table(pipeline_results, PIPELINE_COLUMNS), end="\n\n")
+        results.update(pipeline_results)
+
+    if args.save:
+        save_results(results, args.save)
+    if args.compare:
+        regressions = find_regressions(results, load_results(args.compare), args.tolerance)
+        if regressions:
+            print("Performance regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print("No performance regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
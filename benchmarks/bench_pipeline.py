@@ -0,0 +1,193 @@
+import asyncio
+import atexit
+import builtins
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+
+from my_agents.llm_client import LLMCallCounter
+from my_agents.router import classify_locally
+from my_agents.tracing import InMemoryExporter, configure_tracing
+from .harness import latency_stats
+from .mock_openai import MockOpenAIServer, MockSettings, Rule
+
+MODEL = "mock-model"
+
+# Scripted replies for the stages that call the LLM with functions
+SCRIPT = [
+    Rule("submit_projects", {"projects": [
+        {"name": "Alpha", "initial_investment": 10_000, "periods": 5, "base_income": 3_000},
+        {"name": "Beta", "initial_investment": 15_000, "periods": 8, "base_income": 2_800, "growth_rate": 0.03,
+         "unexpected_costs": {"4": 2_000}},
+    ]}),
+    Rule("submit_debts", {"debts": [
+        {"name": "Visa", "balance": 3_000, "apr": 0.199, "minimum_payment": 90},
+        {"name": "Car loan", "balance": 8_000, "apr": 0.05, "minimum_payment": 200},
+    ]}),
+    Rule("spend__budget_tracker", {"spent": 1_850, "budget": 2_000}, match="money goes"),
+    Rule("investment__investment_return_calculator", {"initial": 10_000, "final": 12_400}, match="savings grew"),
+    Rule("budget_tracker", {"spent": 1_850, "budget": 2_000}, content="The user wants to know where they stand."),
+]
+
+# (name, message) pairs sent through the console's route_input
+SCENARIOS = [
+    ("expense", "netflix 12.99"),
+    ("budget", "am I over budget? I spent 450 and my budget is 500"),
+    ("portfolio", "my portfolio returns were 5, -2, 7.5"),
+    ("project_npv", "What is the NPV of projects Alpha and Beta at an 8% discount rate?"),
+    ("debt_payoff", "Plan my debt payoff: visa 3000 at 19.9% with minimum 90, car loan 8000 at 5% with "
+                    "minimum 200, I can pay 300 extra per month"),
+    ("llm_routed", "I am not sure where my money goes, can you check?"),
+    ("compound", "starbucks 4.50 and my portfolio returns were 5, -2, 7"),
+]
+
+# (agent, message, decision) handled by one agent directly; None lets the agent reason with the LLM
+AGENT_SCENARIOS = [
+    ("spend", "netflix 12.99", "local"),
+    ("spend", "help me understand my spending this month", None),
+    ("investment", "my savings grew from 10000 to 12400, what is my return on investment?", "local"),
+    ("project", "What is the NPV of projects Alpha and Beta at an 8% discount rate?", "local"),
+]
+
+
+def _refuse_input(prompt: str = ""):
+    raise RuntimeError(f"benchmark scenario asked for console input: {prompt!r}")
+
+
+@contextmanager
+def portal_environment(server: MockOpenAIServer, directory: str):
+    """Point the portal at the mock server and keep its files in `directory`.
+
+    Console input is refused and the agents' console output discarded.
+    """
+    overrides = {
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_MODEL": MODEL,
+        "SESSION_DB_PATH": os.path.join(directory, "sessions.sqlite3"),
+        "MERCHANT_INDEX_PATH": os.path.join(directory, "merchants.sqlite3"),
+        "LEDGER_DIR": os.path.join(directory, "ledger"),
+    }
+    saved = {name: os.environ.get(name) for name in list(overrides) + ["COMPLETION_CACHE_PATH"]}
+    os.environ.update(overrides)
+    os.environ.pop("COMPLETION_CACHE_PATH", None)
+    original_input, builtins.input = builtins.input, _refuse_input
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            yield
+    finally:
+        builtins.input = original_input
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _summarize(latencies: list, llm_calls: list, cache_hits: list, tokens: list, elapsed: float) -> dict:
+    return {
+        **latency_stats(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "llm_calls_per_request": sum(llm_calls) / len(llm_calls),
+        "cache_hits_per_request": sum(cache_hits) / len(cache_hits),
+        "tokens_per_request": sum(tokens) / len(tokens),
+    }
+
+
+def bench_console(portal, iterations: int, warm_cache: bool = False) -> dict:
+    """Drive main.route_input once per scenario per iteration, sequentially like the console does."""
+    results = {}
+    for name, message in SCENARIOS:
+        latencies, calls, hits, tokens = [], [], [], []
+        started = time.perf_counter()
+        for i in range(iterations):
+            if not warm_cache:
+                portal.completion_cache.clear()
+            with portal.session_store.activate(f"bench-console-{i}"), LLMCallCounter() as counter:
+                start = time.perf_counter()
+                portal.route_input(message)
+                latencies.append(time.perf_counter() - start)
+            calls.append(counter.calls)
+            hits.append(counter.cache_hits)
+            tokens.append(counter.prompt_tokens + counter.completion_tokens)
+        results[f"console:{name}"] = _summarize(latencies, calls, hits, tokens, time.perf_counter() - started)
+    return results
+
+
+def bench_agents(portal, iterations: int) -> dict:
+    """Call each agent's handle() directly, with the local router's decision or none at all."""
+    results = {}
+    for agent_key, message, decision in AGENT_SCENARIOS:
+        latencies, calls, hits, tokens = [], [], [], []
+        started = time.perf_counter()
+        for i in range(iterations):
+            portal.completion_cache.clear()
+            routed = classify_locally(message) if decision == "local" else None
+            with portal.session_store.activate(f"bench-agent-{i}"), LLMCallCounter() as counter:
+                start = time.perf_counter()
+                portal.agents[agent_key].handle(message, routed)
+                latencies.append(time.perf_counter() - start)
+            calls.append(counter.calls)
+            hits.append(counter.cache_hits)
+            tokens.append(counter.prompt_tokens + counter.completion_tokens)
+        label = "routed" if decision else "reasoned"
+        results[f"agent:{agent_key}:{label}"] = _summarize(latencies, calls, hits, tokens, time.perf_counter() - started)
+    return results
+
+
+async def _bench_runtime(server: MockOpenAIServer, session_store, requests: int, concurrency: int) -> dict:
+    from openai import AsyncOpenAI
+    from my_agents.completion_cache import AsyncCachedClient, CompletionCache
+    from my_agents.runtime import AgentRuntime
+
+    client = AsyncCachedClient(AsyncOpenAI(base_url=server.base_url, api_key="mock"), CompletionCache())
+    runtime = AgentRuntime(client, MODEL, session_store, max_concurrency=concurrency)
+    messages = [SCENARIOS[i % len(SCENARIOS)][1] for i in range(requests)]
+
+    async def timed(i: int, message: str):
+        start = time.perf_counter()
+        result = await runtime.handle(message, session_id=f"bench-runtime-{i}")
+        return time.perf_counter() - start, result
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(timed(i, message) for i, message in enumerate(messages)))
+    elapsed = time.perf_counter() - started
+    return {
+        **_summarize(
+            [latency for latency, _ in outcomes],
+            [result["llm_calls"] for _, result in outcomes],
+            [result["cache_hits"] for _, result in outcomes],
+            [result["prompt_tokens"] + result["completion_tokens"] for _, result in outcomes],
+            elapsed,
+        ),
+        "timeouts": sum(result["status"] != "ok" for _, result in outcomes),
+    }
+
+
+def run_pipeline_benchmarks(iterations: int = 20, runtime_requests: int = 200, concurrency: int = 32,
+                            latency: float = 0.05, jitter: float = 0.0, warm_cache: bool = False,
+                            trace_sample_rate: float = None) -> dict:
+    """Run the console, per-agent and async runtime benchmarks against a fresh mock server.
+
+    With `trace_sample_rate`, requests are traced into an in-memory exporter
+    at that rate; compare against an untraced run to see the tracing overhead.
+    """
+    settings = MockSettings(latency=latency, jitter=jitter, rules=SCRIPT)
+    # The portal flushes its stores at exit, so the directory is removed after that (atexit runs in reverse)
+    directory = tempfile.mkdtemp(prefix="bench-portal-")
+    atexit.register(shutil.rmtree, directory, True)
+    with MockOpenAIServer(settings) as server, portal_environment(server, directory):
+        # (Re)build main's client and stores for this server and directory
+        portal = importlib.reload(sys.modules["main"]) if "main" in sys.modules else importlib.import_module("main")
+        if trace_sample_rate is not None:
+            configure_tracing(InMemoryExporter(), trace_sample_rate)
+        results = bench_console(portal, iterations, warm_cache)
+        results.update(bench_agents(portal, iterations))
+        results[f"runtime[{runtime_requests} requests, concurrency {concurrency}]"] = asyncio.run(
+            _bench_runtime(server, portal.session_store, runtime_requests, concurrency)
+        )
+    return results
@@ -0,0 +1,129 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from tools.bill_reminder import BillScheduler
+from tools.cash_flow_forecast import forecast_cash_flow
+from tools.debt_optimizer import payoff_plan, sweep_extra_payments
+from tools.expense_classifier import ExpenseClassifier, classify_expense
+from tools.portfolio_analyzer import analyze_holdings
+from tools.project_evaluator import build_cash_flows, calculate_project_npv, evaluate_projects_batch
+from tools.project_simulator import simulate_project_npv
+from tools.rebalancer import rebalance_accounts
+from tools.transaction_ledger import TransactionLedger
+from my_agents.tracing import InMemoryExporter, Tracer
+from .harness import time_call
+
+MERCHANTS = ["uber trip", "netflix.com", "whole foods market", "shell gas", "amazon marketplace", "city water utility",
+             "cinema city", "delta air lines", "corner bakery", "comcast internet"]
+
+
+def _project(periods: int, rng) -> dict:
+    return {
+        "name": "Project",
+        "initial_investment": 250_000.0,
+        "periods": periods,
+        "base_income": 4_000.0,
+        "growth_rate": 0.002,
+        "expenses": 1_200.0,
+        "unexpected_costs": {str(period): 15_000.0 for period in rng.choice(np.arange(1, periods + 1), 12, replace=False)},
+    }
+
+
+def _debts(n: int, rng) -> list:
+    return [
+        {"name": f"Debt {i}", "balance": float(rng.uniform(500, 25_000)), "apr": float(rng.uniform(0.02, 0.29)),
+         "minimum_payment": float(rng.uniform(25, 400))}
+        for i in range(n)
+    ]
+
+
+def _price_history(days: int, holdings: int, rng) -> dict:
+    returns = rng.normal(0.0003, 0.012, (days, holdings))
+    prices = 100 * np.cumprod(1 + returns, axis=0)
+    prices[rng.random(prices.shape) < 0.02] = np.nan  # missing quotes
+    units = np.cumsum(rng.poisson(0.05, (days, holdings)), axis=0).astype(float)
+    dates = np.datetime64("2015-01-02") + np.arange(days)
+    return {"prices": prices, "units": units, "dates": dates, "benchmark": 100 * np.cumprod(1 + returns.mean(axis=1))}
+
+
+def _fill_ledger(directory: str, rows: int, rng) -> TransactionLedger:
+    ledger = TransactionLedger(directory)
+    days = np.datetime64("2026-01-01") + rng.integers(0, 270, rows)
+    amounts = np.round(rng.lognormal(3, 1, rows), 2)
+    amounts[rng.random(rows) < 0.03] *= -40  # paychecks
+    names = rng.integers(0, len(MERCHANTS), rows)
+    for day, amount, name in zip(days, amounts, names):
+        ledger.append(str(day), float(amount), classify_expense(MERCHANTS[name]), MERCHANTS[name])
+    ledger.flush()
+    return ledger
+
+
+def _traced_request(tracer: Tracer):
+    """A request span with the children of a routed, single-tool request."""
+    with tracer.span("request", session_id="bench"):
+        with tracer.span("route"), tracer.span("llm.routing", model="mock"):
+            pass
+        with tracer.span("agent.handle", agent="spend"):
+            with tracer.span("tool.arguments", tool="budget_tracker"):
+                pass
+            with tracer.span("tool.execute", tool="budget_tracker"):
+                pass
+
+
+def tool_benchmarks(rng=None) -> dict:
+    """{name: zero-argument callable} for every tool benchmark, at realistic data sizes."""
+    rng = rng or np.random.default_rng(7)
+    project = _project(360, rng)  # 30 years of monthly flows
+    flows = build_cash_flows(project)
+    projects = [_project(int(periods), rng) for periods in rng.integers(60, 361, 1_000)]
+    descriptions = [f"{MERCHANTS[i]} #{i * 37 % 9973}" for i in rng.integers(0, len(MERCHANTS), 10_000)]
+    classifier = ExpenseClassifier()
+    debts = _debts(12, rng)
+    history = _price_history(2_520, 500, rng)  # 10 years x 500 holdings
+    holdings = rng.uniform(1_000, 50_000, (10_000, 20))
+    targets = rng.dirichlet(np.ones(20))
+    scheduler = BillScheduler()
+    for i in range(25):
+        scheduler.add_bill(f"Bill {i}", f"2026-10-{i % 28 + 1:02d}", float(rng.uniform(20, 1_500)))
+    bills = list(scheduler.bills.values())
+    ledger_dir = tempfile.mkdtemp(prefix="bench-ledger-")
+    atexit.register(shutil.rmtree, ledger_dir, True)
+    ledger = _fill_ledger(os.path.join(ledger_dir, "user"), 50_000, rng)
+    traced, untraced = Tracer(InMemoryExporter(), 1.0), Tracer(InMemoryExporter(), 0.0)
+
+    return {
+        "build_cash_flows[360]": lambda: build_cash_flows(project),
+        "calculate_project_npv[360]": lambda: calculate_project_npv(project["initial_investment"], flows, 0.08),
+        "evaluate_projects_batch[1000x360,5 rates]": lambda: evaluate_projects_batch(projects, [0.04, 0.06, 0.08, 0.10, 0.12]),
+        "simulate_project_npv[100k paths]": lambda: simulate_project_npv(project, 0.08, n_paths=100_000, seed=1),
+        "classify_expense[1]": lambda: classify_expense(descriptions[0]),
+        "classify_batch[10k]": lambda: classifier.classify_batch(descriptions),
+        "analyze_holdings[2520x500]": lambda: analyze_holdings(
+            history["prices"], history["units"], history["dates"], history["benchmark"]
+        ),
+        "payoff_plan[12 debts]": lambda: payoff_plan(debts, 500.0),
+        "sweep_extra_payments[12 debts x 200]": lambda: sweep_extra_payments(debts, np.linspace(0, 2_000, 200)),
+        "rebalance_accounts[10k x 20, band]": lambda: rebalance_accounts(holdings, targets, 1_000.0),
+        "rebalance_accounts[10k x 20, mean_variance]": lambda: rebalance_accounts(
+            holdings, targets, 1_000.0, method="mean_variance"
+        ),
+        "forecast_cash_flow[365d, 25 bills, 50k rows]": lambda: forecast_cash_flow(
+            2_500.0, bills, ledger, start="2026-10-01"
+        ),
+        "tracing[6 spans, sampled]": lambda: _traced_request(traced),
+        "tracing[6 spans, unsampled]": lambda: _traced_request(untraced),
+    }
+
+
+def run_tool_benchmarks(selected: str = None, repeat: int = 5) -> dict:
+    """Time every tool benchmark whose name contains `selected` (all when None)."""
+    results = {}
+    for name, func in tool_benchmarks().items():
+        if selected and selected not in name:
+            continue
+        results[name] = time_call(func, repeat=repeat)
+    return results
@@ -0,0 +1,102 @@
+import json
+import time
+
+import numpy as np
+
+# A benchmark is a regression when it is this much slower than the saved baseline
+DEFAULT_TOLERANCE = 0.25
+
+
+def latency_stats(samples) -> dict:
+    """p50/p95/p99/mean/max of a list of durations in seconds, reported in milliseconds."""
+    samples = np.asarray(samples, dtype=float) * 1000
+    if samples.size == 0:
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "n": int(samples.size),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(samples.mean()),
+        "max_ms": float(samples.max()),
+    }
+
+
+def time_call(func, repeat: int = 7, number: int = None, min_time: float = 0.2) -> dict:
+    """Time `func()` like timeit: `repeat` rounds of `number` calls, reporting per-call times.
+
+    Without `number`, it is chosen so that one round takes about `min_time`.
+    The best round is the figure to compare across runs; the median shows noise.
+    """
+    func()  # warm up caches and lazy imports
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= min_time or number >= 1_000_000:
+                break
+            number *= 10
+
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    rounds = np.array(rounds) * 1000
+    return {"best_ms": float(rounds.min()), "median_ms": float(np.median(rounds)), "calls_per_round": number}
+
+
+def save_results(results: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# The metric compared against the baseline for each kind of result (lower is better)
+_COMPARED_METRICS = ("best_ms", "p95_ms", "llm_calls_per_request")
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Benchmarks that got worse than the baseline by more than `tolerance`, as readable lines.
+
+    LLM calls per request are compared exactly: one extra call is a regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in _COMPARED_METRICS:
+            if metric not in result or metric not in before:
+                continue
+            allowed = before[metric] if metric == "llm_calls_per_request" else before[metric] * (1 + tolerance)
+            if result[metric] > allowed + 1e-9:
+                regressions.append(f"{name}: {metric} {before[metric]:.3f} -> {result[metric]:.3f}")
+    return regressions
+
+
+def format_table(results: dict, columns: list) -> str:
+    """Plain-text table with one row per benchmark."""
+    header = ["benchmark"] + columns
+    rows = [[name] + [_format_cell(result.get(column)) for column in columns] for name, result in results.items()]
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(str(cell).ljust(width) for cell, width in zip(header, widths))]
+    lines.append("  ".join("-" * width for width in widths))
+    lines.extend("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)) for row in rows)
+    return "\n".join(lines)
+
+
+def _format_cell(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}" if abs(value) < 100 else f"{value:,.1f}"
+    return str(value)
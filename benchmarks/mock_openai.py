@@ -0,0 +1,207 @@
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+DEFAULT_TEXT = "Here is a short summary of your request based on the numbers above."
+
+
+@dataclass
+class Rule:
+    """A scripted reply: call `function` with `arguments`, or answer with `content`.
+
+    The rule applies when `match` (a regex) is found in the last user message
+    and, for a function call, when the request offers that function.
+    """
+
+    function: str = None
+    arguments: dict = field(default_factory=dict)
+    content: str = None
+    match: str = None
+
+    def applies(self, user_text: str, function_names: list) -> bool:
+        if self.match and not re.search(self.match, user_text, re.IGNORECASE):
+            return False
+        if self.function is not None:
+            return self.function in function_names
+        return not function_names
+
+
+@dataclass
+class MockSettings:
+    latency: float = 0.05  # seconds before the reply (or its first chunk)
+    jitter: float = 0.0  # extra uniform random latency, up to this many seconds
+    chunk_latency: float = 0.005  # seconds between streamed chunks
+    chunk_words: int = 3  # words per streamed chunk
+    rules: list = field(default_factory=list)
+
+
+def _last_user_text(messages: list) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return str(message.get("content") or "")
+    return ""
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockOpenAIServer:
+    """Threaded HTTP server answering like the chat completions API.
+
+        with MockOpenAIServer(MockSettings(latency=0.2, rules=SCRIPT)) as server:
+            client = OpenAI(base_url=server.base_url, api_key="mock")
+
+    Without a matching rule, a request offering functions calls the first
+    one with no arguments, and any other request gets DEFAULT_TEXT.
+    `requests` counts the completions served.
+    """
+
+    def __init__(self, settings: MockSettings = None, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings or MockSettings()
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def reply(self, body: dict) -> dict:
+        """The scripted message ({"content", "tool_calls"}) for one request body."""
+        function_names = [tool["function"]["name"] for tool in body.get("tools") or []]
+        user_text = _last_user_text(body.get("messages") or [])
+        for rule in self.settings.rules:
+            if rule.applies(user_text, function_names):
+                if rule.function is None:
+                    return {"content": rule.content, "tool_calls": []}
+                return {"content": rule.content, "tool_calls": [(rule.function, rule.arguments)]}
+        if function_names:
+            return {"content": None, "tool_calls": [(function_names[0], {})]}
+        return {"content": DEFAULT_TEXT, "tool_calls": []}
+
+    def _completion(self, body: dict, message: dict) -> dict:
+        tool_calls = [
+            {"id": f"call_{next(self._ids)}", "type": "function",
+             "function": {"name": name, "arguments": json.dumps(arguments)}}
+            for name, arguments in message["tool_calls"]
+        ]
+        prompt_tokens = _approx_tokens(json.dumps(body.get("messages")) + json.dumps(body.get("tools") or []))
+        completion_tokens = _approx_tokens((message["content"] or "") + json.dumps(tool_calls))
+        return {
+            "id": f"chatcmpl-mock-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": message["content"], "tool_calls": tool_calls or None},
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _chunks(self, body: dict, text: str):
+        words = text.split(" ")
+        size = max(1, self.settings.chunk_words)
+        completion_id = f"chatcmpl-mock-{next(self._ids)}"
+        for start in range(0, len(words), size):
+            piece = " ".join(words[start:start + size]) + (" " if start + size < len(words) else "")
+            yield {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+        yield {
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        if (body.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens = _approx_tokens(json.dumps(body.get("messages")))
+            completion_tokens = _approx_tokens(text)
+            yield {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "mock"), "choices": [],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                settings = server.settings
+                time.sleep(settings.latency + random.uniform(0, settings.jitter))
+
+                message = server.reply(body)
+                if body.get("stream"):
+                    self._stream(body, message["content"] or "")
+                else:
+                    self._send_json(server._completion(body, message))
+
+            def _send_json(self, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body: dict, text: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in server._chunks(body, text):
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                    time.sleep(server.settings.chunk_latency)
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
@@ -1,104 +1,98 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
-
-from my_agents.spend_agent import SpendManagementAgent
-from my_agents.investment_agent import InvestmentManagementAgent
-from my_agents.project_agent import ProjectManagementAgent
-
-class SessionMemory:
-    def __init__(self):
-        self.data = {}
-
-    def update(self, key: str, value):
-        self.data[key] = value
-
-    def get(self, key: str, default=None):
-        return self.data.get(key, default)
-
-def select_model():
-    available_models = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo", "gpt-4.1-2025-04-14"]
-    print("Available models:")
-    for idx, model in enumerate(available_models, 1):
-        print(f"{idx}. {model}")
-
-    choice = input("Select the model number you want to use (default 4 for gpt-4.1-2025-04-14): ").strip()
-
-    if choice.isdigit():
-        idx = int(choice)
-        if 1 <= idx <= len(available_models):
-            return available_models[idx - 1]
-
-    print("Using default model gpt-4.1-2025-04-14.\n")
-    return "gpt-4.1-2025-04-14"
-
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-selected_model = select_model()
-client = OpenAI(api_key=api_key)
-
-def classify_user_request_with_llm(client, user_input: str) -> str:
-    """Use LLM to classify user input into Spend, Investment, or Project."""
-    system_prompt = """You are a router assistant. 
-    Given a user's message, decide if it should go to:
-    - Spend Management Agent
-    - Investment Management Agent
-    - Project Management Agent
-
-    Only answer with one word: 'spend', 'investment', or 'project'.
-
-    If unclear, guess the most likely option."""
-    
-    response = client.chat.completions.create(
-        model=selected_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_input},
-        ]
-    )
-
-    choice = response.choices[0].message.content.lower().strip()
-
-    if choice not in ["spend", "investment", "project"]:
-        choice = "spend"  # default fallback
-
-    return choice
-
-# Initialize all agents
-session_memory = SessionMemory()
-
-agents = {
-    "spend": SpendManagementAgent(client, selected_model, session_memory),
-    "investment": InvestmentManagementAgent(client, selected_model, session_memory),
-    "project": ProjectManagementAgent(client, selected_model, session_memory),
-}
-
-# After all agents are created, set their access to each other
-for agent in agents.values():
-    agent.set_agents(agents)
-
-def route_input(user_input: str):
-    """Route using LLM classification instead of keyword matching."""
-    agent_key = classify_user_request_with_llm(client, user_input)
-
-    agent = agents.get(agent_key)
-
-    if agent:
-        return agent.handle(user_input)
-    else:
-        return "Sorry, I could not determine the right agent for your request."
-
-
-# Main console loop
-if __name__ == "__main__":
-    print("Welcome to your Personal Finance Multi-Agent Portal!")
-    print("Type 'exit' to quit.\n")
-
-    while True:
-        user_input = input("You: ")
-        if user_input.lower() == "exit":
-            print("Goodbye!")
-            break
-        response = route_input(user_input)
-        print(response)
\ No newline at end of file
+from openai import OpenAI
+from dotenv import load_dotenv
+import atexit
+import os
+
+from my_agents.config import (
+    DEFAULT_MODEL, completion_cache_from_env, model_policy_from_env, session_store_from_env, tracing_from_env,
+)
+from my_agents.runtime import OVER_BUDGET_ANSWER, build_agents
+from my_agents.planner import plan_request, run_tasks
+from my_agents.llm_client import BudgetExceeded, LLMCallCounter
+from my_agents.completion_cache import CachedClient
+from my_agents.tracing import span
+from tools.project_simulator import shutdown_pool
+
+def select_model():
+    available_models = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo", "gpt-4.1-2025-04-14"]
+    print("Available models:")
+    for idx, model in enumerate(available_models, 1):
+        print(f"{idx}. {model}")
+
+    choice = input("Select the model number you want to use (default 4 for gpt-4.1-2025-04-14): ").strip()
+
+    if choice.isdigit():
+        idx = int(choice)
+        if 1 <= idx <= len(available_models):
+            return available_models[idx - 1]
+
+    print("Using default model gpt-4.1-2025-04-14.\n")
+    return "gpt-4.1-2025-04-14"
+
+# Load environment variables
+load_dotenv()
+api_key = os.getenv("OPENAI_API_KEY")
+# Set OPENAI_MODEL to skip the prompt; imported as a module (e.g. by a server), the default is used
+selected_model = os.getenv("OPENAI_MODEL") or (select_model() if __name__ == "__main__" else DEFAULT_MODEL)
+completion_cache = completion_cache_from_env()
+client = CachedClient(OpenAI(api_key=api_key), completion_cache)
+model_policy = model_policy_from_env(selected_model)  # which model each pipeline stage uses
+
+# Initialize all agents
+session_store = session_store_from_env()
+atexit.register(session_store.close)  # flush pending session changes on exit
+
+tracer = tracing_from_env()
+atexit.register(tracer.close)
+
+agents = build_agents(client, selected_model, session_store)
+atexit.register(shutdown_pool)  # simulation worker processes, if any were started
+
+def route_input(user_input: str, on_token=None):
+    """Route with the local classifier, falling back to one structured LLM call.
+
+    Compound requests ("categorize netflix 12.99 and how is my portfolio
+    doing?") are split into sub-tasks that the agents handle concurrently.
+    With `on_token`, the answer is streamed to it as it is generated.
+    """
+    tasks = plan_request(client, selected_model, agents, user_input)
+    if len(tasks) > 1:
+        return run_tasks(agents, tasks, on_token)
+
+    decision = tasks[0]["decision"]
+
+    agent = agents.get(decision["agent"])
+
+    if agent:
+        return agent.handle(user_input, decision, on_token)
+    else:
+        response = "Sorry, I could not determine the right agent for your request."
+        if on_token is not None:
+            on_token(response)
+        return response
+
+
+def print_token(text: str):
+    print(text, end="", flush=True)
+
+
+# Main console loop
+if __name__ == "__main__":
+    print("Welcome to your Personal Finance Multi-Agent Portal!")
+    print("Type 'exit' to quit.\n")
+    session_id = os.getenv("PORTAL_SESSION_ID", "console")
+
+    while True:
+        user_input = input("You: ")
+        if user_input.lower() == "exit":
+            print(f"[Portal] Completion cache: {completion_cache.stats()}")
+            print(f"[Portal] Model policy: {model_policy.stats()}")
+            print("Goodbye!")
+            break
+        with session_store.activate(session_id), LLMCallCounter() as llm_calls, span("request", session_id=session_id):
+            try:
+                route_input(user_input, on_token=print_token)  # the answer is printed as it streams in
+            except BudgetExceeded:
+                print(OVER_BUDGET_ANSWER)
+        print()
+        print(f"[Portal] {llm_calls.summary()}")
\ No newline at end of file
@@ -1,122 +1,335 @@
-from openai import OpenAI
-
-class BaseAgent:
-    def __init__(self, client: OpenAI, name: str, description: str, model: str):
-        self.client = client
-        self.name = name
-        self.description = description
-        self.tools = {}
-        self.agents = {}  # Reference to other agents
-        self.model = model
-
-    def register_tool(self, tool_name: str, tool_function):
-        self.tools[tool_name] = tool_function
-
-    def set_agents(self, agents: dict):
-        """Provide a registry of all available agents (including self)."""
-        self.agents = agents
-
-    def reason_and_select_tool(self, user_input: str) -> str:
-        available_tools = ", ".join(self.tools.keys())
-
-        system_prompt = f"""You are an intelligent agent.
-        You can use the following tools: {available_tools}
-
-        ONLY respond with the name of the tool to use.
-
-        If no available tool fits, and another agent would be better suited, respond exactly with:
-        'delegate to [agent name]'
-        where agent names are: spend, investment, project.
-        """
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input},
-            ]
-        )
-
-        choice = response.choices[0].message.content.strip().lower()
-
-        return choice
-
-    def handle(self, user_input: str) -> str:
-        """Main method to handle user input (must be overridden)."""
-        raise NotImplementedError("Subclasses must implement this.")
-
-    def reason_with_chain_of_thought(self, user_input: str) -> dict:
-        """Use LLM to think step-by-step before picking a tool or delegating."""
-        available_tools = ", ".join(self.tools.keys())
-        available_agents = ", ".join(["spend", "investment", "project"])
-
-        system_prompt = f"""You are an intelligent financial agent.
-
-    You must perform step-by-step reasoning to decide the final action to handle the user's request.
-
-    Available tools you can use: {available_tools}
-    Available agents you can delegate to: {available_agents}
-
-    Follow this process strictly:
-    1. Think step-by-step what the user's goal is.
-    2. Think what sub-tasks would solve it.
-    3. Decide whether you can solve it yourself or if another agent is needed.
-
-    Output ONLY a JSON object like this:
-
-    {{
-      "reasoning": "<your reasoning>",
-      "final_action": "<tool_name>"  # (must match exactly from available tools) 
-    }}
-    OR, if delegating:
-
-    {{
-      "reasoning": "<your reasoning>",
-      "final_action": "delegate to <agent_name>"  # (agent name only: spend, investment, or project)
-    }}
-
-    No free text. No explanations outside the JSON.
-
-    If you cannot understand, delegate to spend.
-    """
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input},
-            ]
-        )
-
-        import json
-        reasoning_text = response.choices[0].message.content.strip()
-        try:
-            parsed = json.loads(reasoning_text)
-        except Exception as e:
-            print("[Agent] Failed to parse reasoning JSON:", e)
-            print("[Agent] Raw LLM output:", reasoning_text)
-            parsed = {"reasoning": "Could not parse reasoning", "final_action": "delegate to spend"}
-
-        return parsed
-
-    def generate_response(self, context: str) -> str:
-        """Use LLM to generate a natural conversational response based on tool output."""
-        system_prompt = """You are a friendly financial assistant. 
-        Given some internal context (like tool results), you must generate a polite, natural, and helpful response to the user.
-
-        Always be brief (1-3 sentences), helpful, and clear.
-
-        Do not repeat the user's input. Just explain the result nicely."""
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": context}
-                ]
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print("[Agent] Failed to generate nice response. Returning raw output.", e)
-            return context  # fallback if API fails
\ No newline at end of file
+import asyncio
+import os
+import threading
+
+from openai import OpenAI
+
+from .llm_client import (
+    chat_completion, achat_completion, stream_chat_completion, astream_chat_completion, record_first_token,
+)
+from .prompts import PROMPTS, fit_to_budget
+from .tracing import span
+from .tool_schemas import DELEGATE_TOOL, Delegation, acall_function, call_function, model_from_hint
+
+
+class ToolInputError(ValueError):
+    """Raised when a tool cannot run with the given input; the message is shown to the user."""
+
+
+# Delegation hops allowed per request; the agent reached last must act itself (no ping-pong)
+MAX_DELEGATION_DEPTH = 2
+
+# Serializes console prompts when several agents handle parts of one request at once
+CONSOLE_LOCK = threading.Lock()
+
+
+class MissingArgumentsError(ToolInputError):
+    """Raised in headless mode when a tool needs arguments the caller did not pass."""
+
+    def __init__(self, missing: list):
+        self.missing = missing
+        super().__init__(f"Please provide: {', '.join(missing)}.")
+
+
+class BaseAgent:
+    def __init__(self, client: OpenAI, name: str, description: str, model: str):
+        self.client = client
+        self.name = name
+        self.description = description
+        self.tools = {}
+        self.tool_arguments = {}  # Argument hints shown to the router, per tool
+        self.tool_prompts = {}  # Console prompts for arguments the user must supply, per tool
+        self.tool_schemas = {}  # Pydantic argument model, per tool
+        self.agents = {}  # Reference to other agents
+        self.model = model
+        # Tool output beyond this many tokens is trimmed before the summary call
+        self.context_token_budget = int(os.getenv("SUMMARY_CONTEXT_TOKENS", "1000"))
+
+    def register_tool(self, tool_name: str, tool_function, arguments: str = "", prompts: dict = None, schema=None):
+        """Register a tool; without a pydantic `schema`, one is derived from the argument names in `arguments`."""
+        self.tools[tool_name] = tool_function
+        self.tool_arguments[tool_name] = arguments
+        self.tool_prompts[tool_name] = prompts or {}
+        self.tool_schemas[tool_name] = schema or model_from_hint(tool_name, arguments)
+
+    def tool_functions(self, delegation: bool = True) -> dict:
+        """{name: (description, argument model)} for native tool calling, plus the delegation function."""
+        functions = {
+            tool_name: (self.tool_arguments[tool_name] or tool_name.replace("_", " "), self.tool_schemas[tool_name])
+            for tool_name in self.tools
+        }
+        if delegation:
+            functions[DELEGATE_TOOL] = ("Hand the request to another agent that is better suited.", Delegation)
+        return functions
+
+    def set_agents(self, agents: dict):
+        """Provide a registry of all available agents (including self)."""
+        self.agents = agents
+
+    def complete(self, stage: str, system_prompt: str, user_content: str, **kwargs) -> str:
+        """Run one chat completion for a pipeline stage and return the text."""
+        response = chat_completion(
+            self.client,
+            self.model,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            stage=stage,
+            **kwargs,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def acomplete(self, stage: str, system_prompt: str, user_content: str, **kwargs) -> str:
+        """Async version of complete(); needs an AsyncOpenAI client."""
+        response = await achat_completion(
+            self.client,
+            self.model,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            stage=stage,
+            **kwargs,
+        )
+        return response.choices[0].message.content.strip()
+
+    def reason_and_select_tool(self, user_input: str) -> str:
+        system_prompt = PROMPTS.render("tool_selection", tools=", ".join(self.tools))
+        return self.complete("tool_selection", system_prompt, user_input).lower()
+
+    def handle(self, user_input: str, decision: dict = None, on_token=None, depth: int = 0) -> str:
+        """Handle user input, reusing the router's decision when it picked a tool.
+
+        With `on_token`, the answer is passed to `on_token(text)` piece by
+        piece as it is produced instead of only being returned at the end.
+        `depth` counts the delegations that led here; at MAX_DELEGATION_DEPTH
+        the agent may no longer delegate.
+        """
+        with span("agent.handle", agent=self.name, depth=depth):
+            if decision and decision.get("tool") in self.tools:
+                final_action = decision["tool"]
+                arguments = decision.get("arguments") or {}
+            else:
+                reasoning = self.reason_with_chain_of_thought(user_input, depth < MAX_DELEGATION_DEPTH)
+                final_action, arguments = self._read_reasoning(reasoning)
+
+            delegate_to = self._delegation_target(final_action)
+            if delegate_to is not None:
+                if delegate_to not in self.agents:
+                    return _emit(f"[{self.name}] Unknown delegation target.", on_token)
+                if depth >= MAX_DELEGATION_DEPTH:
+                    return _emit(f"[{self.name}] Sorry, I could not find the right agent for this request.", on_token)
+                print(f"[{self.name}] Delegating task to {delegate_to.capitalize()} Agent...")
+                return self.agents[delegate_to].handle(user_input, on_token=on_token, depth=depth + 1)
+
+            if final_action not in self.tools:
+                return _emit(f"[{self.name}] Sorry, I could not find the right tool.", on_token)
+
+            try:
+                with span("tool.arguments", tool=final_action):
+                    arguments = self.collect_arguments(final_action, user_input, arguments)
+                with span("tool.execute", tool=final_action):
+                    context = self.execute_tool(final_action, arguments)
+            except ToolInputError as e:
+                return _emit(str(e), on_token)
+            return self.generate_response(context, on_token)
+
+    async def ahandle(self, user_input: str, decision: dict = None, arguments: dict = None, on_token=None,
+                      depth: int = 0) -> str:
+        """Async, headless version of handle(): never reads stdin.
+
+        Tool arguments come from the router decision and/or the caller's
+        structured `arguments`; missing ones are reported back to the caller.
+        """
+        with span("agent.handle", agent=self.name, depth=depth):
+            if decision and decision.get("tool") in self.tools:
+                final_action = decision["tool"]
+                arguments = {**(decision.get("arguments") or {}), **(arguments or {})}
+            else:
+                reasoning = await self.areason_with_chain_of_thought(user_input, depth < MAX_DELEGATION_DEPTH)
+                final_action, extracted = self._read_reasoning(reasoning)
+                arguments = {**extracted, **(arguments or {})}
+
+            delegate_to = self._delegation_target(final_action)
+            if delegate_to is not None:
+                if delegate_to not in self.agents:
+                    return _emit(f"[{self.name}] Unknown delegation target.", on_token)
+                if depth >= MAX_DELEGATION_DEPTH:
+                    return _emit(f"[{self.name}] Sorry, I could not find the right agent for this request.", on_token)
+                return await self.agents[delegate_to].ahandle(
+                    user_input, arguments=arguments, on_token=on_token, depth=depth + 1
+                )
+
+            if final_action not in self.tools:
+                return _emit(f"[{self.name}] Sorry, I could not find the right tool.", on_token)
+
+            try:
+                with span("tool.arguments", tool=final_action):
+                    arguments = await self.acollect_arguments(final_action, user_input, arguments)
+                with span("tool.execute", tool=final_action):
+                    context = await self.aexecute_tool(final_action, arguments)
+            except ToolInputError as e:
+                return _emit(str(e), on_token)
+            return await self.agenerate_response(context, on_token)
+
+    def _read_reasoning(self, reasoning: dict):
+        print(f"[{self.name}] Chain of Thought Reasoning:\n{reasoning['reasoning']}\n")
+        return reasoning['final_action'].lower(), reasoning.get("arguments") or {}
+
+    def _delegation_target(self, final_action: str):
+        """Agent key to delegate to, or None when this agent should act itself."""
+        if not final_action.startswith("delegate to"):
+            return None
+
+        _, agent_key = final_action.split("delegate to")
+        agent_key = agent_key.strip()
+
+        if agent_key == self.name.lower().split()[0]:
+            print(f"[{self.name}] I am already the correct agent. Proceeding internally...")
+            return None
+        return agent_key
+
+    def collect_arguments(self, tool_name: str, user_input: str, arguments: dict) -> dict:
+        """Fill in missing tool arguments by asking the user on the console."""
+        arguments = dict(arguments)
+        for key, prompt in self.tool_prompts.get(tool_name, {}).items():
+            if arguments.get(key) is None:
+                with CONSOLE_LOCK:
+                    arguments[key] = input(prompt)
+        return arguments
+
+    async def acollect_arguments(self, tool_name: str, user_input: str, arguments: dict) -> dict:
+        """Headless version of collect_arguments(): report missing arguments instead of asking."""
+        missing = [key for key in self.tool_prompts.get(tool_name, {}) if arguments.get(key) is None]
+        if missing:
+            raise MissingArgumentsError(missing)
+        return dict(arguments)
+
+    def execute_tool(self, tool_name: str, arguments: dict) -> str:
+        """Run one of the agent's tools and return the context for the final response (must be overridden)."""
+        raise NotImplementedError("Subclasses must implement this.")
+
+    async def aexecute_tool(self, tool_name: str, arguments: dict) -> str:
+        """Async version of execute_tool(); agents override it to micro-batch tools that vectorize.
+
+        Tools run in a worker thread (with the request's context), so a long
+        computation such as a Monte Carlo simulation does not stall every
+        other request on the event loop.
+        """
+        return await asyncio.to_thread(self.execute_tool, tool_name, arguments)
+
+    def reason_with_chain_of_thought(self, user_input: str, allow_delegation: bool = True) -> dict:
+        """Use LLM to think step-by-step, then pick a tool (with its arguments) or delegate, in one call."""
+        try:
+            result = call_function(
+                self.client, self.model, self._chain_of_thought_messages(user_input), "chain_of_thought",
+                self.tool_functions(allow_delegation),
+            )
+        except ValueError as e:
+            return self._reasoning_failed(e)
+        return self._reasoning_from_call(*result)
+
+    async def areason_with_chain_of_thought(self, user_input: str, allow_delegation: bool = True) -> dict:
+        try:
+            result = await acall_function(
+                self.client, self.model, self._chain_of_thought_messages(user_input), "chain_of_thought",
+                self.tool_functions(allow_delegation),
+            )
+        except ValueError as e:
+            return self._reasoning_failed(e)
+        return self._reasoning_from_call(*result)
+
+    def _chain_of_thought_messages(self, user_input: str) -> list:
+        return [
+            {"role": "system", "content": CHAIN_OF_THOUGHT_PROMPT},
+            {"role": "user", "content": user_input},
+        ]
+
+    def _reasoning_from_call(self, name: str, arguments: dict, content: str) -> dict:
+        if name == DELEGATE_TOOL:
+            return {"reasoning": content, "final_action": f"delegate to {arguments['agent']}", "arguments": {}}
+        return {"reasoning": content, "final_action": name, "arguments": arguments}
+
+    def _reasoning_failed(self, error: Exception) -> dict:
+        print("[Agent] Failed to get a valid tool call:", error)
+        return {"reasoning": "Could not parse reasoning", "final_action": "delegate to spend", "arguments": {}}
+
+    def generate_response(self, context: str, on_token=None) -> str:
+        """Use LLM to generate a natural conversational response based on tool output.
+
+        With `on_token` the response is streamed: each piece is handed to
+        `on_token` as soon as it arrives. The context is trimmed to
+        `context_token_budget` first; the fallback answers keep it whole.
+        """
+        prompt = fit_to_budget(context, self.context_token_budget)
+        if on_token is None:
+            try:
+                return self.complete("summary", RESPONSE_SYSTEM_PROMPT, prompt)
+            except Exception as e:
+                print("[Agent] Failed to generate nice response. Returning raw output.", e)
+                return context  # fallback if API fails
+
+        pieces = []
+        try:
+            for text in stream_chat_completion(self.client, self.model, _summary_messages(prompt), stage="summary"):
+                pieces.append(text)
+                on_token(text)
+        except Exception as e:
+            print("[Agent] Failed to stream response.", e)
+            if not pieces:
+                return _emit(context, on_token)  # fallback if API fails
+        return "".join(pieces).strip()
+
+    async def agenerate_response(self, context: str, on_token=None) -> str:
+        prompt = fit_to_budget(context, self.context_token_budget)
+        if on_token is None:
+            try:
+                return await self.acomplete("summary", RESPONSE_SYSTEM_PROMPT, prompt)
+            except Exception as e:
+                print("[Agent] Failed to generate nice response. Returning raw output.", e)
+                return context  # fallback if API fails
+
+        pieces = []
+        try:
+            async for text in astream_chat_completion(self.client, self.model, _summary_messages(prompt), stage="summary"):
+                pieces.append(text)
+                on_token(text)
+        except Exception as e:
+            print("[Agent] Failed to stream response.", e)
+            if not pieces:
+                return _emit(context, on_token)  # fallback if API fails
+        return "".join(pieces).strip()
+
+
+def _summary_messages(context: str) -> list:
+    return [
+        {"role": "system", "content": RESPONSE_SYSTEM_PROMPT},
+        {"role": "user", "content": context},
+    ]
+
+
+def _emit(text: str, on_token=None) -> str:
+    """Hand a complete answer that needed no LLM call to a streaming caller as one piece."""
+    if on_token is not None:
+        record_first_token()
+        on_token(text)
+    return text
+
+
+CHAIN_OF_THOUGHT_PROMPT = PROMPTS.register("chain_of_thought", """
+    You are a financial agent. Briefly reason about the user's goal and the sub-tasks that solve it, then call exactly
+    one function: the tool that solves it, with every argument the user gave, or `delegate` if another agent
+    (spend, investment, project) is better suited. If you cannot understand the request, delegate to spend.
+    """)
+
+RESPONSE_SYSTEM_PROMPT = PROMPTS.register("summary", """
+    You are a friendly financial assistant. Turn the internal context (tool results) into a brief (1-3 sentences),
+    polite and clear answer for the user. Do not repeat the user's input.
+    """)
+
+PROMPTS.register("tool_selection", """
+    You are a financial agent with these tools: {tools}.
+    Reply with only the name of the tool to use. If none fits and another agent is better suited, reply exactly
+    'delegate to <agent>' with agent spend, investment or project.
+    """)
@@ -0,0 +1,78 @@
+import asyncio
+
+
+class MicroBatcher:
+    """Coalesce concurrent calls of a vectorized function into one batch.
+
+    Items submitted within `window` seconds of the first waiting one (or
+    until `max_batch` are waiting) are passed together to `batch_fn(items)`,
+    which runs in a worker thread and must return one result per item, in
+    order. If a batch raises, its items are retried one by one so that one
+    bad request fails alone.
+
+        batcher = MicroBatcher(classifier.classify_batch, window=0.002)
+        category = await batcher.submit("netflix.com")
+    """
+
+    def __init__(self, batch_fn, window: float = 0.002, max_batch: int = 256):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._pending = []  # (item, future) waiting for the next batch
+        self._timer = None
+        self._running = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await asyncio.to_thread(self.batch_fn, [item for item, _ in batch])
+        except Exception:
+            for item, future in batch:
+                try:
+                    result = (await asyncio.to_thread(self.batch_fn, [item]))[0]
+                except Exception as e:
+                    _settle(future, error=e)
+                else:
+                    _settle(future, result)
+            return
+        for (_, future), result in zip(batch, results):
+            _settle(future, result)
+
+
+def _settle(future, result=None, error: Exception = None):
+    if future.done():  # the caller gave up, e.g. its request timed out
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
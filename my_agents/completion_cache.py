@@ -0,0 +1,214 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from .llm_client import record_cache_hit
+
+
+# Request options that change how the answer is delivered, not what it is
+TRANSPORT_KWARGS = {"stream", "stream_options", "timeout", "extra_headers", "extra_query"}
+
+
+def make_cache_key(model: str, messages: list, **request) -> str:
+    """Hash the model, the messages and every other request option except TRANSPORT_KWARGS.
+
+    Message content is whitespace-normalized; everything else (tools,
+    tool_choice, response_format, temperature, ...) must match exactly.
+    Case is kept: answers copy arguments such as file paths and names from
+    the user's text, so "/Data/Prices.csv" must not share an entry with
+    "/data/prices.csv".
+    """
+    normalized = [
+        {**message, "content": " ".join(str(message.get("content", "")).split())} for message in messages
+    ]
+    options = {name: value for name, value in request.items() if name not in TRANSPORT_KWARGS}
+
+    payload = json.dumps([model, normalized, options], separators=(",", ":"), sort_keys=True, default=_jsonable)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _jsonable(value):
+    """Stand-in for request options json cannot encode, such as a pydantic response_format."""
+    if hasattr(value, "model_json_schema"):
+        return [value.__name__, value.model_json_schema()]
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return repr(value)
+
+
+class CompletionCache:
+    """In-memory LRU cache with TTL, optionally backed by a SQLite file that survives restarts.
+
+    Expired rows are deleted from the file when it is opened and then at
+    most every `purge_interval` seconds, when an entry is written.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, db_path: str = None,
+                 purge_interval: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (expires_at, response)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.purge_interval = purge_interval
+        self.next_purge = 0.0
+
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, expires_at REAL, response TEXT)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS completions_expires_at ON completions (expires_at)")
+            self._purge(time.time())
+            self.db.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self.entries[key]
+                self.evictions += 1
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT expires_at, response FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[0] > now:
+                    response = _load_response(row[1])
+                    self._remember(key, row[0], response)
+                    self.hits += 1
+                    return response
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, response):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self.lock:
+            self._remember(key, expires_at, response)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO completions (key, expires_at, response) VALUES (?, ?, ?)",
+                    (key, expires_at, _dump_response(response)),
+                )
+                if now >= self.next_purge:
+                    self._purge(now)
+                self.db.commit()
+
+    def _purge(self, now: float):
+        """Delete expired rows from the SQLite file. Needs the lock (or the constructor)."""
+        self.db.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+        self.next_purge = now + self.purge_interval
+
+    def _remember(self, key: str, expires_at: float, response):
+        self.entries[key] = (expires_at, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM completions")
+                self.db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+        }
+
+
+def _dump_response(response) -> str:
+    if hasattr(response, "model_dump_json"):
+        return response.model_dump_json()
+    message = response.choices[0].message
+    tool_calls = [
+        {"function": {"name": call.function.name, "arguments": call.function.arguments}}
+        for call in getattr(message, "tool_calls", None) or []
+    ]
+    return json.dumps({"choices": [{"message": {"content": message.content, "tool_calls": tool_calls}}]})
+
+
+def _load_response(raw: str):
+    try:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate_json(raw)
+    except Exception:
+        data = json.loads(raw)
+        message = data["choices"][0]["message"]
+        tool_calls = [
+            SimpleNamespace(function=SimpleNamespace(**call["function"])) for call in message.get("tool_calls") or []
+        ]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=message["content"], tool_calls=tool_calls))])
+
+
+class CachedClient:
+    """Wrap an OpenAI client so chat completions are served from a CompletionCache.
+
+    Only deterministic requests (temperature 0) are cached unless cache_all is set;
+    streaming requests always go to the API.
+    """
+
+    def __init__(self, client, cache: CompletionCache, cache_all: bool = False):
+        self.client = client
+        self.cache = cache
+        self.cache_all = cache_all
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def create(self, **kwargs):
+        temperature = kwargs.get("temperature")
+        cacheable = not kwargs.get("stream") and (self.cache_all or temperature == 0)
+        if not cacheable:
+            return self.client.chat.completions.create(**kwargs)
+
+        key = make_cache_key(**kwargs)
+        response = self.cache.get(key)
+        if response is not None:
+            record_cache_hit()
+            return response
+
+        response = self.client.chat.completions.create(**kwargs)
+        self.cache.set(key, response)
+        return response
+
+
+class AsyncCachedClient(CachedClient):
+    """CachedClient for AsyncOpenAI: same cache policy, awaitable create()."""
+
+    async def create(self, **kwargs):
+        temperature = kwargs.get("temperature")
+        cacheable = not kwargs.get("stream") and (self.cache_all or temperature == 0)
+        if not cacheable:
+            return await self.client.chat.completions.create(**kwargs)
+
+        key = make_cache_key(**kwargs)
+        response = self.cache.get(key)
+        if response is not None:
+            record_cache_hit()
+            return response
+
+        response = await self.client.chat.completions.create(**kwargs)
+        self.cache.set(key, response)
+        return response
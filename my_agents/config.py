@@ -0,0 +1,58 @@
+import os
+
+from .completion_cache import CompletionCache
+from .model_policy import ModelPolicy, configure_model_policy
+from .session_memory import SessionStore, SQLiteSessionBackend
+from .tracing import build_exporter, configure_tracing
+
+# Used when OPENAI_MODEL is not set and nobody is at the console to choose
+DEFAULT_MODEL = "gpt-4.1-2025-04-14"
+
+
+def completion_cache_from_env() -> CompletionCache:
+    return CompletionCache(
+        max_entries=int(os.getenv("COMPLETION_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.getenv("COMPLETION_CACHE_TTL", "3600")),
+        db_path=os.getenv("COMPLETION_CACHE_PATH"),  # e.g. completions.sqlite3 to survive restarts
+    )
+
+
+def session_store_from_env() -> SessionStore:
+    return SessionStore(
+        backend=SQLiteSessionBackend(os.getenv("SESSION_DB_PATH", "sessions.sqlite3")),
+        max_sessions=int(os.getenv("SESSION_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("SESSION_TTL", str(7 * 24 * 3600))),
+    )
+
+
+def tracing_from_env():
+    """Spans for every request, LLM call and tool run (off unless TRACE_EXPORTER is jsonl, memory or otlp)."""
+    return configure_tracing(
+        build_exporter(
+            os.getenv("TRACE_EXPORTER"),
+            path=os.getenv("TRACE_PATH", "traces.jsonl"),
+            endpoint=os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"),
+        ),
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+    )
+
+
+def model_policy_from_env(model: str) -> ModelPolicy:
+    """Install the model policy: a MODEL_POLICY_PATH file, else SMALL_MODEL for the routing-like stages
+    with `model` as the escalation tier, else `model` for every stage.
+
+    REQUEST_TOKEN_BUDGET and REQUEST_LATENCY_BUDGET (seconds) override the budgets of a policy file;
+    a request that has spent either makes no more LLM calls.
+    """
+    path, small_model = os.getenv("MODEL_POLICY_PATH"), os.getenv("SMALL_MODEL")
+    if path:
+        policy = ModelPolicy.load(path)
+    elif small_model:
+        policy = ModelPolicy.tiered(model, small_model)
+    else:
+        policy = ModelPolicy()
+    if os.getenv("REQUEST_TOKEN_BUDGET"):
+        policy.token_budget = int(os.getenv("REQUEST_TOKEN_BUDGET"))
+    if os.getenv("REQUEST_LATENCY_BUDGET"):
+        policy.latency_budget = float(os.getenv("REQUEST_LATENCY_BUDGET"))
+    return configure_model_policy(policy)
@@ -1,60 +1,155 @@
-from .base_agent import BaseAgent
-from tools.investment_calculator import calculate_investment_return
-from tools.portfolio_analyzer import analyze_portfolio
-
-class InvestmentManagementAgent(BaseAgent):
-    def __init__(self, client, model, session_memory):
-        super().__init__(
-            client=client,
-            name="Investment Management Agent",
-            description="Manages user investments, returns, and reallocations.",
-            model=model
-        )
-
-        self.session_memory = session_memory
-        self.register_tool("investment_return_calculator", calculate_investment_return)
-        self.register_tool("portfolio_analyzer", analyze_portfolio)
-
-    def handle(self, user_input: str) -> str:
-        reasoning = self.reason_with_chain_of_thought(user_input)
-        print(f"[{self.name}] Chain of Thought Reasoning:\n{reasoning['reasoning']}\n")
-
-        final_action = reasoning['final_action'].lower()
-
-        if final_action.startswith("delegate to"):
-            _, agent_key = final_action.split("delegate to")
-            agent_key = agent_key.strip()
-
-            if agent_key == self.name.lower().split()[0]:
-                print(f"[{self.name}] I am already the correct agent. Proceeding internally...")
-                # Do not delegate, proceed with final_action
-            else:
-                if agent_key in self.agents:
-                    print(f"[{self.name}] Delegating task to {agent_key.capitalize()} Agent...")
-                    return self.agents[agent_key].handle(user_input)
-                else:
-                    return f"[{self.name}] Unknown delegation target."
-
-        if final_action not in self.tools:
-            return f"[{self.name}] Sorry, I could not find the right tool."
-
-        if final_action == "investment_return_calculator":
-            try:
-                initial = float(input("[Investment Agent] Enter your initial investment amount: "))
-                final = float(input("[Investment Agent] Enter your final investment value: "))
-                result = self.tools[final_action](initial, final)
-                return self.generate_response(f"Result of {final_action}: {result}")
-            except ValueError:
-                return "[Investment Agent] Invalid number entered."
-
-        elif final_action == "portfolio_analyzer":
-            try:
-                returns_input = input("[Investment Agent] Enter individual investment returns separated by commas: ")
-                returns = [float(x.strip()) for x in returns_input.split(",")]
-                result = self.tools[final_action](returns)
-                return self.generate_response(f"Result of {final_action}: {result}")
-            except ValueError:
-                return "[Investment Agent] Invalid input."
-
-        else:
-            return f"[{self.name}] Selected an unknown tool."
\ No newline at end of file
+from .base_agent import BaseAgent, ToolInputError
+from .tool_schemas import RebalanceArguments
+from tools.investment_calculator import calculate_investment_return
+from tools.portfolio_analyzer import analyze_portfolio, load_price_history, portfolio_report
+from tools.rebalancer import rebalance_portfolio
+import numpy as np
+
+class InvestmentManagementAgent(BaseAgent):
+    def __init__(self, client, model, session_memory):
+        super().__init__(
+            client=client,
+            name="Investment Management Agent",
+            description="Manages user investments, returns, and reallocations.",
+            model=model
+        )
+
+        self.session_memory = session_memory
+        self.register_tool("investment_return_calculator", calculate_investment_return, "initial, final", {
+            "initial": "[Investment Agent] Enter your initial investment amount: ",
+            "final": "[Investment Agent] Enter your final investment value: ",
+        })
+        self.register_tool("portfolio_analyzer", analyze_portfolio, "returns: list of percentages", {
+            "returns": "[Investment Agent] Enter individual investment returns separated by commas: ",
+        })
+        self.register_tool("portfolio_analytics", portfolio_report, "path, benchmark (symbol), risk_free_rate", {
+            "path": "[Investment Agent] Path to your price history CSV (date, symbol, price[, units]): ",
+        })
+        self.register_tool(
+            "rebalance_portfolio",
+            rebalance_portfolio,
+            "holdings: {symbol: value}, targets: {symbol: weight}, cash, method (band or mean_variance), band, "
+            "cost_rate, min_trade, locked: {symbol: value that must not be sold}",
+            {
+                "holdings": "[Investment Agent] Current holdings as SYMBOL=value, separated by commas: ",
+                "targets": "[Investment Agent] Target weights as SYMBOL=weight, separated by commas: ",
+            },
+            schema=RebalanceArguments,
+        )
+
+    def execute_tool(self, final_action: str, arguments: dict) -> str:
+        if final_action == "investment_return_calculator":
+            try:
+                initial = float(arguments["initial"])
+                final = float(arguments["final"])
+            except ValueError:
+                raise ToolInputError("[Investment Agent] Invalid number entered.")
+            result = self.tools[final_action](initial, final)
+            return f"Result of {final_action}: {result}"
+
+        elif final_action == "portfolio_analyzer":
+            returns_input = arguments["returns"]
+            if isinstance(returns_input, str):
+                returns_input = returns_input.split(",")
+            try:
+                returns = [float(str(x).strip()) for x in returns_input]
+            except ValueError:
+                raise ToolInputError("[Investment Agent] Invalid input.")
+            result = self.tools[final_action](returns)
+            return f"Result of {final_action}: {result}"
+
+        elif final_action == "rebalance_portfolio":
+            return f"Result of {final_action}: {self.propose_rebalance(arguments)}"
+
+        elif final_action == "portfolio_analytics":
+            return f"Result of {final_action}: {self.analyze_price_history(arguments)}"
+
+        else:
+            raise ToolInputError(f"[{self.name}] Selected an unknown tool.")
+
+    def propose_rebalance(self, arguments: dict) -> str:
+        """Trade list that moves the holdings toward their target weights."""
+        try:
+            holdings = _symbol_amounts(arguments["holdings"])
+            targets = _symbol_amounts(arguments["targets"])
+            locked = _symbol_amounts(arguments["locked"]) if arguments.get("locked") else None
+            options = {
+                key: float(arguments[key]) for key in ("band", "cost_rate", "min_trade") if arguments.get(key) is not None
+            }
+            method = arguments.get("method") or "band"
+            # Re-solving the same allocation starts from the previous answer
+            previous = self.session_memory.get("last_rebalance") or {}
+            warm_start = previous.get("weights") if method == "mean_variance" and previous.get("targets") == targets else None
+            result = self.tools["rebalance_portfolio"](
+                holdings, targets, float(arguments.get("cash") or 0.0),
+                method=method, locked=locked, warm_start=warm_start, **options,
+            )
+        except (TypeError, ValueError) as e:
+            raise ToolInputError(f"[Investment Agent] Invalid holdings or targets: {e}")
+        self.session_memory.update("last_rebalance", {"targets": targets, "weights": result["weights"]})
+
+        if not result["trades"]:
+            return "Holdings are within their target bands; no trades needed."
+        trades = ", ".join(
+            f"{'buy' if amount > 0 else 'sell'} ${abs(amount):,.2f} of {symbol}"
+            for symbol, amount in sorted(result["trades"].items(), key=lambda item: item[1])
+        )
+        return (
+            f"Proposed trades: {trades}. Estimated cost ${result['cost']:,.2f}, turnover {result['turnover']:.1%}, "
+            f"cash left ${max(result['cash_after'], 0.0):,.2f}."
+        )
+
+    def analyze_price_history(self, arguments: dict) -> str:
+        """Return, risk and benchmark metrics for every holding in a price history file."""
+        path = str(arguments["path"]).strip()
+        try:
+            history = load_price_history(path)
+            report = self.tools["portfolio_analytics"](
+                history,
+                benchmark_symbol=arguments.get("benchmark"),
+                risk_free_rate=float(arguments.get("risk_free_rate") or 0.0),
+            )
+        except (OSError, KeyError, ValueError) as e:
+            raise ToolInputError(f"[Investment Agent] Could not analyze {path}: {e}")
+
+        symbols = report["symbols"]
+        self.session_memory.update("last_portfolio_report", {
+            symbol: {
+                key: None if np.isnan(report[key][i]) else float(report[key][i])
+                for key in ("annualized_return", "volatility", "sharpe", "max_drawdown", "money_weighted_return", "excess_return")
+                if key in report
+            }
+            for i, symbol in enumerate(symbols)
+        })
+
+        print("\n📈 Portfolio Analytics:")
+        for i, symbol in enumerate(symbols):
+            line = (
+                f"- {symbol}: return {report['annualized_return'][i]:.2%}/yr, volatility {report['volatility'][i]:.2%}, "
+                f"Sharpe {report['sharpe'][i]:.2f}, max drawdown {report['max_drawdown'][i]:.2%}"
+            )
+            if "money_weighted_return" in report:
+                line += f", money-weighted {report['money_weighted_return'][i]:.2%}"
+            if "excess_return" in report:
+                line += f", vs benchmark {report['excess_return'][i]:+.2%}"
+            print(line)
+
+        best = int(np.nanargmax(report["sharpe"])) if len(symbols) and not np.isnan(report["sharpe"]).all() else None
+        context = f"Analyzed {len(symbols)} holdings over {len(history['dates'])} days."
+        if best is not None:
+            context += f" Best risk-adjusted: {symbols[best]} (Sharpe {report['sharpe'][best]:.2f})."
+        if "underperforming" in report:
+            laggards = [symbol for symbol, flag in zip(symbols, report["underperforming"]) if flag]
+            context += (
+                f" Lagging {arguments['benchmark'].upper()}: {', '.join(laggards)}."
+                if laggards else f" No holding lags {arguments['benchmark'].upper()}."
+            )
+        return context
+
+
+def _symbol_amounts(value) -> dict:
+    """{symbol: amount} from a dict or a 'VTI=7000, BND: 2000' string."""
+    if isinstance(value, dict):
+        return {str(symbol).upper(): float(amount) for symbol, amount in value.items()}
+    pairs = [item.replace(":", "=").split("=") for item in str(value).split(",") if item.strip()]
+    return {symbol.strip().upper(): float(amount.strip().rstrip("%").replace("$", "")) for symbol, amount in pairs}
@@ -0,0 +1,322 @@
+import asyncio
+from contextvars import ContextVar
+import time
+
+from openai import APITimeoutError
+
+from .model_policy import get_model_policy
+from .tracing import current_span, end_span, span, start_span
+
+# What a call that ran out of time raises: the client's own timeout, or wait_for() around an async call
+TIMEOUT_ERRORS = (APITimeoutError, asyncio.TimeoutError, TimeoutError)
+
+class BudgetExceeded(Exception):
+    """The active request has spent the model policy's token or latency budget; no more LLM calls."""
+
+
+# Counter for the request currently being handled (None outside a request)
+_active_counter: ContextVar = ContextVar("llm_call_counter", default=None)
+
+
+class LLMCallCounter:
+    """Count the chat completion calls made while handling one user request."""
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0  # tokens billed, i.e. not counting calls served from cache
+        self.completion_tokens = 0
+        self.cost_usd = 0.0  # at the model policy's prices
+        self.by_stage = {}
+        self.tokens_by_stage = {}  # billed prompt + completion tokens, per stage
+        self.started_at = None
+        self.first_token_at = None
+        self._token = None
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        self._token = _active_counter.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_counter.reset(self._token)
+        self._token = None
+
+    def record(self, stage: str):
+        self.calls += 1
+        self.by_stage[stage] = self.by_stage.get(stage, 0) + 1
+
+    def record_tokens(self, prompt_tokens: int, completion_tokens: int, cost_usd: float = 0.0, stage: str = None):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost_usd += cost_usd
+        if stage is not None:
+            self.tokens_by_stage[stage] = self.tokens_by_stage.get(stage, 0) + prompt_tokens + completion_tokens
+
+    def record_first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from the start of the request until the user saw the first text, or None."""
+        if self.first_token_at is None or self.started_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    def summary(self) -> str:
+        stages = ", ".join(
+            f"{stage}={count}" + (f": {self.tokens_by_stage[stage]:,} tokens" if self.tokens_by_stage.get(stage) else "")
+            for stage, count in self.by_stage.items()
+        )
+        text = f"{self.calls} LLM call(s)" + (f" ({stages})" if stages else "")
+        if self.cache_hits:
+            text += f", {self.cache_hits} served from cache"
+        if self.prompt_tokens or self.completion_tokens:
+            text += f", {self.prompt_tokens:,} prompt + {self.completion_tokens:,} completion tokens"
+        if self.cost_usd:
+            text += f" (${self.cost_usd:.4f})"
+        if self.time_to_first_token is not None:
+            text += f", first token after {self.time_to_first_token:.2f}s"
+        return text
+
+
+def record_cache_hit():
+    """Mark the latest call of the active request as answered by the completion cache."""
+    counter = _active_counter.get()
+    if counter is not None:
+        counter.cache_hits += 1
+    current_span().set("cache_hit", True)
+
+
+def record_first_token():
+    """Mark the moment the active request first showed text to the user (only the first call counts)."""
+    counter = _active_counter.get()
+    if counter is not None:
+        counter.record_first_token()
+
+
+def _count_call(stage: str):
+    counter = _active_counter.get()
+    if counter is not None:
+        counter.record(stage)
+
+
+def _record_usage(usage, counter, llm_span, stage: str, cached: bool, cost: float = 0.0):
+    """Put a completion's token usage and cost on its span and, unless it came from cache, on the request's counter."""
+    if usage is None:
+        return
+    llm_span.set("prompt_tokens", usage.prompt_tokens)
+    llm_span.set("completion_tokens", usage.completion_tokens)
+    if cost:
+        llm_span.set("cost_usd", cost)
+    if counter is not None and not cached:
+        counter.record_tokens(usage.prompt_tokens, usage.completion_tokens, cost, stage)
+
+
+def _tiers(policy, stage: str, model: str, counter, escalation: int) -> list:
+    """Models to try for one call, starting `escalation` tiers up the stage's list."""
+    models = policy.models_for(stage, model, counter)
+    return models[min(escalation, len(models) - 1):]
+
+
+def _check_budget(policy, counter, stage: str):
+    if policy.over_budget(counter):
+        raise BudgetExceeded(f"[{stage}] the request's token or latency budget is spent")
+
+
+def _timeout_kwargs(timeout) -> dict:
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def record_invalid_answer(stage: str, model: str, escalation: int) -> bool:
+    """Note that attempt `escalation` of `stage` gave an unusable answer and is about to be retried.
+
+    Returns True when the stage has a higher tier for the next attempt to move
+    up to; only then is an escalation recorded. Callers that will not retry
+    must not call it.
+    """
+    counter = _active_counter.get()
+    policy = get_model_policy()
+    models = policy.models_for(stage, model, counter)
+    if escalation + 1 >= len(models):
+        return False
+    policy.record_escalation(stage, models[escalation])
+    return True
+
+
+def chat_completion(client, model: str, messages: list, stage: str, escalation: int = 0, **kwargs):
+    """Send one chat completion request, recording it (and its tokens) against the active request.
+
+    The model policy picks the model for `stage` (`model` unless configured
+    otherwise); `escalation` starts that many tiers up. A call that times out
+    falls back to the stage's next model, and the last one's timeout is raised.
+    Raises BudgetExceeded instead of calling once the request's budget is spent.
+    """
+    counter = _active_counter.get()
+    policy = get_model_policy()
+    models = _tiers(policy, stage, model, counter, escalation)
+    for tier, tier_model in enumerate(models):
+        try:
+            return _complete_once(client, policy, tier_model, messages, stage, counter, **kwargs)
+        except TIMEOUT_ERRORS:
+            if tier == len(models) - 1:
+                raise
+
+
+def _complete_once(client, policy, model: str, messages: list, stage: str, counter, **kwargs):
+    _check_budget(policy, counter, stage)
+    _count_call(stage)
+    cache_hits = counter.cache_hits if counter is not None else 0
+    timeout = policy.timeout_for(stage, counter)
+    started = time.perf_counter()
+
+    with span(f"llm.{stage}", stage=stage, model=model) as llm_span:
+        try:
+            response = client.chat.completions.create(
+                model=model, messages=messages, **_timeout_kwargs(timeout), **kwargs
+            )
+        except TIMEOUT_ERRORS:
+            policy.record_timeout(stage, model, time.perf_counter() - started)
+            raise
+        cached = counter is not None and counter.cache_hits > cache_hits
+        usage = getattr(response, "usage", None)
+        cost = policy.record_call(stage, model, time.perf_counter() - started, usage, cached)
+        _record_usage(usage, counter, llm_span, stage, cached, cost)
+    return response
+
+
+async def achat_completion(client, model: str, messages: list, stage: str, escalation: int = 0, **kwargs):
+    """Async version of chat_completion() for AsyncOpenAI clients."""
+    counter = _active_counter.get()
+    policy = get_model_policy()
+    models = _tiers(policy, stage, model, counter, escalation)
+    for tier, tier_model in enumerate(models):
+        try:
+            return await _acomplete_once(client, policy, tier_model, messages, stage, counter, **kwargs)
+        except TIMEOUT_ERRORS:
+            if tier == len(models) - 1:
+                raise
+
+
+async def _acomplete_once(client, policy, model: str, messages: list, stage: str, counter, **kwargs):
+    _check_budget(policy, counter, stage)
+    _count_call(stage)
+    cache_hits = counter.cache_hits if counter is not None else 0
+    timeout = policy.timeout_for(stage, counter)
+    started = time.perf_counter()
+
+    with span(f"llm.{stage}", stage=stage, model=model) as llm_span:
+        try:
+            # wait_for bounds the whole call, including the client's own retries
+            response = await asyncio.wait_for(
+                client.chat.completions.create(model=model, messages=messages, **kwargs), timeout
+            )
+        except TIMEOUT_ERRORS:
+            policy.record_timeout(stage, model, time.perf_counter() - started)
+            raise
+        cached = counter is not None and counter.cache_hits > cache_hits
+        usage = getattr(response, "usage", None)
+        cost = policy.record_call(stage, model, time.perf_counter() - started, usage, cached)
+        _record_usage(usage, counter, llm_span, stage, cached, cost)
+    return response
+
+
+def _delta_text(chunk) -> str:
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def _read_chunk(chunk, llm_span, started: float, first: bool) -> str:
+    """Text of one streamed chunk, marking the first one the user sees."""
+    text = _delta_text(chunk)
+    if text:
+        record_first_token()
+        if first:
+            llm_span.set("time_to_first_token_ms", (time.perf_counter() - started) * 1000)
+    return text
+
+
+def _finish_stream(policy, stage: str, model: str, started: float, usage, llm_span):
+    """Record a completed stream; its last chunk carried the usage of the whole stream."""
+    cost = policy.record_call(stage, model, time.perf_counter() - started, usage)
+    _record_usage(usage, _active_counter.get(), llm_span, stage, cached=False, cost=cost)
+
+
+def stream_chat_completion(client, model: str, messages: list, stage: str, **kwargs):
+    """Stream one chat completion, yielding text pieces as they arrive.
+
+    When the stream does not start within the policy's timeout, the stage's
+    next model is tried; once text has arrived there is no fallback.
+    """
+    counter = _active_counter.get()
+    policy = get_model_policy()
+    models = policy.models_for(stage, model, counter)
+    for tier, tier_model in enumerate(models):
+        _check_budget(policy, counter, stage)
+        _count_call(stage)
+        # Not made the current span: the caller's code runs between the pieces
+        llm_span = start_span(f"llm.{stage}", stage=stage, model=tier_model, streamed=True)
+        started, first, usage = time.perf_counter(), True, None
+        try:
+            try:
+                stream = client.chat.completions.create(
+                    model=tier_model, messages=messages, stream=True, stream_options={"include_usage": True},
+                    **_timeout_kwargs(policy.timeout_for(stage, counter)), **kwargs
+                )
+            except TIMEOUT_ERRORS as e:
+                policy.record_timeout(stage, tier_model, time.perf_counter() - started)
+                llm_span.record_error(e)
+                if tier < len(models) - 1:
+                    continue
+                raise
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                text = _read_chunk(chunk, llm_span, started, first)
+                if text:
+                    first = False
+                    yield text
+            _finish_stream(policy, stage, tier_model, started, usage, llm_span)
+            return
+        except Exception as e:
+            llm_span.record_error(e)
+            raise
+        finally:
+            end_span(llm_span)
+
+
+async def astream_chat_completion(client, model: str, messages: list, stage: str, **kwargs):
+    """Async version of stream_chat_completion() for AsyncOpenAI clients."""
+    counter = _active_counter.get()
+    policy = get_model_policy()
+    models = policy.models_for(stage, model, counter)
+    for tier, tier_model in enumerate(models):
+        _check_budget(policy, counter, stage)
+        _count_call(stage)
+        llm_span = start_span(f"llm.{stage}", stage=stage, model=tier_model, streamed=True)
+        started, first, usage = time.perf_counter(), True, None
+        try:
+            try:
+                stream = await asyncio.wait_for(client.chat.completions.create(
+                    model=tier_model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+                ), policy.timeout_for(stage, counter))
+            except TIMEOUT_ERRORS as e:
+                policy.record_timeout(stage, tier_model, time.perf_counter() - started)
+                llm_span.record_error(e)
+                if tier < len(models) - 1:
+                    continue
+                raise
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                text = _read_chunk(chunk, llm_span, started, first)
+                if text:
+                    first = False
+                    yield text
+            _finish_stream(policy, stage, tier_model, started, usage, llm_span)
+            return
+        except Exception as e:
+            llm_span.record_error(e)
+            raise
+        finally:
+            end_span(llm_span)
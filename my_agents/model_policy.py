@@ -0,0 +1,195 @@
+from dataclasses import dataclass
+import json
+import threading
+import time
+
+# List prices in USD per million (prompt, completion) tokens; a policy file can add or override models.
+# Dated snapshots ("gpt-4.1-2025-04-14") are priced by their longest matching prefix.
+DEFAULT_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+# Stages a small model handles well: short, schema-checked answers that can be escalated when invalid
+SMALL_MODEL_STAGES = ("routing", "chain_of_thought", "tool_selection", "merchant_classification")
+
+# Calls never get less time than this, even when the request's latency budget is spent
+MIN_TIMEOUT = 1.0
+
+
+@dataclass
+class StagePolicy:
+    """Models for one pipeline stage, cheapest first.
+
+    A call starts on the first model and moves to the next one when it
+    times out after `timeout` seconds or its answer is invalid.
+    """
+
+    models: list
+    timeout: float = None
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    cache_hits: int = 0
+    timeouts: int = 0
+    escalations: int = 0
+    latency: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "timeouts": self.timeouts,
+            "escalations": self.escalations,
+            "mean_latency_ms": self.latency / self.calls * 1000 if self.calls else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": self.cost_usd,
+        }
+
+
+class ModelPolicy:
+    """Pick the model for every LLM call by pipeline stage, within per-request budgets.
+
+    Stages without a StagePolicy use the model the caller asked for, so the
+    empty policy changes nothing. Once a request has used `token_budget`
+    billed tokens or run for `latency_budget` seconds, it makes no more LLM
+    calls (they raise llm_client.BudgetExceeded), and the time left caps
+    every call's timeout. A call that starts inside the budget can take the
+    request past it. Latency, tokens and cost are recorded per stage
+    and model (see stats()) so the tiers can be tuned.
+    """
+
+    def __init__(self, stages: dict = None, prices: dict = None, token_budget: int = None,
+                 latency_budget: float = None):
+        self.stages = stages or {}
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self.token_budget = token_budget
+        self.latency_budget = latency_budget
+        self.lock = threading.Lock()
+        self._stats = {}  # (stage, model) -> StageStats
+
+    @classmethod
+    def tiered(cls, model: str, small_model: str, **budgets) -> "ModelPolicy":
+        """Small model first for routing-like stages, escalating to `model`; everything else on `model`."""
+        return cls({stage: StagePolicy([small_model, model]) for stage in SMALL_MODEL_STAGES}, **budgets)
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "ModelPolicy":
+        """Policy from {"stages": {stage: {"models": [...], "timeout": s}}, "prices": {model: [in, out]},
+        "token_budget": n, "latency_budget": s}, the layout of a MODEL_POLICY_PATH file."""
+        return cls(
+            {stage: StagePolicy(list(spec["models"]), spec.get("timeout")) for stage, spec in config.get("stages", {}).items()},
+            {model: tuple(price) for model, price in config.get("prices", {}).items()},
+            config.get("token_budget"),
+            config.get("latency_budget"),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ModelPolicy":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def models_for(self, stage: str, model: str, counter=None) -> list:
+        """Models to try for one call of `stage`, in order; `counter` is the request's LLMCallCounter."""
+        stage_policy = self.stages.get(stage)
+        if stage_policy is None:
+            return [model]
+        if self.over_budget(counter):
+            return stage_policy.models[:1]
+        return list(stage_policy.models)
+
+    def timeout_for(self, stage: str, counter=None):
+        """Seconds one call may take before falling back, or None to wait as long as the client does."""
+        stage_policy = self.stages.get(stage)
+        timeout = stage_policy.timeout if stage_policy else None
+        if self.latency_budget is not None and counter is not None and counter.started_at is not None:
+            remaining = self.latency_budget - (time.perf_counter() - counter.started_at)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return None if timeout is None else max(timeout, MIN_TIMEOUT)
+
+    def over_budget(self, counter) -> bool:
+        if counter is None:
+            return False
+        if self.token_budget is not None and counter.prompt_tokens + counter.completion_tokens >= self.token_budget:
+            return True
+        return self.latency_budget is not None and counter.started_at is not None and \
+            time.perf_counter() - counter.started_at >= self.latency_budget
+
+    def price(self, model: str):
+        """(prompt, completion) USD per million tokens, or None for an unknown model."""
+        if model in self.prices:
+            return self.prices[model]
+        prefixes = [name for name in self.prices if model.startswith(name + "-")]
+        return self.prices[max(prefixes, key=len)] if prefixes else None
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.price(model)
+        if price is None:
+            return 0.0
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def record_call(self, stage: str, model: str, latency: float, usage=None, cached: bool = False) -> float:
+        """Record one finished call and return what it cost (0 when served from cache)."""
+        prompt_tokens = usage.prompt_tokens if usage is not None and not cached else 0
+        completion_tokens = usage.completion_tokens if usage is not None and not cached else 0
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        with self.lock:
+            stats = self._stage_stats(stage, model)
+            stats.calls += 1
+            stats.cache_hits += cached
+            stats.latency += latency
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.cost_usd += cost
+        return cost
+
+    def record_timeout(self, stage: str, model: str, latency: float):
+        with self.lock:
+            stats = self._stage_stats(stage, model)
+            stats.timeouts += 1
+            stats.latency += latency
+
+    def record_escalation(self, stage: str, model: str):
+        """`model` gave an invalid answer for `stage` and the call moved up a tier."""
+        with self.lock:
+            self._stage_stats(stage, model).escalations += 1
+
+    def stats(self) -> dict:
+        """{stage: {model: counters}} for every stage and model used so far."""
+        with self.lock:
+            result = {}
+            for (stage, model), stats in self._stats.items():
+                result.setdefault(stage, {})[model] = stats.to_dict()
+            return result
+
+    def _stage_stats(self, stage: str, model: str) -> StageStats:
+        stats = self._stats.get((stage, model))
+        if stats is None:
+            stats = self._stats[(stage, model)] = StageStats()
+        return stats
+
+
+_policy = ModelPolicy()
+
+
+def configure_model_policy(policy: ModelPolicy = None) -> ModelPolicy:
+    """Install the process-wide model policy; with None, every stage uses the caller's model."""
+    global _policy
+    _policy = policy or ModelPolicy()
+    return _policy
+
+
+def get_model_policy() -> ModelPolicy:
+    return _policy
@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .llm_client import record_first_token
+from .tracing import span
+from .router import (
+    LOCAL_CONFIDENCE_THRESHOLD, aclassify_tasks_with_llm, classify_locally, classify_tasks_with_llm, keyword_scores,
+)
+
+# Breaks between independent requests: ";", "?", "!", a full stop before a space, "and", "also", "then"
+_CLAUSE_BREAK = re.compile(r"\s*(?:[;?!]+|\.(?=\s)|,?\s+and(?=\s)|,?\s+(?=also\s|then\s))\s*", re.IGNORECASE)
+_LEADING_LINK = re.compile(r"^(?:and|also|then)\b[\s,]*", re.IGNORECASE)
+
+# Separates the answers of a compound request
+ANSWER_SEPARATOR = "\n\n"
+
+
+def split_clauses(user_input: str) -> list:
+    """Split a message into clauses at conjunctions and sentence breaks."""
+    clauses = (_LEADING_LINK.sub("", clause.strip()) for clause in _CLAUSE_BREAK.split(user_input.strip()))
+    return [clause for clause in clauses if clause]
+
+
+def _task(user_input: str, decision: dict = None) -> dict:
+    return {"input": user_input, "decision": decision}
+
+
+def plan_locally(user_input: str):
+    """Sub-tasks for a compound message whose clauses the keyword router is sure about, else None.
+
+    Clauses for the same agent and tool are kept together, so "compare
+    project A and project B" stays one task. The message is only split when
+    every clause is confidently routed and at least two different tools are
+    needed; anything less clear-cut is left to the single-route path.
+
+    Every clause must name its tool with routing keywords: a fragment such
+    as "discount rate 10%" or "payment of 90" usually completes another
+    clause, and would otherwise pass as a "<merchant> <amount>" expense.
+    """
+    groups = {}
+    for clause in split_clauses(user_input):
+        if not keyword_scores(" ".join(clause.lower().split())):
+            return None
+        decision = classify_locally(clause)
+        if decision["agent"] is None or decision["confidence"] < LOCAL_CONFIDENCE_THRESHOLD:
+            return None
+        groups.setdefault((decision["agent"], decision["tool"]), []).append((clause, decision))
+    if len(groups) < 2:
+        return None
+
+    tasks = []
+    for target, clauses in groups.items():
+        text = " and ".join(clause for clause, _ in clauses)
+        decision = classify_locally(text) if len(clauses) > 1 else clauses[0][1]
+        if (decision["agent"], decision["tool"]) != target:
+            decision = clauses[0][1]
+        tasks.append(_task(text, decision))
+    return tasks
+
+
+def _tasks_from_decisions(user_input: str, decisions: list) -> list:
+    """One task per distinct (agent, tool) the LLM router picked, each seeing the whole message."""
+    tasks, seen = [], set()
+    for decision in decisions:
+        target = (decision["agent"], decision["tool"])
+        if target not in seen:
+            seen.add(target)
+            tasks.append(_task(user_input, decision))
+    return tasks
+
+
+def plan_request(client, model: str, agents: dict, user_input: str) -> list:
+    """Split a request into independent sub-tasks, each {"input", "decision"}.
+
+    Costs no more LLM calls than routing a single request: clear-cut
+    messages are planned locally, everything else by the one routing call,
+    which returns a function call per independent request.
+    """
+    with span("route") as route_span:
+        tasks = _plan_without_llm(agents, user_input)
+        if tasks is None:
+            tasks = _tasks_from_decisions(user_input, classify_tasks_with_llm(client, model, agents, user_input))
+        _describe_plan(route_span, tasks)
+    return tasks
+
+
+async def aplan_request(client, model: str, agents: dict, user_input: str) -> list:
+    """Async version of plan_request()."""
+    with span("route") as route_span:
+        tasks = _plan_without_llm(agents, user_input)
+        if tasks is None:
+            tasks = _tasks_from_decisions(user_input, await aclassify_tasks_with_llm(client, model, agents, user_input))
+        _describe_plan(route_span, tasks)
+    return tasks
+
+
+def _plan_without_llm(agents: dict, user_input: str):
+    tasks = plan_locally(user_input)
+    if tasks:
+        return tasks
+
+    decision = classify_locally(user_input)
+    if decision["agent"] in agents and decision["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD:
+        return [_task(user_input, decision)]
+    return None
+
+
+def _describe_plan(route_span, tasks: list):
+    route_span.set("source", tasks[0]["decision"]["source"])
+    route_span.set("tasks", len(tasks))
+    route_span.set("tools", ",".join(f"{task['decision']['agent']}.{task['decision']['tool']}" for task in tasks))
+
+
+def _emit_answer(index: int, text: str, on_token=None):
+    if on_token is not None:
+        record_first_token()
+        on_token((ANSWER_SEPARATOR if index else "") + text)
+
+
+def run_tasks(agents: dict, tasks: list, on_token=None) -> str:
+    """Handle the sub-tasks on a thread pool and merge the answers in task order.
+
+    Each branch runs in a copy of the caller's context, so it sees the same
+    session and LLM call counter. Answers are passed to `on_token` in order
+    as soon as they and every earlier one are ready.
+    """
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, agents[task["decision"]["agent"]].handle,
+                        task["input"], task["decision"])
+            for task in tasks
+        ]
+        answers = []
+        for index, future in enumerate(futures):
+            answers.append(future.result())
+            _emit_answer(index, answers[-1], on_token)
+    return ANSWER_SEPARATOR.join(answers)
+
+
+async def arun_tasks(agents: dict, tasks: list, arguments: dict = None, on_token=None) -> str:
+    """Async version of run_tasks(): the branches run concurrently as asyncio tasks."""
+    branches = [
+        asyncio.ensure_future(agents[task["decision"]["agent"]].ahandle(task["input"], task["decision"], arguments))
+        for task in tasks
+    ]
+    try:
+        answers = []
+        for index, branch in enumerate(branches):
+            answers.append(await branch)
+            _emit_answer(index, answers[-1], on_token)
+    finally:
+        for branch in branches:
+            branch.cancel()  # only still-running branches, after an error or timeout
+    return ANSWER_SEPARATOR.join(answers)
@@ -1,181 +1,296 @@
-from .base_agent import BaseAgent
-from tools.project_evaluator import build_cash_flows, calculate_project_npv
-from tools.debt_optimizer import suggest_debt_payoff
-import json
-
-class ProjectManagementAgent(BaseAgent):
-    def __init__(self, client, model, session_memory):
-        super().__init__(
-            client=client,
-            model=model,
-            name="Project Management Agent",
-            description="Manages user projects, evaluates risk, and optimizes debt."
-        )
-        self.session_memory = session_memory
-
-        self.register_tool("project_npv_calculator", None)
-        self.register_tool("debt_payoff_optimizer", None)
-
-    def handle(self, user_input: str) -> str:
-        # STEP 1: Classify if debt or project task
-        task_type = self.classify_task_type(user_input)
-
-        if task_type == "debt":
-            return self.optimize_debt(user_input)
-
-        # Else continue normal project task
-        reasoning = self.reason_with_chain_of_thought(user_input)
-        print(f"[{self.name}] Chain of Thought Reasoning:\n{reasoning['reasoning']}\n")
-
-        final_action = reasoning['final_action'].lower()
-
-        if final_action.startswith("delegate to"):
-            _, agent_key = final_action.split("delegate to")
-            agent_key = agent_key.strip()
-
-            if agent_key == self.name.lower().split()[0]:
-                print(f"[{self.name}] I am already the correct agent. Reasoning internally...")
-            else:
-                if agent_key in self.agents:
-                    print(f"[{self.name}] Delegating task to {agent_key.capitalize()} Agent...")
-                    return self.agents[agent_key].handle(user_input)
-                else:
-                    return f"[{self.name}] Unknown delegation target."
-
-        if final_action not in self.tools:
-            return f"[{self.name}] Sorry, I could not find the right tool."
-
-        if final_action == "project_npv_calculator":
-            return self.evaluate_projects(user_input)
-
-        else:
-            return f"[{self.name}] Selected an unknown tool."
-
-    def classify_task_type(self, user_input: str) -> str:
-        """Classify if the user input is about debt or project evaluation."""
-        system_prompt = """You are a classification assistant. 
-
-        Classify the following user input as either:
-        - "debt" (if about loans, payments, debts, payoff)
-        - "project" (if about investments, projects, cash flows, returns)
-
-        Only reply with one word: "debt" or "project"."""
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input}
-            ]
-        )
-
-        classification = response.choices[0].message.content.strip().lower()
-        return classification
-
-    def get_discount_rate(self):
-        """Ask user for a custom discount rate."""
-        try:
-            rate = input("[Project Agent] Enter discount rate as decimal (default 0.10 for 10%): ").strip()
-            if not rate:
-                return 0.10
-            return float(rate)
-        except ValueError:
-            print("Invalid input. Using default 10% discount rate.")
-            return 0.10
-
-    def extract_projects_from_text(self, user_input: str) -> dict:
-        """Use LLM to extract structured project data."""
-        system_prompt = """You are a project extraction assistant.
-
-        From the user's description, extract a list of projects. For each project, identify:
-
-        - name (string)
-        - initial_investment (float)
-        - periods (int)
-        - base_income (float)
-        - growth_rate (float, optional, default 0 if not mentioned)
-        - expenses (float, optional, default 0 if not mentioned)
-        - unexpected_costs (dictionary where keys are periods as strings and values are amounts)
-
-        Output STRICTLY as JSON:
-        {
-            "projects": [ 
-                { project 1 },
-                { project 2 },
-                ...
-            ]
-        }
-        """
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input}
-            ]
-        )
-
-        try:
-            projects_data = json.loads(response.choices[0].message.content.strip())
-            return projects_data
-        except Exception as e:
-            print("[Project Agent] Failed to parse project JSON:", e)
-            print("[Project Agent] Raw LLM output:", response.choices[0].message.content.strip())
-            return {"projects": []}
-
-    def evaluate_projects(self, user_input: str) -> str:
-        """Evaluate multiple projects and summarize the best option."""
-        projects_info = self.extract_projects_from_text(user_input)
-        projects = projects_info.get("projects", [])
-
-        if not projects:
-            return "Sorry, I could not understand the project details. Could you describe them again mentioning investment amount, expected cash inflows, periods, and unexpected costs?"
-
-        evaluated_projects = []
-        discount_rate = self.get_discount_rate()
-
-        # === Collect results ===
-        for project in projects:
-            cash_flows = build_cash_flows(project)
-            npv = calculate_project_npv(project["initial_investment"], cash_flows, discount_rate)
-            evaluated_projects.append({
-                "name": project["name"],
-                "npv": npv,
-                "cash_flows": cash_flows
-            })
-
-        # === Sort and Save ===
-        ranked_projects = sorted(evaluated_projects, key=lambda x: x["npv"], reverse=True)
-        self.session_memory.update("last_evaluated_projects", ranked_projects)
-
-        # === STEP 1: Print the detailed NPV and Cash Flow Tables NOW ===
-        print("\n📊 Project Evaluation Results:")
-        for proj in ranked_projects:
-            print(f"- {proj['name']}: NPV = ${proj['npv']:.2f}")
-            print(self.build_cash_flow_table(proj["cash_flows"]))
-            print()
-
-        # === STEP 2: Prepare a small context only for final summary ===
-        best_project = ranked_projects[0]
-        context = f"The project with the highest NPV is {best_project['name']}."
-
-        # === STEP 3: Ask LLM to generate a final user-friendly summary ===
-        return self.generate_response(context)
-
-    def optimize_debt(self, user_input: str) -> str:
-        """Help user optimize debt payment based on budget and monthly payments."""
-        try:
-            budget = float(input("[Project Agent] Enter your available budget for extra payments: "))
-            monthly_payment = float(input("[Project Agent] Enter your current monthly debt payment: "))
-            suggestion = suggest_debt_payoff(budget, monthly_payment)
-            return self.generate_response(f"Debt payoff suggestion: {suggestion}")
-        except ValueError:
-            return "Invalid input. Please enter valid numeric values."
-
-    def build_cash_flow_table(self, cash_flows: list) -> str:
-        """Build a neat cash flow table."""
-        table = "Period | Cash Flow\n"
-        table += "-------|----------\n"
-        for i, flow in enumerate(cash_flows, start=1):
-            table += f"{i:^7}| ${flow:,.2f}\n"
-        return table
\ No newline at end of file
+import os
+
+from .base_agent import CONSOLE_LOCK, BaseAgent, ToolInputError
+from .batching import MicroBatcher
+from .prompts import PROMPTS
+from .tool_schemas import DebtArguments, DebtList, ProjectArguments, ProjectList, acall_function, call_function
+from tools.project_evaluator import evaluate_project_groups, evaluate_projects_batch
+from tools.project_simulator import simulate_project_npv
+from tools.debt_optimizer import payoff_plan, suggest_debt_payoff
+import numpy as np
+
+class ProjectManagementAgent(BaseAgent):
+    def __init__(self, client, model, session_memory):
+        super().__init__(
+            client=client,
+            model=model,
+            name="Project Management Agent",
+            description="Manages user projects, evaluates risk, and optimizes debt."
+        )
+        self.session_memory = session_memory
+        # Large simulations split their path chunks over this many processes
+        self.simulation_workers = int(os.getenv("SIMULATION_WORKERS", str(os.cpu_count() or 1)))
+
+        self.register_tool(
+            "project_npv_calculator",
+            None,
+            "projects: list of {name, initial_investment, periods, base_income, growth_rate, expenses, unexpected_costs}, discount_rate",
+            schema=ProjectArguments,
+        )
+        self.register_tool(
+            "project_risk_simulator",
+            simulate_project_npv,
+            "projects (same as project_npv_calculator), discount_rate, n_paths, seed",
+            schema=ProjectArguments,
+        )
+        self.register_tool(
+            "debt_payoff_optimizer",
+            payoff_plan,
+            "debts: list of {name, balance, apr, minimum_payment}, extra_budget",
+            {"extra_budget": "[Project Agent] How much extra can you put toward debt each month? "},
+            schema=DebtArguments,
+        )
+
+        # Concurrent async requests for NPVs at the same discount rate are evaluated in one pass
+        self.npv_batcher = MicroBatcher(evaluate_project_groups, window=float(os.getenv("TOOL_BATCH_WINDOW", "0.002")))
+
+    def collect_arguments(self, final_action: str, user_input: str, arguments: dict) -> dict:
+        if final_action == "debt_payoff_optimizer" and not arguments.get("debts"):
+            arguments = {**arguments, "debts": self.extract_debts_from_text(user_input)}
+        if final_action not in PROJECT_TOOLS:
+            return super().collect_arguments(final_action, user_input, arguments)
+
+        arguments = dict(arguments)
+        if not arguments.get("projects"):
+            arguments["projects"] = self.extract_projects_from_text(user_input).get("projects", [])
+        arguments["discount_rate"] = self.get_discount_rate(arguments)
+        return arguments
+
+    async def acollect_arguments(self, final_action: str, user_input: str, arguments: dict) -> dict:
+        if final_action == "debt_payoff_optimizer" and not arguments.get("debts"):
+            arguments = {**arguments, "debts": await self.aextract_debts_from_text(user_input)}
+        if final_action not in PROJECT_TOOLS:
+            return await super().acollect_arguments(final_action, user_input, arguments)
+
+        arguments = dict(arguments)
+        if not arguments.get("projects"):
+            projects_info = await self.aextract_projects_from_text(user_input)
+            arguments["projects"] = projects_info.get("projects", [])
+        if arguments.get("discount_rate") is None:
+            arguments["discount_rate"] = 0.10
+        return arguments
+
+    def execute_tool(self, final_action: str, arguments: dict) -> str:
+        if final_action == "project_npv_calculator":
+            return self.evaluate_projects(arguments["projects"], float(arguments["discount_rate"]))
+
+        elif final_action == "project_risk_simulator":
+            return self.simulate_projects(
+                arguments["projects"],
+                float(arguments["discount_rate"]),
+                int(arguments.get("n_paths") or 100_000),
+                arguments.get("seed"),
+            )
+
+        elif final_action == "debt_payoff_optimizer":
+            return self.optimize_debt(arguments)
+
+        else:
+            raise ToolInputError(f"[{self.name}] Selected an unknown tool.")
+
+    async def aexecute_tool(self, final_action: str, arguments: dict) -> str:
+        if final_action == "project_npv_calculator":
+            _require_projects(arguments["projects"])
+            results = await self.npv_batcher.submit((arguments["projects"], float(arguments["discount_rate"])))
+            return self.report_projects(results)
+        return await super().aexecute_tool(final_action, arguments)
+
+    def get_discount_rate(self, arguments: dict = None) -> float:
+        """Use the extracted discount rate, or ask user for a custom one."""
+        if arguments and arguments.get("discount_rate") is not None:
+            return float(arguments["discount_rate"])
+        try:
+            with CONSOLE_LOCK:
+                rate = input("[Project Agent] Enter discount rate as decimal (default 0.10 for 10%): ").strip()
+            if not rate:
+                return 0.10
+            return float(rate)
+        except ValueError:
+            print("Invalid input. Using default 10% discount rate.")
+            return 0.10
+
+    def extract_projects_from_text(self, user_input: str) -> dict:
+        """Use LLM to extract structured project data."""
+        try:
+            _, projects, _ = call_function(
+                self.client, self.model, _extraction_messages(PROJECT_EXTRACTION_PROMPT, user_input),
+                "project_extraction", PROJECT_FUNCTIONS, temperature=0,
+            )
+            return projects
+        except ValueError as e:
+            print("[Project Agent] Failed to extract projects:", e)
+            return {"projects": []}
+
+    async def aextract_projects_from_text(self, user_input: str) -> dict:
+        try:
+            _, projects, _ = await acall_function(
+                self.client, self.model, _extraction_messages(PROJECT_EXTRACTION_PROMPT, user_input),
+                "project_extraction", PROJECT_FUNCTIONS, temperature=0,
+            )
+            return projects
+        except ValueError as e:
+            print("[Project Agent] Failed to extract projects:", e)
+            return {"projects": []}
+
+    def extract_debts_from_text(self, user_input: str) -> list:
+        """Use LLM to extract the user's debts."""
+        try:
+            _, debts, _ = call_function(
+                self.client, self.model, _extraction_messages(DEBT_EXTRACTION_PROMPT, user_input),
+                "debt_extraction", DEBT_FUNCTIONS, temperature=0,
+            )
+            return debts["debts"]
+        except ValueError as e:
+            print("[Project Agent] Failed to extract debts:", e)
+            return []
+
+    async def aextract_debts_from_text(self, user_input: str) -> list:
+        try:
+            _, debts, _ = await acall_function(
+                self.client, self.model, _extraction_messages(DEBT_EXTRACTION_PROMPT, user_input),
+                "debt_extraction", DEBT_FUNCTIONS, temperature=0,
+            )
+            return debts["debts"]
+        except ValueError as e:
+            print("[Project Agent] Failed to extract debts:", e)
+            return []
+
+    def evaluate_projects(self, projects: list, discount_rate: float) -> str:
+        """Evaluate multiple projects and return the context for the final summary."""
+        _require_projects(projects)
+        return self.report_projects(evaluate_projects_batch(projects, [discount_rate]))
+
+    def report_projects(self, results: dict) -> str:
+        """Rank evaluated projects, remember and print them, and return the context for the final summary."""
+        evaluated_projects = []
+        for i, name in enumerate(results["names"]):
+            irr = results["irr"][i]
+            evaluated_projects.append({
+                "name": name,
+                "npv": float(results["npv"][i, 0]),
+                "irr": float(irr) if results["irr_converged"][i] else None,
+                "payback_period": None if np.isnan(results["payback_period"][i]) else float(results["payback_period"][i]),
+                "cash_flows": results["cash_flows"][i, :results["periods"][i]].tolist()
+            })
+
+        # === Sort and Save ===
+        ranked_projects = sorted(evaluated_projects, key=lambda x: x["npv"], reverse=True)
+        self.session_memory.update("last_evaluated_projects", ranked_projects)
+
+        # === STEP 1: Print the detailed NPV and Cash Flow Tables NOW ===
+        print("\n📊 Project Evaluation Results:")
+        for proj in ranked_projects:
+            irr = f"{proj['irr']:.2%}" if proj["irr"] is not None else "n/a"
+            print(f"- {proj['name']}: NPV = ${proj['npv']:.2f}, IRR = {irr}")
+            print(self.build_cash_flow_table(proj["cash_flows"]))
+            print()
+
+        # === STEP 2: Prepare a small context only for final summary ===
+        best_project = ranked_projects[0]
+        context = f"The project with the highest NPV is {best_project['name']} (NPV ${best_project['npv']:,.2f}"
+        if best_project["irr"] is not None:
+            context += f", IRR {best_project['irr']:.2%}"
+        return context + ")."
+
+    def simulate_projects(self, projects: list, discount_rate: float, n_paths: int, seed=None) -> str:
+        """Monte Carlo NPV distribution per project, returned as context for the final summary."""
+        _require_projects(projects)
+
+        simulations = []
+        print("\n🎲 Project Risk Simulation:")
+        for project in projects:
+            result = simulate_project_npv(
+                project, discount_rate, n_paths=n_paths, seed=seed, workers=self.simulation_workers
+            )
+            simulations.append({"name": project.get("name", "Project"), **result})
+            print(
+                f"- {simulations[-1]['name']}: mean NPV ${result['mean']:,.2f}, "
+                f"P5 ${result['p5']:,.2f}, P50 ${result['p50']:,.2f}, P95 ${result['p95']:,.2f}, "
+                f"P(NPV < 0) = {result['prob_negative']:.1%}"
+            )
+        self.session_memory.update("last_project_simulations", simulations)
+
+        safest = min(simulations, key=lambda x: x["prob_negative"])
+        return "; ".join(
+            f"{sim['name']}: mean NPV ${sim['mean']:,.2f}, 90% range ${sim['p5']:,.2f} to ${sim['p95']:,.2f}, "
+            f"{sim['prob_negative']:.1%} chance of losing money"
+            for sim in simulations
+        ) + f". Lowest risk of a negative NPV: {safest['name']}."
+
+    def optimize_debt(self, arguments: dict) -> str:
+        """Compare avalanche and snowball payoff plans for the user's debts."""
+        debts = arguments.get("debts") or []
+        try:
+            extra_budget = float(arguments.get("extra_budget") or 0)
+            if not debts and arguments.get("monthly_payment") is not None:
+                # Nothing itemized: fall back to the simple budget check
+                return f"Debt payoff suggestion: {suggest_debt_payoff(extra_budget, float(arguments['monthly_payment']))}"
+            plan = self.tools["debt_payoff_optimizer"](debts, extra_budget) if debts else None
+        except (KeyError, TypeError, ValueError):
+            raise ToolInputError("Invalid input. Please give each debt a balance, APR and minimum payment.")
+        if plan is None:
+            raise ToolInputError("Sorry, I could not understand your debts. Please list each one with its balance, APR and minimum payment.")
+        self.session_memory.update("last_debt_plan", {
+            strategy: {key: value for key, value in details.items() if key != "schedule"}
+            for strategy, details in plan["plans"].items()
+        })
+
+        print("\n💳 Debt Payoff Plans:")
+        for strategy, details in plan["plans"].items():
+            finish = details["payoff_date"] or "not within 50 years"
+            print(f"- {strategy.capitalize()}: debt-free {finish}, total interest ${details['total_interest']:,.2f}")
+            for debt in details["debts"]:
+                print(f"    {debt['name']}: paid off {debt['payoff_date'] or 'never'}, interest ${debt['interest']:,.2f}")
+
+        best = plan["plans"][plan["best_strategy"]]
+        others = ", ".join(
+            f"{strategy} ${details['total_interest']:,.2f} interest"
+            for strategy, details in plan["plans"].items() if strategy != plan["best_strategy"]
+        )
+        if best["payoff_date"] is None:
+            return "With these payments the debts are never paid off: the minimum payments do not cover the interest."
+        return (
+            f"With ${extra_budget:,.2f} extra per month, the {plan['best_strategy']} strategy is debt-free by "
+            f"{best['payoff_date']} paying ${best['total_interest']:,.2f} interest ({others}). "
+            f"Pay off order: {', '.join(debt['name'] for debt in sorted(best['debts'], key=lambda d: d['payoff_date'] or '9999'))}."
+        )
+
+    def build_cash_flow_table(self, cash_flows: list) -> str:
+        """Build a neat cash flow table."""
+        table = "Period | Cash Flow\n"
+        table += "-------|----------\n"
+        for i, flow in enumerate(cash_flows, start=1):
+            table += f"{i:^7}| ${flow:,.2f}\n"
+        return table
+
+
+# Tools that need project data extracted from the user's description
+PROJECT_TOOLS = ("project_npv_calculator", "project_risk_simulator")
+
+
+def _require_projects(projects: list):
+    if not projects:
+        raise ToolInputError("Sorry, I could not understand the project details. Could you describe them again mentioning investment amount, expected cash inflows, periods, and unexpected costs?")
+
+
+PROJECT_FUNCTIONS = {"submit_projects": ("Submit every project found in the description.", ProjectList)}
+DEBT_FUNCTIONS = {"submit_debts": ("Submit every debt found in the description.", DebtList)}
+
+
+def _extraction_messages(system_prompt: str, user_input: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_input},
+    ]
+
+
+# The field lists live in the function schemas; the prompts only say what to do with them
+DEBT_EXTRACTION_PROMPT = PROMPTS.register("debt_extraction", """
+    Extract every debt in the user's description and submit them with submit_debts.
+    APRs are decimals (19.9% -> 0.199).
+    """)
+
+PROJECT_EXTRACTION_PROMPT = PROMPTS.register("project_extraction", """
+    Extract every project in the user's description and submit them with submit_projects.
+    Leave out growth_rate, expenses and unexpected_costs when they are not mentioned.
+    """)
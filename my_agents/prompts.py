@@ -0,0 +1,94 @@
+import inspect
+import re
+import threading
+
+# Rough size of a token in English text; close enough for budgets, no tokenizer needed
+CHARS_PER_TOKEN = 4
+
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compile_prompt(template: str) -> str:
+    """Dedent a triple-quoted prompt, strip trailing spaces and collapse runs of blank lines."""
+    text = "\n".join(line.rstrip() for line in inspect.cleandoc(template).splitlines())
+    return _BLANK_LINES.sub("\n\n", text)
+
+
+class PromptRegistry:
+    """Named, versioned system prompts, compiled once.
+
+    Templates are cleaned up when registered and render() memoizes every
+    filled-in prompt, so the same prompt is always the same bytes: a stable
+    prefix that provider-side prompt caching can hit. Changing a prompt's text
+    requires a new version, which makes prompt changes visible in catalog()
+    (and the completion cache misses on the new text by itself).
+    """
+
+    def __init__(self):
+        self.templates = {}  # name -> (version, compiled template)
+        self.lock = threading.Lock()
+        self._rendered = {}
+
+    def register(self, name: str, template: str, version: int = 1) -> str:
+        """Add a prompt and return its compiled text; re-registering the same version must not change it."""
+        compiled = compile_prompt(template)
+        with self.lock:
+            existing = self.templates.get(name)
+            if existing is not None and existing[0] == version and existing[1] != compiled:
+                raise ValueError(f"Prompt {name!r} v{version} changed; register it under a new version.")
+            self.templates[name] = (version, compiled)
+            self._rendered = {key: text for key, text in self._rendered.items() if key[0] != name}
+        return compiled
+
+    def render(self, name: str, **values) -> str:
+        """The prompt with its {placeholders} filled in, built once per distinct set of values."""
+        key = (name, tuple(sorted(values.items())))
+        text = self._rendered.get(key)
+        if text is None:
+            text = self.templates[name][1].format(**values) if values else self.templates[name][1]
+            with self.lock:
+                self._rendered[key] = text
+        return text
+
+    def version(self, name: str) -> str:
+        return f"{name}@v{self.templates[name][0]}"
+
+    def catalog(self) -> dict:
+        """{name: {"version", "tokens"}} for every registered prompt (tokens of the unfilled template)."""
+        return {
+            name: {"version": version, "tokens": estimate_tokens(template)}
+            for name, (version, template) in sorted(self.templates.items())
+        }
+
+
+# Every agent's prompts, registered by the modules that use them
+PROMPTS = PromptRegistry()
+
+
+def fit_to_budget(text: str, max_tokens: int) -> str:
+    """Shorten tool output for the summary prompt to about `max_tokens`.
+
+    Whitespace is normalized first. If that is not enough, whole lines are
+    kept from the top (results lead with the headline), and a note says how
+    many lines were left out; a single overlong line is cut short.
+    """
+    lines = [" ".join(line.split()) for line in text.strip().splitlines()]
+    lines = [line for i, line in enumerate(lines) if line or (i and lines[i - 1])]
+    compact = "\n".join(lines)
+    if estimate_tokens(compact) <= max_tokens:
+        return compact
+
+    budget = max_tokens * CHARS_PER_TOKEN
+    kept, used = [], 0
+    for line in lines:
+        if used + len(line) + 1 > budget:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    if not kept:
+        return compact[:budget].rstrip() + "…"
+    return "\n".join(kept) + f"\n[{len(lines) - len(kept)} more lines left out]"
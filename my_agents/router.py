@@ -0,0 +1,374 @@
+import re
+
+from tools.expense_classifier import CATEGORY_KEYWORDS
+from .prompts import PROMPTS
+from .tool_schemas import acall_functions, call_functions
+
+# Local decisions below this confidence are sent to the LLM router instead
+LOCAL_CONFIDENCE_THRESHOLD = 0.75
+# A keyword-less "<merchant> <amount>" guess is left for the LLM router to confirm
+MERCHANT_GUESS_CONFIDENCE = 0.5
+
+_EXPENSE_WORDS = [word for words in CATEGORY_KEYWORDS.values() for word in words]
+
+# (agent, tool) -> {keyword: weight}
+ROUTING_KEYWORDS = {
+    ("spend", "expense_classifier"): dict.fromkeys(
+        _EXPENSE_WORDS + ["categorize", "categorise", "expense", "expenses", "spent on", "paid for", "bought"], 1
+    ),
+    ("spend", "category_override"): {
+        "recategorize": 4, "recategorise": 4, "should be categorized": 4, "always categorize": 4, "override": 3,
+    },
+    ("spend", "transaction_importer"): {
+        "import": 3, "bank export": 3, "statement": 2, "csv": 1, "ofx": 1, "jsonl": 1, "transactions file": 3,
+    },
+    ("spend", "spending_report"): {
+        "spending report": 4, "top merchants": 4, "spend by category": 4, "spending by category": 4,
+        "rolling average": 4, "where does my money go": 4, "how much did i spend": 3,
+    },
+    ("spend", "cash_flow_forecast"): {
+        "forecast": 6, "cash flow forecast": 8, "projected balance": 6, "shortfall": 4,
+        "run out of money": 6, "future balance": 6,
+    },
+    ("spend", "set_budget"): {
+        "set a budget": 4, "set my budget": 4, "set budget": 4, "monthly budget for": 3, "weekly budget for": 3,
+    },
+    ("spend", "budget_tracker"): {"budget": 1, "overspent": 2, "overspend": 2, "over budget": 2},
+    ("spend", "bill_reminder"): {"bill": 2, "bills": 2, "due date": 1, "upcoming": 1, "reminder": 1, "due within": 2},
+    ("spend", "add_bill"): dict.fromkeys(
+        ["add a bill", "add bill", "new bill", "recurring bill", "add a recurring bill", "add a recurring", "add a monthly bill",
+         "add an annual bill", "add a yearly bill", "add a weekly bill"], 10
+    ),
+    ("spend", "pay_bill"): {"paid my": 10, "paid the": 10, "pay bill": 10, "mark as paid": 10, "bill paid": 10},
+    ("investment", "investment_return_calculator"): {
+        "return on": 2, "roi": 2, "grew to": 2, "worth now": 1, "invested": 1, "investment return": 2,
+    },
+    ("investment", "portfolio_analyzer"): {"portfolio": 2, "fund": 1, "funds": 1, "holdings": 1, "stocks": 1},
+    ("investment", "rebalance_portfolio"): {
+        "rebalance": 6, "rebalancing": 6, "reallocate": 6, "reallocation": 6, "target weights": 6, "target allocation": 6,
+    },
+    ("investment", "portfolio_analytics"): {
+        "sharpe": 6, "volatility": 6, "drawdown": 6, "benchmark": 6, "underperforming": 6, "underperformers": 6,
+        "time-weighted": 6, "money-weighted": 6, "price history": 6, "covariance": 6,
+    },
+    ("project", "project_npv_calculator"): {
+        "npv": 3, "net present value": 3, "irr": 3, "vpn": 3, "cash flow": 2, "cash flows": 2, "project": 1, "projects": 1,
+    },
+    ("project", "project_risk_simulator"): {
+        "risk": 3, "risky": 3, "monte carlo": 4, "simulate": 3, "simulation": 3, "chance of losing": 3,
+    },
+    ("project", "debt_payoff_optimizer"): {
+        "debt": 2, "debts": 2, "loan": 2, "loans": 2, "payoff": 2, "pay off": 2, "mortgage": 2, "credit card": 2,
+    },
+}
+
+_KEYWORD_PATTERNS = {
+    route: re.compile(r"\b(" + "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)) + r")\b")
+    for route, words in ROUTING_KEYWORDS.items()
+}
+
+_NUMBER = r"-?\$?\d[\d,]*(?:\.\d+)?%?"
+_NUMBER_PATTERN = re.compile(_NUMBER)
+# Words that make a short "<merchant> <amount>" message a sentence instead ("I spent 450")
+_SENTENCE_WORDS = {"i", "me", "my", "we", "our", "is", "was", "are", "what", "how", "spent", "have", "has"}
+# ...or money coming in, or a trade, rather than spending ("salary 3000", "sold 10 shares")
+_NOT_SPENDING_WORDS = {
+    "salary", "paycheck", "payroll", "wage", "wages", "income", "bonus", "dividend", "dividends", "interest",
+    "refund", "refunded", "received", "earned", "deposit", "deposited", "transfer", "sold", "sell",
+    "shares", "share", "stock", "stocks", "units",
+}
+_PLAIN_NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+_BUDGET_PATTERN = re.compile(r"budget(?: is| of|:)?\s*(" + _NUMBER + ")")
+_PAYMENT_PATTERN = re.compile(r"(?:monthly )?payments?(?: is| of|:)?\s*(" + _NUMBER + ")")
+_EXTRA_PATTERN = re.compile(r"(" + _NUMBER + r")\s*(?:extra|more)\b|extra(?: payment| budget)?(?: of| is|:)?\s*(" + _NUMBER + ")")
+_DATE_PATTERN = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_BALANCE_PATTERN = re.compile(r"(?:balance(?: is| of|:)?|i have)\s*(" + _NUMBER + ")")
+_BENCHMARK_PATTERN = re.compile(
+    r"(?:(?:against|vs\.?|versus)(?:\s+the)?(?:\s+benchmark)?|benchmark(?: is|:)?)\s+(?!the\b)([a-z^][a-z0-9.^]{0,9})\b"
+)
+_DAYS_PATTERN = re.compile(r"(?:next|within|in)\s+(\d+)\s+days?")
+_EVERY_DAYS_PATTERN = re.compile(r"every\s+(\d+)\s+days?")
+_BILL_NAME_PATTERN = re.compile(r"(?:bill|paid)(?: for| my| the)?\s+([a-z][a-z ]*?)(?: bill)?(?:\s+(?:of|for|due|on|every|\$|\d)|$)")
+_PATH_PATTERN = re.compile(r"[^\s'\"]+\.(?:csv|ofx|qfx|jsonl)\b", re.IGNORECASE)
+_DISCOUNT_PATTERN = re.compile(r"discount rate(?: is| of|:)?\s*(" + _NUMBER + ")|(" + _NUMBER + r")\s*discount rate")
+
+
+def parse_number(text: str) -> float:
+    """Turn '$1,200', '8%' or '12.5' into a float. Percentages become decimals."""
+    cleaned = text.replace("$", "").replace(",", "")
+    if cleaned.endswith("%"):
+        return float(cleaned[:-1]) / 100
+    return float(cleaned)
+
+
+def _numbers(text: str) -> list:
+    return [parse_number(match) for match in _NUMBER_PATTERN.findall(text)]
+
+
+def _mentioned_category(text: str):
+    """Taxonomy category named in the text ('groceries' -> 'Groceries'), if any."""
+    for category in CATEGORY_KEYWORDS:
+        if re.search(r"\b" + re.escape(category.lower()) + r"\b", text):
+            return category
+    return None
+
+
+def _extract_arguments(tool: str, text: str, user_text: str) -> dict:
+    """Pull the arguments a tool needs straight out of clear-cut input.
+
+    `text` is the normalized, lowercased input; `user_text` keeps the
+    original case for values such as file paths.
+    """
+    numbers = _numbers(text)
+
+    if tool == "expense_classifier":
+        arguments = {"description": text}
+        if numbers:
+            arguments["amount"] = numbers[0]
+        return arguments
+
+    if tool == "transaction_importer":
+        path_match = _PATH_PATTERN.search(user_text)
+        return {"path": path_match.group(0)} if path_match else {}
+
+    if tool == "spending_report":
+        arguments = {"report": "by_category"}
+        if "merchant" in text:
+            arguments["report"] = "top_merchants"
+        elif "rolling" in text or "average" in text:
+            arguments["report"] = "rolling_average"
+        dates = _DATE_PATTERN.findall(text)
+        if len(dates) >= 2:
+            arguments["start"], arguments["end"] = dates[0], dates[1]
+        category = _mentioned_category(text)
+        if category:
+            arguments["category"] = category
+        return arguments
+
+    if tool == "bill_reminder":
+        days_match = _DAYS_PATTERN.search(text)
+        return {"days": int(days_match.group(1))} if days_match else {}
+
+    if tool == "cash_flow_forecast":
+        arguments = {}
+        balance_match = _BALANCE_PATTERN.search(text)
+        if balance_match:
+            arguments["balance"] = parse_number(balance_match.group(1))
+        days_match = _DAYS_PATTERN.search(text)
+        if days_match:
+            arguments["days"] = int(days_match.group(1))
+        return arguments
+
+    if tool == "add_bill":
+        arguments = {"frequency": "monthly", "interval": 1}
+        every_days = _EVERY_DAYS_PATTERN.search(text)
+        if every_days:
+            arguments["frequency"], arguments["interval"] = "days", int(every_days.group(1))
+        elif "weekly" in text or "every week" in text:
+            arguments["frequency"], arguments["interval"] = "days", 7
+        elif "annual" in text or "yearly" in text or "every year" in text:
+            arguments["frequency"] = "annual"
+        elif "one-off" in text or "one time" in text or "once" in text:
+            arguments["frequency"] = "once"
+        dates = _DATE_PATTERN.findall(text)
+        if dates:
+            arguments["due_date"] = dates[0]
+        amounts = _numbers(_DATE_PATTERN.sub(" ", _EVERY_DAYS_PATTERN.sub(" ", text)))
+        if len(amounts) == 1:
+            arguments["amount"] = amounts[0]
+        name_match = _BILL_NAME_PATTERN.search(text.replace("recurring ", "").replace("add a ", "add "))
+        if name_match and name_match.group(1).strip() not in ("a", "new"):
+            arguments["name"] = name_match.group(1).strip().title()
+        return arguments
+
+    if tool == "pay_bill":
+        name_match = _BILL_NAME_PATTERN.search(text)
+        return {"name": name_match.group(1).strip().title()} if name_match else {}
+
+    if tool == "set_budget":
+        arguments = {"period": "week" if "week" in text else "month"}
+        category = _mentioned_category(text)
+        if category:
+            arguments["category"] = category
+        if len(numbers) == 1:
+            arguments["amount"] = numbers[0]
+        return arguments
+
+    if tool == "budget_tracker":
+        budget_match = _BUDGET_PATTERN.search(text)
+        if budget_match and len(numbers) == 2:
+            budget = parse_number(budget_match.group(1))
+            spent = numbers[0] if numbers[1] == budget else numbers[1]
+            return {"spent": spent, "budget": budget}
+        category = _mentioned_category(text)
+        if category:
+            return {"category": category, "period": "week" if "week" in text else "month"}
+        return {}
+
+    if tool == "investment_return_calculator":
+        if len(numbers) == 2:
+            return {"initial": numbers[0], "final": numbers[1]}
+        return {}
+
+    if tool == "portfolio_analytics":
+        arguments = {}
+        path_match = _PATH_PATTERN.search(user_text)
+        if path_match:
+            arguments["path"] = path_match.group(0)
+        benchmark_match = _BENCHMARK_PATTERN.search(text)
+        if benchmark_match:
+            arguments["benchmark"] = benchmark_match.group(1).upper()
+        return arguments
+
+    if tool == "portfolio_analyzer":
+        if len(numbers) >= 2:
+            return {"returns": [float(x) for x in _PLAIN_NUMBER_PATTERN.findall(text)]}
+        return {}
+
+    if tool == "debt_payoff_optimizer":
+        extra_match = _EXTRA_PATTERN.search(text) or _BUDGET_PATTERN.search(text)
+        if not extra_match:
+            return {}
+        arguments = {"extra_budget": parse_number(next(group for group in extra_match.groups() if group))}
+        payment_match = _PAYMENT_PATTERN.search(text[:extra_match.start()] + text[extra_match.end():])
+        if payment_match:
+            arguments["monthly_payment"] = parse_number(payment_match.group(1))
+        return arguments
+
+    if tool in ("project_npv_calculator", "project_risk_simulator"):
+        discount_match = _DISCOUNT_PATTERN.search(text)
+        if discount_match:
+            rate = parse_number(discount_match.group(1) or discount_match.group(2))
+            return {"discount_rate": rate if rate < 1 else rate / 100}
+        return {}
+
+    return {}
+
+
+def keyword_scores(text: str) -> dict:
+    """{(agent, tool): summed keyword weight} for the routing keywords in lowercase `text`."""
+    scores = {}
+    for route, pattern in _KEYWORD_PATTERNS.items():
+        weights = ROUTING_KEYWORDS[route]
+        score = sum(weights[match] for match in pattern.findall(text))
+        if score:
+            scores[route] = score
+    return scores
+
+
+def _looks_like_merchant_and_amount(text: str) -> bool:
+    """A short merchant name plus one amount, like "starbucks $4.50"."""
+    words = text.split()
+    return 1 < len(words) <= 4 and len(_NUMBER_PATTERN.findall(text)) == 1 \
+        and not _SENTENCE_WORDS.intersection(words) and not _NOT_SPENDING_WORDS.intersection(words)
+
+
+def classify_locally(user_input: str) -> dict:
+    """Keyword-based router for clear-cut requests. Never calls the LLM.
+
+    Returns a routing decision with a confidence between 0 and 1; callers
+    decide whether that is good enough or the LLM router is needed.
+    """
+    text = " ".join(user_input.lower().split())
+
+    scores = keyword_scores(text)
+    if scores:
+        (agent, tool), best = max(scores.items(), key=lambda item: item[1])
+        confidence = best / sum(scores.values())
+    elif _looks_like_merchant_and_amount(text):
+        # "starbucks $4.50" is probably an expense, but "apple 150" might be a stock
+        agent, tool, confidence = "spend", "expense_classifier", MERCHANT_GUESS_CONFIDENCE
+    else:
+        return {"agent": None, "tool": None, "arguments": {}, "confidence": 0.0, "source": "local"}
+
+    return {
+        "agent": agent,
+        "tool": tool,
+        "arguments": _extract_arguments(tool, text, user_input.strip()),
+        "confidence": confidence,
+        "source": "local",
+    }
+
+
+ROUTER_SYSTEM_PROMPT = PROMPTS.register("routing", """
+    You route messages in a personal finance portal. Call the function (named <agent>__<tool>) that should handle
+    the user's message, with only the arguments the user explicitly gave; call one function per independent request.
+    Percentages are decimals (8% -> 0.08).
+    """)
+
+_ROUTE_SEPARATOR = "__"
+
+
+def routing_functions(agents: dict) -> dict:
+    """One callable function per (agent, tool), with the tool's argument model as parameters."""
+    return {
+        f"{agent_key}{_ROUTE_SEPARATOR}{tool_name}": (description, model)
+        for agent_key, agent in agents.items()
+        for tool_name, (description, model) in agent.tool_functions(delegation=False).items()
+    }
+
+
+def _routing_messages(user_input: str) -> list:
+    return [
+        {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
+        {"role": "user", "content": user_input},
+    ]
+
+
+def _decision_from_call(name: str, arguments: dict) -> dict:
+    agent_key, tool = name.split(_ROUTE_SEPARATOR, 1)
+    return {"agent": agent_key, "tool": tool, "arguments": arguments, "confidence": 1.0, "source": "llm"}
+
+
+def _routing_failed(error: Exception) -> list:
+    print("[Router] Failed to get a valid routing call:", error)
+    # Default to the spend agent and let it reason about the tool
+    return [{"agent": "spend", "tool": None, "arguments": {}, "confidence": 1.0, "source": "llm"}]
+
+
+def classify_tasks_with_llm(client, model: str, agents: dict, user_input: str) -> list:
+    """One function-calling LLM call returning a decision (agent, tool, arguments) per independent request."""
+    try:
+        calls, _ = call_functions(
+            client, model, _routing_messages(user_input), "routing", routing_functions(agents), temperature=0
+        )
+    except ValueError as e:
+        return _routing_failed(e)
+    return [_decision_from_call(name, arguments) for name, arguments in calls]
+
+
+async def aclassify_tasks_with_llm(client, model: str, agents: dict, user_input: str) -> list:
+    try:
+        calls, _ = await acall_functions(
+            client, model, _routing_messages(user_input), "routing", routing_functions(agents), temperature=0
+        )
+    except ValueError as e:
+        return _routing_failed(e)
+    return [_decision_from_call(name, arguments) for name, arguments in calls]
+
+
+def classify_with_llm(client, model: str, agents: dict, user_input: str) -> dict:
+    """One function-calling LLM call returning agent, tool and validated arguments together."""
+    return classify_tasks_with_llm(client, model, agents, user_input)[0]
+
+
+async def aclassify_with_llm(client, model: str, agents: dict, user_input: str) -> dict:
+    return (await aclassify_tasks_with_llm(client, model, agents, user_input))[0]
+
+
+def route_request(client, model: str, agents: dict, user_input: str) -> dict:
+    """Decide agent, tool and arguments, only calling the LLM when unsure."""
+    decision = classify_locally(user_input)
+    if decision["agent"] in agents and decision["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD:
+        return decision
+
+    return classify_with_llm(client, model, agents, user_input)
+
+
+async def aroute_request(client, model: str, agents: dict, user_input: str) -> dict:
+    """Async version of route_request()."""
+    decision = classify_locally(user_input)
+    if decision["agent"] in agents and decision["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD:
+        return decision
+
+    return await aclassify_with_llm(client, model, agents, user_input)
@@ -0,0 +1,151 @@
+import asyncio
+
+from .spend_agent import SpendManagementAgent
+from .investment_agent import InvestmentManagementAgent
+from .project_agent import ProjectManagementAgent
+from .planner import aplan_request, arun_tasks
+from .llm_client import BudgetExceeded, LLMCallCounter
+from .session_memory import DEFAULT_SESSION_ID
+from .tracing import span
+
+# The answer to a request that spent its model policy's token or latency budget before it was done
+OVER_BUDGET_ANSWER = "Sorry, your request needed more model time than it is allowed. Please try a simpler request."
+
+
+def build_agents(client, model: str, session_memory) -> dict:
+    """Create the three agents and give each of them access to the others."""
+    agents = {
+        "spend": SpendManagementAgent(client, model, session_memory),
+        "investment": InvestmentManagementAgent(client, model, session_memory),
+        "project": ProjectManagementAgent(client, model, session_memory),
+    }
+
+    for agent in agents.values():
+        agent.set_agents(agents)
+
+    return agents
+
+
+class AgentRuntime:
+    """Serve many concurrent user requests from one process.
+
+    Agents run on an AsyncOpenAI client (optionally wrapped in an
+    AsyncCachedClient). At most `max_concurrency` requests are in flight at
+    once and each one is cancelled after `request_timeout` seconds. Each
+    request runs against its own user's session in the SessionStore.
+    """
+
+    def __init__(self, client, model: str, session_store, max_concurrency: int = 64, request_timeout: float = 60.0):
+        self.client = client
+        self.model = model
+        self.session_store = session_store
+        self.agents = build_agents(client, model, session_store)
+        self.request_timeout = request_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def handle(self, user_input: str, arguments: dict = None, session_id: str = DEFAULT_SESSION_ID,
+                     on_token=None) -> dict:
+        """Route and answer one request. Tool arguments are passed in, never read from stdin.
+
+        With `on_token`, the answer is also handed to `on_token(text)` piece by
+        piece while it streams in.
+        """
+        async with self.semaphore:
+            with self.session_store.activate(session_id), LLMCallCounter() as llm_calls, \
+                    span("request", session_id=session_id) as request_span:
+                try:
+                    response = await asyncio.wait_for(
+                        self._route_and_handle(user_input, arguments, on_token), self.request_timeout
+                    )
+                    status = "ok"
+                    llm_calls.record_first_token()  # without streaming the user sees everything at once
+                except asyncio.TimeoutError:
+                    response = "Sorry, your request took too long. Please try again."
+                    status = "timeout"
+                    if on_token is not None and llm_calls.first_token_at is None:
+                        on_token(response)
+                except BudgetExceeded:
+                    response = OVER_BUDGET_ANSWER
+                    status = "over_budget"
+                    if on_token is not None and llm_calls.first_token_at is None:
+                        on_token(response)
+                request_span.set("status", status)
+
+        return {
+            "response": response,
+            "status": status,
+            "llm_calls": llm_calls.calls,
+            "llm_calls_by_stage": dict(llm_calls.by_stage),
+            "tokens_by_stage": dict(llm_calls.tokens_by_stage),
+            "cache_hits": llm_calls.cache_hits,
+            "prompt_tokens": llm_calls.prompt_tokens,
+            "completion_tokens": llm_calls.completion_tokens,
+            "cost_usd": llm_calls.cost_usd,
+            "time_to_first_token": llm_calls.time_to_first_token,
+        }
+
+    def stream(self, user_input: str, arguments: dict = None, session_id: str = DEFAULT_SESSION_ID) -> "ResponseStream":
+        """Answer one request as an async iterator of text pieces (see ResponseStream)."""
+        return ResponseStream(self, user_input, arguments, session_id)
+
+    async def handle_many(self, requests: list, session_id: str = DEFAULT_SESSION_ID) -> list:
+        """Answer a batch of (user_input, arguments) pairs concurrently."""
+        return await asyncio.gather(
+            *(self.handle(user_input, arguments, session_id) for user_input, arguments in requests)
+        )
+
+    async def _route_and_handle(self, user_input: str, arguments: dict = None, on_token=None) -> str:
+        tasks = await aplan_request(self.client, self.model, self.agents, user_input)
+        if len(tasks) > 1:
+            # Independent sub-tasks run concurrently: the answer takes as long as the slowest one
+            return await arun_tasks(self.agents, tasks, arguments, on_token)
+
+        decision = tasks[0]["decision"]
+        agent = self.agents.get(decision["agent"])
+        if agent is None:
+            return "Sorry, I could not determine the right agent for your request."
+
+        return await agent.ahandle(user_input, decision, arguments, on_token=on_token)
+
+
+_DONE = object()
+
+
+class ResponseStream:
+    """Async iterator over the pieces of one answer as they arrive.
+
+    Iterating starts the request; once the iterator is exhausted, `result`
+    holds the same dict AgentRuntime.handle() returns, including
+    `time_to_first_token`.
+
+        stream = runtime.stream("How are my bills looking?", session_id="user-42")
+        async for text in stream:
+            print(text, end="", flush=True)
+        print(stream.result["time_to_first_token"])
+    """
+
+    def __init__(self, runtime: AgentRuntime, user_input: str, arguments: dict = None,
+                 session_id: str = DEFAULT_SESSION_ID):
+        self.runtime = runtime
+        self.user_input = user_input
+        self.arguments = arguments
+        self.session_id = session_id
+        self.result = None
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.runtime.handle(
+                self.user_input, self.arguments, self.session_id, on_token=self._queue.put_nowait
+            ))
+            self._task.add_done_callback(lambda _: self._queue.put_nowait(_DONE))
+
+        text = await self._queue.get()
+        if text is _DONE:
+            self.result = self._task.result()
+            raise StopAsyncIteration
+        return text
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_SESSION_ID = "default"
+
+# Session the current request belongs to (see SessionStore.activate)
+_active_session_id: ContextVar = ContextVar("session_id", default=DEFAULT_SESSION_ID)
+
+
+def current_session_id() -> str:
+    """Id of the session activated for the current request."""
+    return _active_session_id.get()
+
+
+class SessionMemory:
+    def __init__(self, data: dict = None):
+        self.data = data or {}
+
+    def update(self, key: str, value):
+        self.data[key] = value
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+
+class SQLiteSessionBackend:
+    """Persist session data as JSON rows in a SQLite file."""
+
+    def __init__(self, path: str = "sessions.sqlite3"):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, updated_at REAL, data TEXT)"
+        )
+        self.db.commit()
+
+    def load(self, session_id: str, not_before: float):
+        row = self.db.execute(
+            "SELECT updated_at, data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or row[0] < not_before:
+            return None
+        return json.loads(row[1])
+
+    def save_many(self, sessions: list):
+        """Write (session_id, updated_at, data) tuples in one transaction."""
+        self.db.executemany(
+            "INSERT OR REPLACE INTO sessions (session_id, updated_at, data) VALUES (?, ?, ?)",
+            [(session_id, updated_at, json.dumps(data)) for session_id, updated_at, data in sessions],
+        )
+        self.db.commit()
+
+    def delete_expired(self, not_before: float):
+        self.db.execute("DELETE FROM sessions WHERE updated_at < ?", (not_before,))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class SessionStore:
+    """Per-user session memory: a bounded LRU in memory, written through to a backend in batches.
+
+    Agents keep calling `update()`/`get()` like on a single SessionMemory; the
+    calls go to whichever session was activated for the current request.
+    Sessions idle for longer than `ttl_seconds` are dropped, and changes are
+    flushed to the backend every `flush_every` dirty sessions,
+    `flush_interval` seconds, on eviction and on `close()`.
+    """
+
+    def __init__(self, backend=None, max_sessions: int = 10000, ttl_seconds: float = 7 * 24 * 3600,
+                 flush_every: int = 32, flush_interval: float = 5.0):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.sessions = OrderedDict()  # session_id -> (last_access, SessionMemory)
+        self.dirty = set()
+        self.last_flush = time.time()
+        self.lock = threading.RLock()
+        # Striped per-session locks for read-modify-write of session data (see locked())
+        self.session_locks = [threading.RLock() for _ in range(64)]
+
+    @contextmanager
+    def activate(self, session_id: str):
+        """Route update()/get() calls made inside the block to `session_id`."""
+        token = _active_session_id.set(session_id)
+        try:
+            yield self.session(session_id)
+        finally:
+            _active_session_id.reset(token)
+
+    @contextmanager
+    def locked(self):
+        """Hold the active session's lock around a get() -> change -> update() of its data.
+
+        Planner branches and concurrent requests of one session run in
+        parallel threads; without the lock, one of two such updates is lost.
+        """
+        session_id = _active_session_id.get()
+        with self.session_locks[hash(session_id) % len(self.session_locks)]:
+            yield
+
+    def session(self, session_id: str) -> SessionMemory:
+        now = time.time()
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is not None and entry[0] >= now - self.ttl_seconds:
+                memory = entry[1]
+            else:
+                data = None
+                if self.backend is not None:
+                    data = self.backend.load(session_id, not_before=now - self.ttl_seconds)
+                memory = SessionMemory(data)
+
+            self.sessions[session_id] = (now, memory)
+            self.sessions.move_to_end(session_id)
+            self._evict(now)
+            return memory
+
+    def update(self, key: str, value):
+        session_id = _active_session_id.get()
+        with self.lock:
+            self.session(session_id).update(key, value)
+            self.dirty.add(session_id)
+            if len(self.dirty) >= self.flush_every or time.time() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def get(self, key: str, default=None):
+        return self.session(_active_session_id.get()).get(key, default)
+
+    def flush(self):
+        """Write every changed session to the backend in one batch."""
+        with self.lock:
+            if self.backend is not None and self.dirty:
+                batch = [
+                    (session_id, self.sessions[session_id][0], self.sessions[session_id][1].data)
+                    for session_id in self.dirty
+                    if session_id in self.sessions
+                ]
+                self.backend.save_many(batch)
+            self.dirty.clear()
+            self.last_flush = time.time()
+
+    def _evict(self, now: float):
+        expired_before = now - self.ttl_seconds
+        evicted = []
+        # Oldest sessions sit at the front: pop while over capacity or expired
+        while self.sessions:
+            session_id, (last_access, memory) = next(iter(self.sessions.items()))
+            if len(self.sessions) <= self.max_sessions and last_access >= expired_before:
+                break
+            self.sessions.popitem(last=False)
+            if session_id in self.dirty:
+                evicted.append((session_id, last_access, memory.data))
+                self.dirty.discard(session_id)
+
+        if evicted and self.backend is not None:
+            self.backend.save_many(evicted)
+
+    def close(self):
+        self.flush()
+        if self.backend is not None:
+            self.backend.delete_expired(time.time() - self.ttl_seconds)
+            self.backend.close()
@@ -1,63 +1,411 @@
-from .base_agent import BaseAgent
-from tools.expense_classifier import classify_expense
-from tools.budget_tracker import check_budget
-from tools.bill_reminder import remind_upcoming_bills
-
-class SpendManagementAgent(BaseAgent):
-    def __init__(self, client, model, session_memory):
-        super().__init__(
-            client=client,
-            name="Spend Management Agent",
-            description="Manages user spending, budgets, and alerts.",
-            model=model
-        )
-        
-        self.session_memory = session_memory
-        self.register_tool("expense_classifier", classify_expense)
-        self.register_tool("budget_tracker", check_budget)
-        self.register_tool("bill_reminder", remind_upcoming_bills)
-
-    def handle(self, user_input: str) -> str:
-        reasoning = self.reason_with_chain_of_thought(user_input)
-        print(f"[{self.name}] Chain of Thought Reasoning:\n{reasoning['reasoning']}\n")
-
-        final_action = reasoning['final_action'].lower()
-
-        if final_action.startswith("delegate to"):
-            _, agent_key = final_action.split("delegate to")
-            agent_key = agent_key.strip()
-
-            if agent_key == self.name.lower().split()[0]:
-                print(f"[{self.name}] I am already the correct agent. Proceeding internally...")
-                # Do not delegate, proceed with final_action
-            else:
-                if agent_key in self.agents:
-                    print(f"[{self.name}] Delegating task to {agent_key.capitalize()} Agent...")
-                    return self.agents[agent_key].handle(user_input)
-                else:
-                    return f"[{self.name}] Unknown delegation target."
-
-        if final_action not in self.tools:
-            return f"[{self.name}] Sorry, I could not find the right tool."
-
-        if final_action == "expense_classifier":
-            expense_description = input("[Spend Agent] Please describe your expense: ")
-            result = self.tools[final_action](expense_description)
-            return self.generate_response(f"Result of {final_action}: {result}")
-
-        elif final_action == "budget_tracker":
-            spent = float(input("[Spend Agent] How much did you spend? "))
-            budget = float(input("[Spend Agent] What is your budget? "))
-            result = self.tools[final_action](spent, budget)
-            return self.generate_response(f"Result of {final_action}: {result}")
-
-        elif final_action == "bill_reminder":
-            bills = [
-                {"name": "Electricity Bill", "due_date": "2025-05-10"},
-                {"name": "Water Bill", "due_date": "2025-05-12"},
-                ]
-            result = self.tools[final_action](bills)
-            return self.generate_response(f"Result of {final_action}: {result}")
-
-        else:
-            return f"[{self.name}] Selected an unknown tool."
\ No newline at end of file
+import asyncio
+import atexit
+import contextlib
+import os
+import re
+
+from .base_agent import BaseAgent, ToolInputError
+from .batching import MicroBatcher
+from .llm_client import record_invalid_answer
+from .prompts import PROMPTS
+from .session_memory import current_session_id
+from .tool_schemas import BillArguments, BudgetArguments, BudgetCheckArguments, ExpenseArguments, ForecastArguments
+from tools.expense_classifier import ExpenseClassifier, classify_expense, load_taxonomy
+from tools.transaction_ingest import classify_transactions_file
+from tools.merchant_index import MerchantIndex, normalize_merchant
+from tools.budget_tracker import check_budget, BudgetEngine
+from tools.bill_reminder import remind_upcoming_bills, BillScheduler
+from tools.transaction_ledger import TransactionLedger
+from tools.cash_flow_forecast import forecast_cash_flow, summarize_forecast
+
+class SpendManagementAgent(BaseAgent):
+    def __init__(self, client, model, session_memory):
+        super().__init__(
+            client=client,
+            name="Spend Management Agent",
+            description="Manages user spending, budgets, and alerts.",
+            model=model
+        )
+        
+        self.session_memory = session_memory
+        self.register_tool("expense_classifier", classify_expense, "description, amount", {
+            "description": "[Spend Agent] Please describe your expense: ",
+        }, schema=ExpenseArguments)
+        self.register_tool("set_budget", None, "category, amount, period (month or week)", {
+            "category": "[Spend Agent] Which category is this budget for? ",
+            "amount": "[Spend Agent] What is the budget amount? ",
+        }, schema=BudgetArguments)
+        self.register_tool("budget_tracker", check_budget, "category, period, or spent and budget", {
+            "spent": "[Spend Agent] How much did you spend? ",
+            "budget": "[Spend Agent] What is your budget? ",
+        }, schema=BudgetCheckArguments)
+        self.register_tool("bill_reminder", remind_upcoming_bills, "days")
+        self.register_tool("add_bill", None, "name, amount, due_date, frequency (once, monthly, annual or days), interval", {
+            "name": "[Spend Agent] What is the bill called? ",
+            "due_date": "[Spend Agent] When is it next due (YYYY-MM-DD)? ",
+        }, schema=BillArguments)
+        self.register_tool("pay_bill", None, "name", {
+            "name": "[Spend Agent] Which bill did you pay? ",
+        })
+        self.register_tool("category_override", None, "merchant, category", {
+            "merchant": "[Spend Agent] Which merchant should be recategorized? ",
+            "category": "[Spend Agent] Which category should it always go to? ",
+        })
+        self.register_tool("transaction_importer", classify_transactions_file,
+                           "path, output_path, date_format (e.g. %d/%m/%Y for day-first dates)", {
+            "path": "[Spend Agent] Path to your bank export (CSV, OFX or JSONL): ",
+        })
+
+        self.register_tool("cash_flow_forecast", forecast_cash_flow, "balance, days", {
+            "balance": "[Spend Agent] What is your current account balance? ",
+        }, schema=ForecastArguments)
+        self.register_tool("spending_report", None, "report (by_category, top_merchants or rolling_average), start, end, category")
+
+        # Each user's transactions are kept in a columnar ledger under this directory
+        self.ledger_root = os.getenv("LEDGER_DIR", "ledger")
+
+        # Categories come from the user's taxonomy file when one is configured
+        taxonomy_path = os.getenv("EXPENSE_TAXONOMY_PATH")
+        keyword_classifier = ExpenseClassifier(load_taxonomy(taxonomy_path)) if taxonomy_path else ExpenseClassifier()
+
+        # Results are remembered per merchant, and each user's corrections per user, across restarts
+        self.classifier = MerchantIndex(
+            keyword_classifier,
+            path=os.getenv("MERCHANT_INDEX_PATH", "merchants.sqlite3"),
+            fallback=self.suggest_category if os.getenv("MERCHANT_LLM_FALLBACK") else None,
+        )
+        atexit.register(self.classifier.flush)
+
+        # Concurrent async requests classify their expenses together; the LLM fallback runs afterwards, async
+        self.classify_batcher = MicroBatcher(
+            self._classify_batch,
+            window=float(os.getenv("TOOL_BATCH_WINDOW", "0.002")),
+        )
+        self.loop = None  # the async runtime's event loop, once a request has come through it
+
+    def collect_arguments(self, final_action: str, user_input: str, arguments: dict) -> dict:
+        if final_action == "budget_tracker" and self._tracked_category(arguments):
+            return dict(arguments)
+        return super().collect_arguments(final_action, user_input, arguments)
+
+    async def acollect_arguments(self, final_action: str, user_input: str, arguments: dict) -> dict:
+        if final_action == "budget_tracker" and self._tracked_category(arguments):
+            return dict(arguments)
+        return await super().acollect_arguments(final_action, user_input, arguments)
+
+    def _tracked_category(self, arguments: dict) -> bool:
+        """True when the user asks about a category with a budget and gave no manual numbers."""
+        category = arguments.get("category")
+        period = arguments.get("period") or "month"
+        return bool(category) and arguments.get("spent") is None and \
+            (category, period) in self.load_budgets().budgets
+
+    def open_ledger(self) -> TransactionLedger:
+        """The current user's transaction ledger."""
+        session_dir = re.sub(r"[^A-Za-z0-9_.-]", "_", current_session_id())
+        return TransactionLedger(os.path.join(self.ledger_root, session_dir))
+
+    def load_budgets(self) -> BudgetEngine:
+        """The current user's budget engine, restored from session memory."""
+        state = self.session_memory.get("budget_engine") if self.session_memory is not None else None
+        return BudgetEngine.from_state(state)
+
+    def save_budgets(self, engine: BudgetEngine):
+        if self.session_memory is not None:
+            self.session_memory.update("budget_engine", engine.state())
+
+    def load_bills(self) -> BillScheduler:
+        """The current user's bill scheduler, restored from session memory."""
+        state = self.session_memory.get("bill_scheduler") if self.session_memory is not None else None
+        return BillScheduler.from_state(state)
+
+    def save_bills(self, scheduler: BillScheduler):
+        if self.session_memory is not None:
+            self.session_memory.update("bill_scheduler", scheduler.state())
+
+    def session_state_lock(self):
+        """Lock the current session's budgets and bills, which are loaded, changed and saved whole."""
+        if self.session_memory is None:
+            return contextlib.nullcontext()
+        return self.session_memory.locked()
+
+    async def aexecute_tool(self, final_action: str, arguments: dict) -> str:
+        self.loop = asyncio.get_running_loop()
+        if final_action == "expense_classifier":
+            description = str(arguments["description"])
+            category = await self.classify_batcher.submit((description, current_session_id()))
+            if category is None:
+                merchant = normalize_merchant(description)
+                category = self.classifier.record_fallback(merchant, await self.asuggest_category(merchant))
+            # Waits for the session lock and writes the ledger, so off the event loop
+            return await asyncio.to_thread(self.record_expense, arguments, category)
+        return await super().aexecute_tool(final_action, arguments)
+
+    def _classify_batch(self, items: list) -> list:
+        """Classify batched (description, user) pairs without the LLM fallback, one index call per user."""
+        by_user = {}
+        for position, (description, user) in enumerate(items):
+            by_user.setdefault(user, []).append((position, description))
+        categories = [None] * len(items)
+        for user, entries in by_user.items():
+            results = self.classifier.classify_batch(
+                [description for _, description in entries], use_fallback=False, user=user
+            )
+            for (position, _), category in zip(entries, results):
+                categories[position] = category
+        return categories
+
+    def record_expense(self, arguments: dict, category: str) -> str:
+        """Count a classified expense against the category's budgets and log it to the ledger."""
+        if arguments.get("amount") is None:
+            return f"Result of expense_classifier: {category}"
+        with self.session_state_lock():
+            return self._record_expense(arguments, category)
+
+    def _record_expense(self, arguments: dict, category: str) -> str:
+        engine = self.load_budgets()
+        alerts = []
+        engine.on_alert(alerts.append)
+        try:
+            amount = abs(float(arguments["amount"]))
+            engine.add_transaction(category, amount, arguments.get("date"))
+            ledger = self.open_ledger()
+            ledger.append(arguments.get("date"), -amount, category, str(arguments["description"]))
+            ledger.flush()
+        except ValueError:
+            raise ToolInputError("[Spend Agent] Invalid amount or date.")
+        self.save_budgets(engine)
+        return f"Result of expense_classifier: {category}. {self._describe_alerts(alerts)}".strip()
+
+    def execute_tool(self, final_action: str, arguments: dict) -> str:
+        if final_action in SESSION_STATE_TOOLS:
+            with self.session_state_lock():
+                return self._run_tool(final_action, arguments)
+        return self._run_tool(final_action, arguments)
+
+    def _run_tool(self, final_action: str, arguments: dict) -> str:
+        if final_action == "expense_classifier":
+            category = self.classifier.classify(str(arguments["description"]), user=current_session_id())
+            return self.record_expense(arguments, category)
+
+        elif final_action == "set_budget":
+            engine = self.load_budgets()
+            period = arguments.get("period") or "month"
+            try:
+                engine.set_budget(str(arguments["category"]), float(arguments["amount"]), period)
+            except ValueError:
+                raise ToolInputError("[Spend Agent] Invalid budget amount or period.")
+            self.save_budgets(engine)
+            return f"Result of {final_action}: {period}ly budget for {arguments['category']} set to ${float(arguments['amount']):,.2f}."
+
+        elif final_action == "budget_tracker" and self._tracked_category(arguments):
+            status = self.load_budgets().status(arguments["category"], arguments.get("period") or "month")
+            result = self.tools[final_action](status["spent"], status["budget"])
+            return f"Result of {final_action} for {status['category']} ({status['period_key']}): {result}"
+
+        elif final_action == "budget_tracker":
+            try:
+                spent = float(arguments["spent"])
+                budget = float(arguments["budget"])
+            except ValueError:
+                raise ToolInputError("[Spend Agent] Invalid number entered.")
+            result = self.tools[final_action](spent, budget)
+            return f"Result of {final_action}: {result}"
+
+        elif final_action == "bill_reminder":
+            scheduler = self.load_bills()
+            try:
+                days = int(arguments.get("days") or 30)
+            except ValueError:
+                raise ToolInputError("[Spend Agent] Invalid number of days.")
+            upcoming = scheduler.due_within(days)
+            reminders = scheduler.tick()
+            self.save_bills(scheduler)
+            result = self.tools[final_action](upcoming)
+            if reminders:
+                result += " ".join(f"🔔 {reminder['name']} is due in {reminder['days_left']} days." for reminder in reminders)
+            return f"Result of {final_action} (next {days} days): {result}"
+
+        elif final_action == "add_bill":
+            scheduler = self.load_bills()
+            try:
+                scheduler.add_bill(
+                    str(arguments["name"]).strip(),
+                    arguments["due_date"],
+                    amount=float(arguments.get("amount") or 0),
+                    frequency=arguments.get("frequency") or "monthly",
+                    interval=int(arguments.get("interval") or 1),
+                )
+            except ValueError:
+                raise ToolInputError("[Spend Agent] Invalid bill date, amount or frequency.")
+            self.save_bills(scheduler)
+            return f"Result of {final_action}: {arguments['name']} added, next due on {str(arguments['due_date'])[:10]}."
+
+        elif final_action == "pay_bill":
+            scheduler = self.load_bills()
+            bill_id = scheduler.find(str(arguments["name"]))
+            if bill_id is None:
+                raise ToolInputError(f"[Spend Agent] No bill named {arguments['name']}.")
+            scheduler.mark_paid(bill_id)
+            self.save_bills(scheduler)
+            upcoming = scheduler.bills.get(bill_id)
+            following = f" Next due on {upcoming['next_due'].isoformat()}." if upcoming else ""
+            return f"Result of {final_action}: {arguments['name']} marked as paid.{following}"
+
+        elif final_action == "cash_flow_forecast":
+            scheduler = self.load_bills()
+            scheduler.roll_forward()
+            try:
+                forecast = self.tools[final_action](
+                    float(arguments["balance"]),
+                    scheduler.bills.values(),
+                    self.open_ledger(),
+                    horizon_days=int(arguments.get("days") or 365),
+                )
+            except ValueError:
+                raise ToolInputError("[Spend Agent] Invalid balance or number of days.")
+            return f"Result of {final_action}: {summarize_forecast(forecast)}"
+
+        elif final_action == "spending_report":
+            return f"Result of {final_action}: {self.spending_report(arguments)}"
+
+        elif final_action == "category_override":
+            category = str(arguments["category"]).strip()
+            merchant = self.classifier.set_override(str(arguments["merchant"]), category, user=current_session_id())
+            return f"Result of {final_action}: '{merchant}' will always be categorized as {category}."
+
+        elif final_action == "transaction_importer":
+            path = str(arguments["path"]).strip()
+            output_path = arguments.get("output_path") or f"{os.path.splitext(path)[0]}.classified.jsonl"
+            engine = self.load_budgets()
+            alerts = []
+            engine.on_alert(alerts.append)
+            ledger = self.open_ledger()
+
+            def track_spending(record, category):
+                ledger.append(record["date"] or None, record["amount"], category, record["description"])
+                if record["amount"] < 0:  # bank exports record outflows as negative amounts
+                    engine.add_transaction(category, -record["amount"], record["date"] or None)
+
+            try:
+                classifier = self.classifier.for_user(current_session_id())
+                summary = self.tools[final_action](
+                    path, output_path, classifier, on_transaction=track_spending,
+                    date_format=arguments.get("date_format") or None,
+                )
+            except (OSError, ValueError) as e:
+                raise ToolInputError(f"[Spend Agent] Could not import {path}: {e}")
+            finally:
+                ledger.flush()
+            self.save_budgets(engine)
+            breakdown = ", ".join(
+                f"{category}: {count} transactions, ${abs(summary['totals'][category]):,.2f}"
+                for category, count in sorted(summary["counts"].items(), key=lambda item: -item[1])
+            )
+            warnings = self._describe_alerts(alerts)
+            if summary["skipped"]:
+                lines = ", ".join(f"line {line} ({reason})" for line, reason in summary["skipped"][:5])
+                more = f" and {len(summary['skipped']) - 5} more" if len(summary["skipped"]) > 5 else ""
+                warnings = f"Skipped {len(summary['skipped'])} unreadable rows: {lines}{more}. {warnings}"
+            return f"Result of {final_action}: classified transactions written to {output_path}. {breakdown}. {warnings}".strip()
+
+        else:
+            raise ToolInputError(f"[{self.name}] Selected an unknown tool.")
+
+    def spending_report(self, arguments: dict) -> str:
+        """Answer spend-by-category, top-merchant and rolling-average questions from the ledger."""
+        ledger = self.open_ledger()
+        if not len(ledger):
+            return "No transactions recorded yet. Import a bank export or log some expenses first."
+
+        report = arguments.get("report") or "by_category"
+        start, end, category = arguments.get("start"), arguments.get("end"), arguments.get("category")
+        try:
+            if report == "top_merchants":
+                merchants = ledger.top_merchants(start, end, n=int(arguments.get("n") or 5), category=category)
+                return "Top merchants: " + ", ".join(f"{name} ${spend:,.2f}" for name, spend in merchants)
+
+            if report == "rolling_average":
+                window = int(arguments.get("window_days") or 30)
+                averages = ledger.rolling_average(window, start, end, category)["daily_average"]
+                return f"Average daily spend over the last {window} days: ${averages[-1]:,.2f}" if len(averages) else "No spending in that range."
+
+            by_category = ledger.spend_by_category_by_month(start, end)
+        except ValueError:
+            raise ToolInputError("[Spend Agent] Invalid date range. Use YYYY-MM-DD dates.")
+
+        if category:
+            by_category = {category: by_category.get(category, {})}
+        return "; ".join(
+            f"{name}: " + ", ".join(f"{month} ${spend:,.2f}" for month, spend in sorted(months.items()))
+            for name, months in sorted(by_category.items())
+        ) or "No spending in that range."
+
+    def _describe_alerts(self, alerts: list) -> str:
+        return " ".join(
+            f"⚠️ {alert['category']} reached {alert['threshold']:.0%} of its {alert['period']}ly budget "
+            f"in {alert['period_key']} (${alert['spent']:,.2f} of ${alert['budget']:,.2f})."
+            for alert in alerts
+        )
+
+    def suggest_category(self, merchant: str):
+        """Ask the LLM to file a merchant the keyword taxonomy does not know (once per merchant).
+
+        Returns None when no usable answer came back, so the merchant is not
+        remembered under the default category.
+        """
+        if self.loop is not None:
+            if _on_event_loop():
+                return None  # a sync call on an async client would fail; the async path asks instead
+            # A tool of the async runtime (e.g. a transaction import) runs in a worker thread: ask on the loop
+            return asyncio.run_coroutine_threadsafe(self.asuggest_category(merchant), self.loop).result()
+        system_prompt = self._category_prompt()
+        try:
+            answer = self.complete("merchant_classification", system_prompt, merchant, temperature=0)
+            if not self._is_category(answer) and record_invalid_answer("merchant_classification", self.model, 0):
+                answer = self.complete("merchant_classification", system_prompt, merchant, temperature=0, escalation=1)
+        except Exception as e:
+            print("[Spend Agent] Merchant fallback failed:", e)
+            return None
+        return self._category_from_answer(answer)
+
+    async def asuggest_category(self, merchant: str):
+        system_prompt = self._category_prompt()
+        try:
+            answer = await self.acomplete("merchant_classification", system_prompt, merchant, temperature=0)
+            if not self._is_category(answer) and record_invalid_answer("merchant_classification", self.model, 0):
+                answer = await self.acomplete(
+                    "merchant_classification", system_prompt, merchant, temperature=0, escalation=1
+                )
+        except Exception as e:
+            print("[Spend Agent] Merchant fallback failed:", e)
+            return None
+        return self._category_from_answer(answer)
+
+    def _category_prompt(self) -> str:
+        return PROMPTS.render("merchant_classification", categories=", ".join(self.classifier.classifier.taxonomy))
+
+    def _is_category(self, answer: str) -> bool:
+        return answer in self.classifier.classifier.taxonomy or answer == "Other"
+
+    def _category_from_answer(self, answer: str):
+        """The taxonomy category the LLM named; "Other" is a real answer too and files under the default."""
+        if answer == "Other":
+            return self.classifier.classifier.default_category
+        return answer if answer in self.classifier.classifier.taxonomy else None
+
+
+# Tools that load, change and save the session's budgets or bills (expense_classifier locks in record_expense)
+SESSION_STATE_TOOLS = ("set_budget", "bill_reminder", "add_bill", "pay_bill", "transaction_importer")
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+PROMPTS.register("merchant_classification", """
+    You categorize merchants for a personal finance app. Reply with exactly one of: {categories}, Other.
+    """)
@@ -0,0 +1,335 @@
+from functools import lru_cache
+import json
+import re
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+
+from .llm_client import TIMEOUT_ERRORS, achat_completion, chat_completion, record_invalid_answer
+
+# === Argument models for tools whose arguments have real structure ===
+
+
+class ToolArguments(BaseModel):
+    """Base for tool argument models: every field is optional (missing ones are asked for later)."""
+
+    model_config = ConfigDict(extra="ignore")
+
+
+class ExpenseArguments(ToolArguments):
+    description: Optional[str] = None
+    amount: Optional[float] = None
+    date: Optional[str] = Field(None, description="YYYY-MM-DD")
+
+
+class BudgetArguments(ToolArguments):
+    category: Optional[str] = None
+    amount: Optional[float] = None
+    period: Optional[Literal["month", "week"]] = None
+
+
+class BudgetCheckArguments(ToolArguments):
+    category: Optional[str] = None
+    period: Optional[Literal["month", "week"]] = None
+    spent: Optional[float] = None
+    budget: Optional[float] = None
+
+
+class BillArguments(ToolArguments):
+    name: Optional[str] = None
+    amount: Optional[float] = None
+    due_date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    frequency: Optional[Literal["once", "monthly", "annual", "days"]] = None
+    interval: Optional[int] = None
+
+
+class ForecastArguments(ToolArguments):
+    balance: Optional[float] = None
+    days: Optional[int] = None
+
+
+class Project(BaseModel):
+    name: str = "Project"
+    initial_investment: float
+    periods: int
+    base_income: float = 0.0
+    growth_rate: float = 0.0
+    expenses: float = 0.0
+    unexpected_costs: Dict[str, float] = Field(default_factory=dict, description="period -> amount")
+
+
+class ProjectArguments(ToolArguments):
+    projects: Optional[List[Project]] = None
+    discount_rate: Optional[float] = Field(None, description="decimal, 10% -> 0.10")
+    n_paths: Optional[int] = None
+    seed: Optional[int] = None
+
+
+class ProjectList(BaseModel):
+    projects: List[Project]
+
+
+class Debt(BaseModel):
+    name: str = "Debt"
+    balance: float
+    apr: float = Field(0.0, description="annual rate as a decimal, 19.9% -> 0.199")
+    minimum_payment: float = 0.0
+
+
+class DebtArguments(ToolArguments):
+    debts: Optional[List[Debt]] = None
+    extra_budget: Optional[float] = None
+
+
+class DebtList(BaseModel):
+    debts: List[Debt]
+
+
+class RebalanceArguments(ToolArguments):
+    holdings: Optional[Dict[str, float]] = Field(None, description="symbol -> current value")
+    targets: Optional[Dict[str, float]] = Field(None, description="symbol -> target weight")
+    cash: Optional[float] = None
+    method: Optional[Literal["band", "mean_variance"]] = None
+    band: Optional[float] = None
+    cost_rate: Optional[float] = None
+    min_trade: Optional[float] = None
+    locked: Optional[Dict[str, float]] = Field(None, description="symbol -> value that must not be sold")
+
+
+class Delegation(BaseModel):
+    agent: Literal["spend", "investment", "project"]
+
+
+DELEGATE_TOOL = "delegate"
+
+
+# === Deriving models and function specs from registered tools ===
+
+_ARGUMENT_NAME = re.compile(r"\s*([A-Za-z_][A-Za-z0-9_]*)")
+
+
+def split_argument_hint(hint: str) -> list:
+    """Argument names in a register_tool hint such as 'report (a or b), start, debts: list of {x, y}'."""
+    names, depth, current = [], 0, ""
+    for char in hint + ",":
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        if char == "," and depth == 0:
+            match = _ARGUMENT_NAME.match(current)
+            if match:
+                names.append(match.group(1))
+            current = ""
+        else:
+            current += char
+    return names
+
+
+def model_from_hint(tool_name: str, hint: str) -> type:
+    """Permissive argument model for a tool registered without an explicit schema."""
+    fields = {name: (Optional[Any], None) for name in split_argument_hint(hint)}
+    model_name = "".join(part.capitalize() for part in tool_name.split("_")) + "Arguments"
+    return create_model(model_name, __base__=ToolArguments, **fields)
+
+
+def compact_schema(schema):
+    """A JSON schema without what costs prompt tokens but tells the model nothing.
+
+    Drops the generated "title" of every schema, `"default": null`, and the
+    `{"type": "null"}` branch of optional fields (a missing field already
+    means None). Field names, types, enums and descriptions are kept.
+    """
+    if isinstance(schema, list):
+        return [compact_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    branches = [branch for branch in schema.get("anyOf", ()) if branch != {"type": "null"}]
+    if "anyOf" in schema and len(branches) == 1:
+        schema = {**{key: value for key, value in schema.items() if key != "anyOf"}, **branches[0]}
+    compact = {}
+    for key, value in schema.items():
+        if key == "title" and isinstance(value, str) or key == "default" and value is None:
+            continue
+        if key in ("properties", "$defs"):
+            compact[key] = {name: compact_schema(field) for name, field in value.items()}
+        else:
+            compact[key] = compact_schema(value)
+    return compact
+
+
+@lru_cache(maxsize=None)
+def parameters_schema(model: type) -> dict:
+    """compact_schema() of a pydantic model, built once per model: schema generation is slow and
+    the same bytes every time keep the tools part of the prompt a stable, cacheable prefix."""
+    return compact_schema(model.model_json_schema())
+
+
+def function_spec(name: str, description: str, model: type) -> dict:
+    """OpenAI tool definition for a function whose parameters follow `model`."""
+    return {
+        "type": "function",
+        "function": {"name": name, "description": description, "parameters": parameters_schema(model)},
+    }
+
+
+# === Validation with a bounded local repair step ===
+
+_NUMBER_TEXT = re.compile(r"^\s*-?\$?\s*\d[\d,]*(?:\.\d+)?\s*%?\s*$")
+
+
+def _coerce_numbers(value):
+    """'$1,200' -> 1200.0, '8%' -> 0.08, recursively through lists and dicts."""
+    if isinstance(value, str) and _NUMBER_TEXT.match(value):
+        cleaned = value.replace("$", "").replace(",", "").strip()
+        if cleaned.endswith("%"):
+            return float(cleaned[:-1]) / 100
+        return float(cleaned)
+    if isinstance(value, list):
+        return [_coerce_numbers(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _coerce_numbers(item) for key, item in value.items()}
+    return value
+
+
+def _load_json_object(raw) -> dict:
+    """Parse a JSON object, tolerating code fences, surrounding prose and trailing commas."""
+    if isinstance(raw, dict):
+        return raw
+    text = str(raw or "").strip()
+    try:
+        parsed = json.loads(text or "{}")
+    except json.JSONDecodeError:
+        text = re.sub(r"^```(?:json)?|```$", "", text, flags=re.MULTILINE).strip()
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise
+        text = re.sub(r",\s*([}\]])", r"\1", text[start:end + 1])
+        parsed = json.loads(text)
+    if not isinstance(parsed, dict):
+        raise ValueError("expected a JSON object")
+    return parsed
+
+
+def _drop_invalid_fields(data: dict, error: ValidationError) -> dict:
+    """Remove optional top-level fields that failed validation so the rest can be used."""
+    bad = {str(issue["loc"][0]) for issue in error.errors() if issue.get("loc")}
+    return {key: value for key, value in data.items() if key not in bad}
+
+
+def validate_arguments(model: type, raw) -> dict:
+    """Validate tool-call arguments in one pass, repairing common slips locally before giving up.
+
+    Repairs are bounded: lenient JSON parsing, then number strings such as
+    '$1,200' or '8%', then (for tool argument models only) dropping the
+    fields that still fail so the user is asked for them instead.
+    Raises ValueError when the arguments cannot be used.
+    """
+    try:
+        data = _load_json_object(raw)
+    except (json.JSONDecodeError, ValueError) as e:
+        raise ValueError(f"arguments are not a JSON object: {e}")
+
+    attempts = [data, _coerce_numbers(data)]
+    error = None
+    for attempt in attempts:
+        try:
+            return model.model_validate(attempt).model_dump(exclude_none=True)
+        except ValidationError as e:
+            error = e
+
+    if issubclass(model, ToolArguments):
+        trimmed = _drop_invalid_fields(attempts[-1], error)
+        try:
+            return model.model_validate(trimmed).model_dump(exclude_none=True)
+        except ValidationError as e:
+            error = e
+    raise ValueError(str(error))
+
+
+# === Function calls per completion ===
+
+def _read_function_calls(response, functions: dict):
+    """([(name, validated arguments), ...], message text) for the tool calls in a completion."""
+    message = response.choices[0].message
+    content = (message.content or "").strip()
+    tool_calls = getattr(message, "tool_calls", None) or []
+    if not tool_calls:
+        raise ValueError("no function was called")
+    calls = []
+    for tool_call in tool_calls:
+        name = tool_call.function.name
+        if name not in functions:
+            raise ValueError(f"unknown function {name}")
+        calls.append((name, validate_arguments(functions[name][1], tool_call.function.arguments)))
+    return calls, content
+
+
+def _function_request(messages: list, functions: dict) -> dict:
+    return {
+        "messages": messages,
+        "tools": [function_spec(name, description, model) for name, (description, model) in functions.items()],
+        "tool_choice": "required",
+    }
+
+
+def _retry_messages(messages: list, error: Exception) -> list:
+    return messages + [{
+        "role": "user",
+        "content": f"Your previous answer could not be used ({error}). Call the functions again with valid arguments.",
+    }]
+
+
+def call_functions(client, model: str, messages: list, stage: str, functions: dict, max_retries: int = 1, **kwargs):
+    """Have the model call one or more of `functions` ({name: (description, pydantic model)}).
+
+    Returns ([(name, validated arguments), ...], message text). Arguments are
+    repaired locally first; only when that fails is the model asked again, at
+    most `max_retries` times, moving up the stage's model tiers when the
+    policy has them. Raises ValueError if no usable call came back, or when
+    the call timed out on every tier.
+    """
+    error = None
+    for attempt in range(max_retries + 1):
+        request = _function_request(messages if error is None else _retry_messages(messages, error), functions)
+        try:
+            response = chat_completion(client, model, stage=stage, escalation=attempt, **request, **kwargs)
+        except TIMEOUT_ERRORS:
+            raise ValueError(f"[{stage}] timed out")
+        try:
+            return _read_function_calls(response, functions)
+        except ValueError as e:
+            error = e
+            if attempt < max_retries:
+                record_invalid_answer(stage, model, attempt)
+    raise ValueError(f"[{stage}] {error}")
+
+
+async def acall_functions(client, model: str, messages: list, stage: str, functions: dict, max_retries: int = 1, **kwargs):
+    """Async version of call_functions()."""
+    error = None
+    for attempt in range(max_retries + 1):
+        request = _function_request(messages if error is None else _retry_messages(messages, error), functions)
+        try:
+            response = await achat_completion(client, model, stage=stage, escalation=attempt, **request, **kwargs)
+        except TIMEOUT_ERRORS:
+            raise ValueError(f"[{stage}] timed out")
+        try:
+            return _read_function_calls(response, functions)
+        except ValueError as e:
+            error = e
+            if attempt < max_retries:
+                record_invalid_answer(stage, model, attempt)
+    raise ValueError(f"[{stage}] {error}")
+
+
+def call_function(client, model: str, messages: list, stage: str, functions: dict, max_retries: int = 1, **kwargs):
+    """Like call_functions() for a single call: returns (name, validated arguments, message text)."""
+    calls, content = call_functions(client, model, messages, stage, functions, max_retries, **kwargs)
+    return (*calls[0], content)
+
+
+async def acall_function(client, model: str, messages: list, stage: str, functions: dict, max_retries: int = 1, **kwargs):
+    """Async version of call_function()."""
+    calls, content = await acall_functions(client, model, messages, stage, functions, max_retries, **kwargs)
+    return (*calls[0], content)
@@ -0,0 +1,296 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+# Attributes a span copies from its parent unless it sets them itself
+INHERITED_ATTRIBUTES = ("agent", "session_id")
+
+_current_span: ContextVar = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation (an LLM call, a tool run, a whole request) inside a trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "_trace")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None, trace: list = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self._trace = trace  # finished spans of the whole trace, shared with the root
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in for spans of unsampled traces: accepts everything, records nothing."""
+
+    def set(self, key: str, value):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Create spans and hand each finished, sampled trace to an exporter.
+
+    Sampling is decided once per trace, when its root span starts: spans of
+    unsampled traces are a shared no-op object, so a low `sample_rate` keeps
+    the overhead negligible. Without an exporter nothing is recorded.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_span(self, name: str, **attributes):
+        """Start a child of the current span without making it current (for generators); end with end_span()."""
+        parent = _current_span.get()
+        if parent is NOOP_SPAN or self.exporter is None or (parent is None and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        if parent is None:
+            return Span(name, os.urandom(16).hex(), attributes=attributes, trace=[])
+        for key in INHERITED_ATTRIBUTES:
+            if key in parent.attributes and key not in attributes:
+                attributes[key] = parent.attributes[key]
+        return Span(name, parent.trace_id, parent.span_id, attributes, parent._trace)
+
+    def end_span(self, span):
+        if span is NOOP_SPAN:
+            return
+        span.end_ns = time.time_ns()
+        span._trace.append(span)
+        if span.parent_id is None:
+            self.exporter.export(span._trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+_tracer = Tracer()
+
+
+def configure_tracing(exporter=None, sample_rate: float = 1.0) -> Tracer:
+    """Install the process-wide tracer used by span(); with no exporter, tracing is off."""
+    global _tracer
+    _tracer = Tracer(exporter, sample_rate)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """Context manager timing one operation as a child of the current span (a new trace at the top)."""
+    return _tracer.span(name, **attributes)
+
+
+def start_span(name: str, **attributes):
+    return _tracer.start_span(name, **attributes)
+
+
+def end_span(span):
+    _tracer.end_span(span)
+
+
+def current_span():
+    """The span of the operation in progress (NOOP_SPAN when not tracing)."""
+    return _current_span.get() or NOOP_SPAN
+
+
+# === Exporters: export(spans) receives every span of one finished trace ===
+
+class InMemoryExporter:
+    """Keep the most recent `max_spans` spans in a ring buffer, e.g. for a debug endpoint or tests."""
+
+    def __init__(self, max_spans: int = 10_000):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, spans: list):
+        self.spans.extend(span.to_dict() for span in spans)
+
+    def close(self):
+        pass
+
+
+class JSONLExporter:
+    """Append spans as JSON lines to `path`, writing in batches of `buffer_size` spans."""
+
+    def __init__(self, path: str = "traces.jsonl", buffer_size: int = 256):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.lock = threading.Lock()
+
+    def export(self, spans: list):
+        with self.lock:
+            self.buffer.extend(json.dumps(span.to_dict(), default=str) for span in spans)
+            if len(self.buffer) >= self.buffer_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: list, service_name: str) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest body for finished span dicts."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{
+            "scope": {"name": "my_agents"},
+            "spans": [{
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                **({"parentSpanId": span["parent_id"]} if span["parent_id"] else {}),
+                "name": span["name"],
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span["start_ns"]),
+                "endTimeUnixNano": str(span["end_ns"]),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span["attributes"].items()],
+                "status": {"code": 2 if span["status"] == "error" else 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+class OTLPExporter:
+    """Send spans to an OpenTelemetry collector over OTLP/HTTP with JSON encoding.
+
+    Spans are queued and posted from a background thread in batches of up
+    to `batch_size`, at least every `flush_interval` seconds, so exporting
+    never blocks a request. Batches that fail to send are dropped.
+    """
+
+    def __init__(self, endpoint: str = "http://localhost:4318/v1/traces", service_name: str = "finance-portal",
+                 batch_size: int = 512, flush_interval: float = 2.0, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def export(self, spans: list):
+        for span in spans:
+            self._queue.put(span.to_dict())
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch: list):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(otlp_payload(batch, self.service_name), default=str).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError:
+            self.dropped += len(batch)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(self.timeout)
+
+
+def build_exporter(kind: str, path: str = None, endpoint: str = None):
+    """Exporter for a TRACE_EXPORTER setting: "jsonl", "memory", "otlp", or None/"" for no tracing."""
+    if not kind:
+        return None
+    if kind == "jsonl":
+        return JSONLExporter(path or "traces.jsonl")
+    if kind == "memory":
+        return InMemoryExporter()
+    if kind == "otlp":
+        return OTLPExporter(endpoint or "http://localhost:4318/v1/traces")
+    raise ValueError(f"Unknown trace exporter: {kind}")
@@ -0,0 +1,203 @@
+import json
+import os
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from my_agents.completion_cache import AsyncCachedClient
+from my_agents.config import (
+    DEFAULT_MODEL, completion_cache_from_env, model_policy_from_env, session_store_from_env, tracing_from_env,
+)
+from my_agents.runtime import AgentRuntime
+from tools.project_simulator import shutdown_pool
+
+# Larger request bodies are refused with 413
+MAX_BODY_BYTES = 1 << 20
+
+
+class PortalService:
+    """What one server process shares across requests: the stores, the agents and one pooled AsyncOpenAI client.
+
+    Every model call goes through the same HTTP connection pool, so requests
+    reuse warm keep-alive connections instead of opening their own.
+    """
+
+    def __init__(self):
+        load_dotenv()
+        self.completion_cache = completion_cache_from_env()
+        self.session_store = session_store_from_env()
+        self.tracer = tracing_from_env()
+        model = os.getenv("OPENAI_MODEL") or DEFAULT_MODEL
+        self.model_policy = model_policy_from_env(model)
+        self.openai = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            )),
+        )
+        self.runtime = AgentRuntime(
+            AsyncCachedClient(self.openai, self.completion_cache),
+            model,
+            self.session_store,
+            max_concurrency=int(os.getenv("MAX_CONCURRENCY", "64")),
+            request_timeout=float(os.getenv("REQUEST_TIMEOUT", "60")),
+        )
+
+    def stats(self) -> dict:
+        agents = self.runtime.agents
+        return {
+            "completion_cache": self.completion_cache.stats(),
+            "model_policy": self.model_policy.stats(),
+            "batching": {
+                "expense_classifier": agents["spend"].classify_batcher.stats(),
+                "project_npv_calculator": agents["project"].npv_batcher.stats(),
+            },
+        }
+
+    async def close(self):
+        await self.openai.close()
+        self.session_store.close()
+        self.tracer.close()
+        shutdown_pool()
+
+
+class PortalApp:
+    """ASGI application serving the agents over HTTP/JSON.
+
+        uvicorn server:app --host 0.0.0.0 --port 8000
+
+    POST /v1/chat takes {"message", "session_id", "arguments", "stream"} and
+    returns the AgentRuntime.handle() result (504 when the request timed out).
+    With "stream": true the answer arrives as server-sent events: one
+    {"text"} event per piece, then a "result" event. GET /healthz is for the
+    load balancer and GET /v1/stats reports cache, model policy and batching
+    counters.
+
+    The service is built at startup (or on the first request) without any
+    console interaction, and closed at shutdown.
+
+    Run one worker per process: sessions are cached in process memory, so
+    several processes need sticky sessions (one process per session_id).
+    """
+
+    def __init__(self, service_factory=PortalService):
+        self.service_factory = service_factory
+        self.service = None
+
+    def get_service(self) -> PortalService:
+        if self.service is None:
+            self.service = self.service_factory()
+        return self.service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.get_service()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": f"{type(e).__name__}: {e}"})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.service is not None:
+                    await self.service.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        if path == "/healthz" and method == "GET":
+            return await _send_json(send, 200, {"status": "ok"})
+        if path == "/v1/stats" and method == "GET":
+            return await _send_json(send, 200, self.get_service().stats())
+        if path not in ("/healthz", "/v1/stats", "/v1/chat"):
+            return await _send_json(send, 404, {"error": "Not found."})
+        if method != "POST" or path != "/v1/chat":
+            return await _send_json(send, 405, {"error": "Method not allowed."})
+
+        body = await _read_body(receive)
+        if body is None:
+            return await _send_json(send, 413, {"error": f"Request body is larger than {MAX_BODY_BYTES} bytes."})
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return await _send_json(send, 400, {"error": "Request body must be JSON."})
+        error = _validate(request)
+        if error:
+            return await _send_json(send, 400, {"error": error})
+
+        runtime = self.get_service().runtime
+        if request.get("stream"):
+            return await self._stream(send, runtime, request)
+        result = await runtime.handle(request["message"], request.get("arguments"), str(request["session_id"]))
+        await _send_json(send, 504 if result["status"] == "timeout" else 200, result)
+
+    async def _stream(self, send, runtime: AgentRuntime, request: dict):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+        ]})
+        stream = runtime.stream(request["message"], request.get("arguments"), str(request["session_id"]))
+        async for text in stream:
+            await send({"type": "http.response.body", "body": _event({"text": text}), "more_body": True})
+        await send({"type": "http.response.body", "body": _event(stream.result, "result")})
+
+
+def _validate(request) -> str:
+    """Why a /v1/chat request body is unusable, or "" when it is fine."""
+    if not isinstance(request, dict):
+        return "Request body must be a JSON object."
+    if not isinstance(request.get("message"), str) or not request["message"].strip():
+        return "'message' must be a non-empty string."
+    if request.get("session_id") in (None, ""):
+        return "'session_id' is required: every user gets their own session."
+    if request.get("arguments") is not None and not isinstance(request["arguments"], dict):
+        return "'arguments' must be an object of tool arguments."
+    return ""
+
+
+async def _read_body(receive):
+    """The request body, or None once it grows past MAX_BODY_BYTES."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send_json(send, status: int, payload: dict):
+    data = json.dumps(payload, default=str).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(data)).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": data})
+
+
+def _event(payload: dict, event: str = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, default=str)}\n\n".encode()
+
+
+app = PortalApp()
+
+
+if __name__ == "__main__":
+    import uvicorn  # any ASGI server works; uvicorn is not a requirement of the portal itself
+
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "8000")))
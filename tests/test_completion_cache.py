@@ -0,0 +1,27 @@
+import time
+from types import SimpleNamespace
+
+from my_agents.completion_cache import CompletionCache, make_cache_key
+
+MESSAGES = [{"role": "user", "content": "How is my  portfolio doing?"}]
+
+
+def test_key_covers_every_request_option_but_transport_ones():
+    key = make_cache_key("gpt-4.1", MESSAGES, temperature=0, tools=[])
+    assert key != make_cache_key("gpt-4.1", MESSAGES, temperature=0, tools=[], tool_choice="required")
+    assert key != make_cache_key("gpt-4.1", MESSAGES, temperature=0, tools=[], response_format={"type": "json_object"})
+    assert key == make_cache_key("gpt-4.1", MESSAGES, temperature=0, tools=[], stream=False, timeout=30)
+    assert key == make_cache_key(
+        "gpt-4.1", [{"role": "user", "content": "How is my portfolio doing? "}], temperature=0, tools=[]
+    )
+
+
+def test_expired_rows_are_purged_from_the_file(tmp_path):
+    path = str(tmp_path / "completions.sqlite3")
+    cache = CompletionCache(ttl_seconds=0.01, db_path=path)
+    message = SimpleNamespace(content="Up 3%", tool_calls=[])
+    cache.set("old", SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+    time.sleep(0.02)
+
+    reopened = CompletionCache(db_path=path)
+    assert reopened.db.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 0
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from my_agents.llm_client import BudgetExceeded, LLMCallCounter, chat_completion
+from my_agents.model_policy import ModelPolicy, configure_model_policy
+from my_agents.tool_schemas import call_functions
+
+
+class FakeClient:
+    """Answers every chat completion with plain text and 100 billed tokens."""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs["model"])
+        message = SimpleNamespace(content="no function", tool_calls=[])
+        usage = SimpleNamespace(prompt_tokens=80, completion_tokens=20)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class Lookup(BaseModel):
+    symbol: str
+
+
+@pytest.fixture
+def policy():
+    policy = configure_model_policy(ModelPolicy.tiered("big", "small", token_budget=150))
+    yield policy
+    configure_model_policy(None)
+
+
+def test_escalation_is_only_recorded_when_another_attempt_follows(policy):
+    with pytest.raises(ValueError):
+        call_functions(FakeClient(), "big", [{"role": "user", "content": "hi"}], "routing", {"lookup": ("", Lookup)},
+                       max_retries=0)
+    assert policy.stats()["routing"]["small"]["escalations"] == 0
+
+
+def test_calls_are_refused_once_the_token_budget_is_spent(policy):
+    client = FakeClient()
+    messages = [{"role": "user", "content": "hi"}]
+    with LLMCallCounter():
+        chat_completion(client, "big", messages, "summary")
+        chat_completion(client, "big", messages, "summary")
+        with pytest.raises(BudgetExceeded):
+            chat_completion(client, "big", messages, "summary")
+    assert client.calls == ["big", "big"]
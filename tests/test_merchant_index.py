@@ -0,0 +1,60 @@
+import threading
+import time
+
+from tools.merchant_index import MerchantIndex
+
+
+def test_fallback_runs_outside_the_lock_once_per_merchant():
+    calls, started = [], threading.Event()
+
+    def slow_fallback(merchant):
+        calls.append(merchant)
+        started.set()
+        time.sleep(0.2)
+        return "Utilities"
+
+    index = MerchantIndex(fallback=slow_fallback)
+    batch = threading.Thread(target=index.classify_batch, args=(["mystery a", "mystery a", "mystery b"],))
+    batch.start()
+    started.wait()
+
+    begin = time.perf_counter()
+    assert index.classify("uber ride") == "Transportation"
+    assert time.perf_counter() - begin < 0.1
+    batch.join()
+    assert calls == ["mystery a", "mystery b"]
+
+
+def test_failed_fallback_is_not_asked_again_until_the_retry_time():
+    calls = []
+
+    def failing_fallback(merchant):
+        calls.append(merchant)
+        return None
+
+    index = MerchantIndex(fallback=failing_fallback, retry_failed_after=3600)
+    assert index.classify_batch(["mystery shop"] * 3) == ["Other"] * 3
+    assert index.classify("MYSTERY SHOP") == "Other"
+    assert index.classify("mystery shop", use_fallback=False) == "Other"
+    assert calls == ["mystery shop"]
+    assert "mystery shop" not in index.memo
+
+    index.retry_failed_after = 0
+    index.failed["mystery shop"] = 0
+    index.classify("mystery shop")
+    assert calls == ["mystery shop", "mystery shop"]
+
+
+def test_overrides_only_apply_to_the_user_who_set_them(tmp_path):
+    path = tmp_path / "merchants.sqlite3"
+    index = MerchantIndex(path=str(path))
+    assert index.classify("netflix") == "Entertainment"
+    index.set_override("netflix", "Utilities", user="alice")
+
+    assert index.classify("netflix", user="alice") == "Utilities"
+    assert index.classify("netflix", user="bob") == "Entertainment"
+    assert index.for_user("alice").classify_batch(["netflix"]) == ["Utilities"]
+
+    reopened = MerchantIndex(path=str(path))
+    assert reopened.classify("netflix", user="alice") == "Utilities"
+    assert reopened.classify("netflix", user="bob") == "Entertainment"
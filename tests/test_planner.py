@@ -0,0 +1,39 @@
+from my_agents.planner import _plan_without_llm, plan_locally
+
+AGENTS = {"spend": None, "investment": None, "project": None}
+
+
+def _routes(tasks):
+    return [(task["decision"]["agent"], task["decision"]["tool"]) for task in tasks]
+
+
+def test_independent_requests_fan_out():
+    tasks = plan_locally("netflix 12.99 and how is my portfolio doing?")
+    assert _routes(tasks) == [("spend", "expense_classifier"), ("investment", "portfolio_analyzer")]
+
+
+def test_discount_rate_clause_stays_with_npv_request():
+    message = "What is the NPV of my projects? Discount rate 10%"
+    assert plan_locally(message) is None
+
+    tasks = _plan_without_llm(AGENTS, message)
+    assert _routes(tasks) == [("project", "project_npv_calculator")]
+    assert tasks[0]["decision"]["arguments"] == {"discount_rate": 0.1}
+    assert tasks[0]["input"] == message
+
+
+def test_second_budget_is_not_recorded_as_expense():
+    message = "set my budget for groceries to 400 and entertainment 100"
+    assert plan_locally(message) is None
+
+    tasks = _plan_without_llm(AGENTS, message)
+    assert _routes(tasks) == [("spend", "set_budget")]
+
+
+def test_payment_clause_stays_with_debt_request():
+    message = "I have a 3000 visa debt. payment of 90. how to pay off?"
+    assert plan_locally(message) is None
+
+    tasks = _plan_without_llm(AGENTS, message)
+    assert _routes(tasks) == [("project", "debt_payoff_optimizer")]
+    assert tasks[0]["input"] == message
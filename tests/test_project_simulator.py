@@ -0,0 +1,21 @@
+from tools import project_simulator
+from tools.project_simulator import shutdown_pool, simulate_project_npv
+
+PROJECT = {"initial_investment": 10_000, "base_income": 500, "expenses": 100, "growth_rate": 0.01, "periods": 24}
+
+
+def test_small_runs_do_not_start_the_pool():
+    simulate_project_npv(PROJECT, 0.08, n_paths=50_000, seed=1, workers=4)
+    assert project_simulator._POOL is None
+
+
+def test_pooled_run_matches_the_serial_one(monkeypatch):
+    serial = simulate_project_npv(PROJECT, 0.08, n_paths=60_000, seed=1, workers=1)
+    monkeypatch.setattr(project_simulator, "PARALLEL_MIN_PATHS", 0)
+    try:
+        pooled = simulate_project_npv(PROJECT, 0.08, n_paths=60_000, seed=1, workers=2)
+        assert project_simulator._POOL is not None
+    finally:
+        shutdown_pool()
+    assert project_simulator._POOL is None
+    assert pooled == serial
@@ -0,0 +1,20 @@
+import pytest
+
+from my_agents.router import LOCAL_CONFIDENCE_THRESHOLD, classify_locally
+
+
+@pytest.mark.parametrize("message", ["salary 3000", "sold 10 shares", "dividend 42"])
+def test_income_and_trades_are_not_guessed_as_spending(message):
+    assert classify_locally(message)["tool"] != "expense_classifier"
+
+
+@pytest.mark.parametrize("message", ["apple 150", "starbucks $4.50"])
+def test_merchant_and_amount_guess_is_left_to_the_llm(message):
+    decision = classify_locally(message)
+    assert decision["tool"] == "expense_classifier"
+    assert decision["confidence"] < LOCAL_CONFIDENCE_THRESHOLD
+
+
+def test_known_merchant_is_routed_locally():
+    decision = classify_locally("netflix 12.99")
+    assert (decision["tool"], decision["confidence"]) == ("expense_classifier", 1.0)
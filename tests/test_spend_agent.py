@@ -0,0 +1,41 @@
+import contextvars
+import threading
+
+import pytest
+
+from my_agents.session_memory import SessionStore
+from my_agents.spend_agent import SpendManagementAgent
+
+
+@pytest.fixture
+def store():
+    return SessionStore()
+
+
+@pytest.fixture
+def spend(tmp_path, monkeypatch, store):
+    monkeypatch.setenv("MERCHANT_INDEX_PATH", str(tmp_path / "merchants.sqlite3"))
+    monkeypatch.setenv("LEDGER_DIR", str(tmp_path / "ledger"))
+    monkeypatch.delenv("MERCHANT_LLM_FALLBACK", raising=False)
+    return SpendManagementAgent(None, "gpt-4.1", store)
+
+
+def _in_threads(target, count):
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(target,)) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_parallel_expenses_of_one_session_are_all_counted(spend, store):
+    with store.activate("user-1"):
+        spend.execute_tool("set_budget", {"category": "Entertainment", "amount": 10_000})
+
+        def record():
+            for _ in range(25):
+                spend.execute_tool("expense_classifier", {"description": "netflix", "amount": 1, "date": "2026-10-05"})
+
+        _in_threads(record, 8)
+        assert spend.load_budgets().status("Entertainment", "month", "2026-10-05")["spent"] == 200
+
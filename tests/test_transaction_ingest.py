@@ -0,0 +1,39 @@
+from tools.transaction_ingest import classify_transactions_file, read_transactions
+
+
+def _write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_us_dates_are_read_as_iso_dates(tmp_path):
+    path = _write(tmp_path, "export.csv", "Date,Description,Amount\n10/05/2026,Uber ride,-12.50\n")
+    assert list(read_transactions(path)) == [{"date": "2026-10-05", "description": "Uber ride", "amount": -12.5}]
+
+
+def test_day_first_dates_need_a_date_format(tmp_path):
+    path = _write(tmp_path, "export.csv", "Date,Description,Amount\n25/10/2026,Uber ride,-12.50\n")
+    assert list(read_transactions(path, date_format="%d/%m/%Y"))[0]["date"] == "2026-10-25"
+
+
+def test_debit_and_credit_columns_give_signed_amounts(tmp_path):
+    path = _write(tmp_path, "export.csv", "Date,Description,Debit,Credit\n2026-10-05,Uber ride,12.50,\n"
+                                         "2026-10-06,Salary,,3000\n")
+    assert [record["amount"] for record in read_transactions(path)] == [-12.5, 3000.0]
+
+
+def test_debit_type_column_marks_outflows(tmp_path):
+    path = _write(tmp_path, "export.csv", "Date,Description,Amount,Type\n2026-10-05,Uber ride,12.50,Debit\n"
+                                         "2026-10-06,Refund,4.00,Credit\n")
+    assert [record["amount"] for record in read_transactions(path)] == [-12.5, 4.0]
+
+
+def test_unreadable_rows_are_reported_not_fatal(tmp_path):
+    path = _write(tmp_path, "export.csv", "Date,Description,Amount\n2026-10-05,Uber ride,-12.50\n"
+                                         "someday,Netflix,-9.99\n2026-10-07,Whole Foods,abc\n")
+    recorded = []
+    summary = classify_transactions_file(path, str(tmp_path / "out.jsonl"),
+                                         on_transaction=lambda record, category: recorded.append(category))
+    assert recorded == ["Transportation"]
+    assert [line for line, _ in summary["skipped"]] == [3, 4]
@@ -1,9 +1,243 @@
-def remind_upcoming_bills(bills: list) -> str:
-    """Simple reminder for bills."""
-    if not bills:
-        return "You have no upcoming bills!"
-    
-    message = "📋 Upcoming Bills:\n"
-    for bill in bills:
-        message += f"- {bill['name']} due on {bill['due_date']}\n"
-    return message
\ No newline at end of file
+import calendar
+import heapq
+import itertools
+from datetime import date, datetime, timedelta
+
+FREQUENCIES = ("once", "days", "monthly", "annual")
+DEFAULT_LEAD_DAYS = 3
+
+
+def _to_date(value) -> date:
+    if value is None:
+        return date.today()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _add_months(day: date, months: int, anchor_day: int) -> date:
+    """Move `months` ahead, keeping the anchor day where the month is long enough (Jan 31 -> Feb 28 -> Mar 31)."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def next_due_date(bill: dict, due: date):
+    """Due date following `due` under the bill's recurrence rule, or None for one-off bills."""
+    frequency, interval = bill["frequency"], bill["interval"]
+    if frequency == "once":
+        return None
+    if frequency == "days":
+        return due + timedelta(days=interval)
+    anchor = _to_date(bill["first_due"]).day
+    return _add_months(due, interval if frequency == "monthly" else 12 * interval, anchor)
+
+
+def remind_upcoming_bills(bills: list) -> str:
+    """Format upcoming bills ({name, due_date[, amount]}) as a reminder message."""
+    if not bills:
+        return "You have no upcoming bills!"
+
+    lines = ["📋 Upcoming Bills:"]
+    for bill in bills:
+        amount = f" (${bill['amount']:,.2f})" if bill.get("amount") else ""
+        lines.append(f"- {bill['name']}{amount} due on {bill['due_date']}")
+    return "\n".join(lines) + "\n"
+
+
+class BillScheduler:
+    """Recurring bills kept in two min-heaps: one by next due date, one by next reminder date.
+
+    Adding, paying or removing a bill is O(log n). Queries only pop the bills
+    that are actually due inside the window, so "due within N days" and the
+    reminder `tick()` cost O(k log n) for k matching bills instead of a scan
+    of every bill. Superseded heap entries are skipped lazily using a
+    per-bill version number.
+
+    Nothing runs in the background: reminders are computed on demand, when
+    the user asks about their bills.
+    """
+
+    def __init__(self, lead_days: int = DEFAULT_LEAD_DAYS):
+        self.lead_days = lead_days
+        self.bills = {}  # bill_id -> bill dict (next_due, reminded_for, version, ...)
+        self.due_heap = []  # (next_due, bill_id, version)
+        self.reminder_heap = []  # (remind_on, bill_id, version)
+        self._ids = itertools.count(1)
+
+    # === Bills ===
+
+    def add_bill(self, name: str, first_due, amount: float = 0.0, frequency: str = "monthly",
+                 interval: int = 1, lead_days: int = None) -> int:
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Unknown bill frequency: {frequency}")
+        if int(interval) < 1:
+            raise ValueError("Bill interval must be at least 1")
+        bill_id = next(self._ids)
+        first_due = _to_date(first_due)
+        self.bills[bill_id] = {
+            "id": bill_id,
+            "name": name,
+            "amount": float(amount or 0.0),
+            "frequency": frequency,
+            "interval": int(interval),
+            "first_due": first_due.isoformat(),
+            "next_due": first_due,
+            "lead_days": self.lead_days if lead_days is None else int(lead_days),
+            "reminded_for": None,
+            "version": 0,
+        }
+        self._schedule(bill_id)
+        return bill_id
+
+    def remove_bill(self, bill_id: int):
+        self.bills.pop(bill_id, None)  # its heap entries become stale
+
+    def mark_paid(self, bill_id: int):
+        """Move a bill on to its next occurrence; one-off bills are removed."""
+        bill = self.bills[bill_id]
+        following = next_due_date(bill, bill["next_due"])
+        if following is None:
+            self.remove_bill(bill_id)
+        else:
+            bill["next_due"] = following
+            self._schedule(bill_id)
+
+    def find(self, name: str):
+        """Id of the bill with this name (case-insensitive), or None."""
+        name = name.strip().lower()
+        return next((bill_id for bill_id, bill in self.bills.items() if bill["name"].lower() == name), None)
+
+    def _schedule(self, bill_id: int):
+        bill = self.bills[bill_id]
+        bill["version"] += 1
+        heapq.heappush(self.due_heap, (bill["next_due"], bill_id, bill["version"]))
+        heapq.heappush(self.reminder_heap, (self._remind_on(bill), bill_id, bill["version"]))
+
+    def _remind_on(self, bill: dict) -> date:
+        return bill["next_due"] - timedelta(days=bill["lead_days"])
+
+    def _is_current(self, bill_id: int, version: int) -> bool:
+        bill = self.bills.get(bill_id)
+        return bill is not None and bill["version"] == version
+
+    # === Queries ===
+
+    def roll_forward(self, today=None):
+        """Advance bills whose due date has passed to their next occurrence (one-off bills are dropped)."""
+        today = _to_date(today)
+        while self.due_heap and self.due_heap[0][0] < today:
+            due, bill_id, version = heapq.heappop(self.due_heap)
+            if not self._is_current(bill_id, version):
+                continue
+            bill = self.bills[bill_id]
+            following = due
+            while following is not None and following < today:
+                following = next_due_date(bill, following)
+            if following is None:
+                del self.bills[bill_id]
+            else:
+                bill["next_due"] = following
+                self._schedule(bill_id)
+
+    def due_within(self, days: int, today=None) -> list:
+        """Occurrences due between today and today + `days`, soonest first.
+
+        Bills that recur inside the window (e.g. every 7 days over a month)
+        are listed once per occurrence.
+        """
+        today = _to_date(today)
+        horizon = today + timedelta(days=days)
+        self.roll_forward(today)
+
+        popped, upcoming = [], []
+        while self.due_heap and self.due_heap[0][0] <= horizon:
+            entry = heapq.heappop(self.due_heap)
+            if not self._is_current(entry[1], entry[2]):
+                continue
+            popped.append(entry)
+            bill = self.bills[entry[1]]
+            due = entry[0]
+            while due is not None and due <= horizon:
+                upcoming.append({"id": bill["id"], "name": bill["name"], "amount": bill["amount"], "due_date": due.isoformat()})
+                due = next_due_date(bill, due)
+
+        for entry in popped:
+            heapq.heappush(self.due_heap, entry)
+        upcoming.sort(key=lambda occurrence: occurrence["due_date"])
+        return upcoming
+
+    def next_due(self, n: int = 1, today=None) -> list:
+        """The next `n` bills to come due (one entry per bill)."""
+        self.roll_forward(today)
+        popped, upcoming = [], []
+        while self.due_heap and len(upcoming) < n:
+            entry = heapq.heappop(self.due_heap)
+            if not self._is_current(entry[1], entry[2]):
+                continue
+            popped.append(entry)
+            bill = self.bills[entry[1]]
+            upcoming.append({"id": bill["id"], "name": bill["name"], "amount": bill["amount"], "due_date": entry[0].isoformat()})
+
+        for entry in popped:
+            heapq.heappush(self.due_heap, entry)
+        return upcoming
+
+    # === Reminders ===
+
+    def tick(self, now=None) -> list:
+        """Reminders for every bill whose reminder date has arrived.
+
+        Each occurrence is reminded once. Only reminder-heap entries that are
+        due are touched, so a tick over many bills with nothing to say is O(1).
+        """
+        today = _to_date(now)
+        fired = []
+        while self.reminder_heap and self.reminder_heap[0][0] <= today:
+            _, bill_id, version = heapq.heappop(self.reminder_heap)
+            if not self._is_current(bill_id, version):
+                continue
+            bill = self.bills[bill_id]
+            due = bill["next_due"]
+            if due < today:
+                continue  # already past due; roll_forward() reschedules it
+            if bill["reminded_for"] == due.isoformat():
+                continue
+            bill["reminded_for"] = due.isoformat()
+            reminder = {
+                "id": bill_id,
+                "name": bill["name"],
+                "amount": bill["amount"],
+                "due_date": due.isoformat(),
+                "days_left": (due - today).days,
+            }
+            fired.append(reminder)
+        return fired
+
+    # === Persistence ===
+
+    def state(self) -> dict:
+        """JSON-friendly snapshot, e.g. for the session store."""
+        return {
+            "lead_days": self.lead_days,
+            "bills": [
+                {**bill, "next_due": bill["next_due"].isoformat()}
+                for bill in self.bills.values()
+            ],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict = None) -> "BillScheduler":
+        state = state or {}
+        scheduler = cls(state.get("lead_days", DEFAULT_LEAD_DAYS))
+        for saved in state.get("bills", []):
+            bill = {**saved, "next_due": _to_date(saved["next_due"]), "version": 0}
+            scheduler.bills[bill["id"]] = bill
+            scheduler.due_heap.append((bill["next_due"], bill["id"], 0))
+            scheduler.reminder_heap.append((scheduler._remind_on(bill), bill["id"], 0))
+        heapq.heapify(scheduler.due_heap)
+        heapq.heapify(scheduler.reminder_heap)
+        scheduler._ids = itertools.count(max(scheduler.bills, default=0) + 1)
+        return scheduler
@@ -1,6 +1,119 @@
-def check_budget(category_spent: float, category_budget: float) -> str:
-    """Check if the user is within budget."""
-    if category_spent > category_budget:
-        return f"⚠️ You have overspent your budget by ${category_spent - category_budget:.2f}."
-    else:
-        return f"✅ You are within your budget. You have ${category_budget - category_spent:.2f} remaining."
\ No newline at end of file
+from datetime import date, datetime
+from functools import lru_cache
+
+
+def check_budget(category_spent: float, category_budget: float) -> str:
+    """Check if the user is within budget."""
+    if category_spent > category_budget:
+        return f"⚠️ You have overspent your budget by ${category_spent - category_budget:.2f}."
+    else:
+        return f"✅ You are within your budget. You have ${category_budget - category_spent:.2f} remaining."
+
+
+DEFAULT_THRESHOLDS = (0.8, 1.0)
+
+
+def period_key(when, period: str = "month") -> str:
+    """'2025-05' for months, '2025-W19' (ISO week) for weeks."""
+    if when is None:
+        when = date.today()
+    elif isinstance(when, str):
+        when = date.fromisoformat(when[:10])
+    elif isinstance(when, datetime):
+        when = when.date()
+
+    if period == "month":
+        return f"{when.year:04d}-{when.month:02d}"
+    if period == "week":
+        year, week, _ = when.isocalendar()
+        return f"{year:04d}-W{week:02d}"
+    raise ValueError(f"Unknown budget period: {period}")
+
+
+@lru_cache(maxsize=4096)
+def _period_keys(day: str) -> dict:
+    """Month and week keys of an ISO date string; transactions share few distinct days."""
+    return {"month": period_key(day, "month"), "week": period_key(day, "week")}
+
+
+class BudgetEngine:
+    """Running per-category, per-period spend totals with threshold alerts.
+
+    Each transaction updates the monthly and weekly totals of its category in
+    O(1), and registered callbacks fire the moment a total crosses one of the
+    category's thresholds (e.g. 80% and 100% of budget). Totals for any
+    category/period are a dictionary lookup, never a rescan of history.
+    Positive amounts are spending; refunds are negative.
+    """
+
+    def __init__(self):
+        self.budgets = {}  # (category, period) -> {"amount": float, "thresholds": [...]}
+        self.totals = {}  # (category, period, period_key) -> float
+        self.callbacks = []
+
+    def on_alert(self, callback):
+        """Call `callback(alert_dict)` whenever a budget threshold is crossed."""
+        self.callbacks.append(callback)
+
+    def set_budget(self, category: str, amount: float, period: str = "month", thresholds=DEFAULT_THRESHOLDS):
+        period_key(None, period)  # validates the period name
+        self.budgets[(category, period)] = {"amount": float(amount), "thresholds": sorted(thresholds)}
+
+    def add_transaction(self, category: str, amount: float, when=None):
+        day = when[:10] if isinstance(when, str) else (when or date.today()).isoformat()[:10]
+        for period, current_key in _period_keys(day).items():
+            key = (category, period, current_key)
+            before = self.totals.get(key, 0.0)
+            after = before + amount
+            self.totals[key] = after
+
+            budget = self.budgets.get((category, period))
+            if budget and budget["amount"] > 0:
+                self._check_thresholds(category, period, key[2], budget, before, after)
+
+    def _check_thresholds(self, category, period, key, budget, before, after):
+        for threshold in budget["thresholds"]:
+            limit = threshold * budget["amount"]
+            if before < limit <= after:
+                alert = {
+                    "category": category,
+                    "period": period,
+                    "period_key": key,
+                    "threshold": threshold,
+                    "spent": after,
+                    "budget": budget["amount"],
+                }
+                for callback in self.callbacks:
+                    callback(alert)
+
+    def spent(self, category: str, period: str = "month", when=None) -> float:
+        return self.totals.get((category, period, period_key(when, period)), 0.0)
+
+    def status(self, category: str, period: str = "month", when=None) -> dict:
+        spent = self.spent(category, period, when)
+        budget = self.budgets.get((category, period), {}).get("amount")
+        return {
+            "category": category,
+            "period": period,
+            "period_key": period_key(when, period),
+            "spent": spent,
+            "budget": budget,
+            "remaining": None if budget is None else budget - spent,
+            "ratio": None if not budget else spent / budget,
+        }
+
+    def state(self) -> dict:
+        """JSON-friendly snapshot, e.g. for the session store."""
+        return {
+            "budgets": [[category, period, budget] for (category, period), budget in self.budgets.items()],
+            "totals": [[category, period, key, total] for (category, period, key), total in self.totals.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict = None) -> "BudgetEngine":
+        engine = cls()
+        for category, period, budget in (state or {}).get("budgets", []):
+            engine.budgets[(category, period)] = budget
+        for category, period, key, total in (state or {}).get("totals", []):
+            engine.totals[(category, period, key)] = total
+        return engine
@@ -0,0 +1,136 @@
+import numpy as np
+
+from tools.bill_reminder import _to_date
+
+DEFAULT_HORIZON_DAYS = 365
+DEFAULT_HISTORY_DAYS = 90
+
+
+def bill_occurrence_days(bill: dict, start: np.datetime64, n_days: int) -> np.ndarray:
+    """Day offsets (0 = start) of every occurrence of `bill` inside the horizon, as an array."""
+    first = np.datetime64(_to_date(bill["next_due"]).isoformat(), "D")
+    end = start + np.timedelta64(n_days, "D")
+    frequency, interval = bill["frequency"], int(bill["interval"])
+
+    if frequency == "once":
+        dates = np.array([first])
+    elif frequency == "days":
+        # First occurrence on or after start, then every `interval` days
+        skip = max(0, -(-int((start - first).astype(np.int64)) // interval))
+        first = first + np.timedelta64(skip * interval, "D")
+        dates = np.arange(first, end, np.timedelta64(interval, "D"))
+    else:
+        step = interval if frequency == "monthly" else 12 * interval
+        anchor = _to_date(bill["first_due"]).day
+        first_month = first.astype("datetime64[M]")
+        behind = int((start.astype("datetime64[M]") - first_month).astype(np.int64))
+        first_month = first_month + max(0, behind) // step * step  # skip whole periods already past
+        months = first_month + np.arange(0, n_days // 28 + 2 + step, step)
+        month_lengths = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+        dates = months.astype("datetime64[D]") + np.minimum(anchor, month_lengths) - 1
+
+    offsets = (dates - start).astype(np.int64)
+    return offsets[(offsets >= 0) & (offsets < n_days)]
+
+
+def _history_patterns(ledger, start: np.datetime64, history_days: int):
+    """Average spend per weekday, average income per day of month, and average daily spend per category."""
+    history_start = start - np.timedelta64(history_days, "D")
+    rows = ledger.select(str(history_start), str(start - np.timedelta64(1, "D")))
+    amounts, dates = rows["amount"], rows["date"]
+    spend = np.where(amounts < 0, -amounts, 0.0)
+    income = np.where(amounts > 0, amounts, 0.0)
+
+    # 1970-01-01 was a Thursday: shift so Monday is 0
+    weekdays = (dates.astype(np.int64) + 3) % 7
+    history_weekdays = (np.arange(history_start, start).astype(np.int64) + 3) % 7
+    weekday_counts = np.maximum(np.bincount(history_weekdays, minlength=7), 1)
+    spend_by_weekday = np.bincount(weekdays, weights=spend, minlength=7) / weekday_counts
+
+    history_months = max(history_days / 30.4375, 1.0)
+    days_of_month = (dates - dates.astype("datetime64[M]").astype("datetime64[D]")).astype(np.int64)
+    income_by_day_of_month = np.bincount(days_of_month, weights=income, minlength=31) / history_months
+
+    by_category = np.bincount(rows["category"], weights=spend, minlength=len(ledger.categories)) / history_days
+    daily_by_category = {ledger.categories[i]: float(daily) for i, daily in enumerate(by_category) if daily > 0}
+    return spend_by_weekday, income_by_day_of_month, daily_by_category
+
+
+def _shortfalls(dates: np.ndarray, balance: np.ndarray, threshold: float) -> list:
+    """Contiguous runs of days where the projected balance is below `threshold`."""
+    below = (balance < threshold).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], below, [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    shortfalls = []
+    for first, last in zip(starts, ends):
+        lowest = first + int(np.argmin(balance[first:last]))
+        shortfalls.append({
+            "start": str(dates[first]),
+            "end": str(dates[last - 1]),
+            "lowest_balance": float(balance[lowest]),
+            "lowest_date": str(dates[lowest]),
+        })
+    return shortfalls
+
+
+def forecast_cash_flow(starting_balance: float, bills=(), ledger=None, start=None,
+                       horizon_days: int = DEFAULT_HORIZON_DAYS, history_days: int = DEFAULT_HISTORY_DAYS,
+                       threshold: float = 0.0) -> dict:
+    """Project the balance day by day from recurring bills, past spending and past income.
+
+    `bills` are BillScheduler bill dicts; `ledger` is a TransactionLedger whose
+    last `history_days` give the spending pattern (average per weekday) and
+    the income pattern (average per day of month). Everything is computed
+    with array operations, so a 12-month projection takes a few milliseconds.
+    Returns the daily arrays plus the runs of days below `threshold`.
+    """
+    start = np.datetime64(_to_date(start).isoformat(), "D")
+    dates = np.arange(start, start + np.timedelta64(horizon_days, "D"))
+
+    bill_outflows = np.zeros(horizon_days)
+    for bill in bills:
+        offsets = bill_occurrence_days(bill, start, horizon_days)
+        bill_outflows += np.bincount(offsets, minlength=horizon_days)[:horizon_days] * bill["amount"]
+
+    spending = np.zeros(horizon_days)
+    income = np.zeros(horizon_days)
+    daily_by_category = {}
+    if ledger is not None and len(ledger):
+        spend_by_weekday, income_by_day_of_month, daily_by_category = _history_patterns(ledger, start, history_days)
+        spending = spend_by_weekday[(dates.astype(np.int64) + 3) % 7]
+        income = income_by_day_of_month[(dates - dates.astype("datetime64[M]").astype("datetime64[D]")).astype(np.int64)]
+
+    net = income - spending - bill_outflows
+    balance = float(starting_balance) + np.cumsum(net)
+
+    return {
+        "dates": dates,
+        "balance": balance,
+        "income": income,
+        "spending": spending,
+        "bills": bill_outflows,
+        "daily_spend_by_category": daily_by_category,
+        "shortfalls": _shortfalls(dates, balance, threshold),
+        "lowest_balance": float(balance.min()) if horizon_days else float(starting_balance),
+        "ending_balance": float(balance[-1]) if horizon_days else float(starting_balance),
+    }
+
+
+def summarize_forecast(forecast: dict) -> str:
+    """One-paragraph summary of a forecast for the agent's response."""
+    months = forecast["dates"].astype("datetime64[M]")
+    lowest_day = int(np.argmin(forecast["balance"]))
+    summary = (
+        f"Projected balance in {len(forecast['dates'])} days: ${forecast['ending_balance']:,.2f}. "
+        f"Lowest point: ${forecast['lowest_balance']:,.2f} on {forecast['dates'][lowest_day]}. "
+        f"Expected bills: ${forecast['bills'].sum():,.2f} over {len(np.unique(months))} months."
+    )
+    if forecast["shortfalls"]:
+        first = forecast["shortfalls"][0]
+        summary += (
+            f" ⚠️ {len(forecast['shortfalls'])} projected shortfall(s); the first starts on {first['start']} "
+            f"and bottoms out at ${first['lowest_balance']:,.2f} on {first['lowest_date']}."
+        )
+    else:
+        summary += " ✅ No shortfalls projected."
+    return summary
@@ -1,6 +1,154 @@
-def suggest_debt_payoff(budget: float, monthly_debt_payment: float) -> str:
-    """Suggest if extra payments are possible."""
-    if budget > monthly_debt_payment * 1.5:
-        return "✅ You can consider making extra payments to reduce your debt faster."
-    else:
-        return "⚠️ Stick to your regular payment schedule for now."
\ No newline at end of file
+from datetime import date
+
+import numpy as np
+
+STRATEGIES = ("avalanche", "snowball")
+MAX_MONTHS = 600
+
+
+def suggest_debt_payoff(budget: float, monthly_debt_payment: float) -> str:
+    """Suggest if extra payments are possible."""
+    if budget > monthly_debt_payment * 1.5:
+        return "✅ You can consider making extra payments to reduce your debt faster."
+    else:
+        return "⚠️ Stick to your regular payment schedule for now."
+
+
+def debt_arrays(debts: list):
+    """Turn debt dicts {name, balance, apr, minimum_payment} into (names, balances, monthly rates, minimums)."""
+    names = [str(debt.get("name") or f"Debt {i + 1}") for i, debt in enumerate(debts)]
+    balances = np.array([float(debt["balance"]) for debt in debts])
+    aprs = np.array([float(debt.get("apr") or 0.0) for debt in debts])
+    aprs = np.where(aprs > 1, aprs / 100, aprs)  # accept 19.99 as well as 0.1999
+    minimums = np.array([float(debt.get("minimum_payment") or 0.0) for debt in debts])
+    return names, balances, aprs / 12, minimums
+
+
+def priority_order(strategy: str, balances: np.ndarray, monthly_rates: np.ndarray) -> np.ndarray:
+    """Order in which extra money is thrown at the debts."""
+    if strategy == "avalanche":  # highest rate first, smaller balance breaks ties
+        return np.lexsort((balances, -monthly_rates))
+    if strategy == "snowball":  # smallest balance first, higher rate breaks ties
+        return np.lexsort((-monthly_rates, balances))
+    raise ValueError(f"Unknown payoff strategy: {strategy}")
+
+
+def simulate_payoff(debts: list, extra_budgets, strategies=STRATEGIES, max_months: int = MAX_MONTHS,
+                    schedules: bool = True) -> dict:
+    """Simulate every strategy at every extra-payment level at once, month by month.
+
+    State is an (S strategies, B budgets, D debts) balance array. Each month
+    accrues interest, pays each minimum, then pours the rest of the monthly
+    budget (all minimums plus the extra amount, so paid-off minimums roll
+    over) into the debts in the strategy's priority order with one cumulative
+    sum. Avalanche minimizes total interest for a fixed monthly budget, so it
+    doubles as the optimal allocation; `best_strategy` reports the cheapest
+    strategy per budget level. With `schedules` the month-by-month balances,
+    interest and payments are kept as (months, S, B, D) arrays.
+    """
+    names, balances, monthly_rates, minimums = debt_arrays(debts)
+    extra_budgets = np.atleast_1d(np.asarray(extra_budgets, dtype=float))
+    strategies = tuple(strategies)
+    n_strategies, n_budgets, n_debts = len(strategies), len(extra_budgets), len(balances)
+
+    orders = np.stack([priority_order(strategy, balances, monthly_rates) for strategy in strategies])
+    orders = np.broadcast_to(orders[:, None, :], (n_strategies, n_budgets, n_debts))
+    monthly_budget = (minimums.sum() + extra_budgets)[None, :]  # (1, B)
+
+    balance = np.broadcast_to(balances, (n_strategies, n_budgets, n_debts)).copy()
+    total_interest = np.zeros((n_strategies, n_budgets))
+    total_paid = np.zeros((n_strategies, n_budgets))
+    payoff_month = np.full((n_strategies, n_budgets, n_debts), np.nan)
+    payoff_month[:, :, balances <= 0] = 0
+    history = {"balance": [], "interest": [], "payment": []}
+
+    month = 0
+    while month < max_months and (balance > 0.005).any():
+        month += 1
+        interest = balance * monthly_rates
+        balance = balance + interest
+
+        required = np.minimum(minimums, balance)
+        pool = np.maximum(monthly_budget - required.sum(axis=2), 0.0)
+        remaining = np.take_along_axis(balance - required, orders, axis=2)
+        # Each debt in priority order gets what is left of the pool after the ones before it
+        already_used = np.cumsum(remaining, axis=2) - remaining
+        extra = np.clip(pool[:, :, None] - already_used, 0.0, remaining)
+        payment = required.copy()
+        np.put_along_axis(payment, orders, np.take_along_axis(payment, orders, axis=2) + extra, axis=2)
+
+        balance = balance - payment
+        balance[balance < 0.005] = 0.0
+        total_interest += interest.sum(axis=2)
+        total_paid += payment.sum(axis=2)
+        payoff_month[np.isnan(payoff_month) & (balance == 0)] = month
+
+        if schedules:
+            history["balance"].append(balance)
+            history["interest"].append(interest)
+            history["payment"].append(payment)
+
+    months_to_payoff = np.where(np.isnan(payoff_month).any(axis=2), np.nan, np.nanmax(payoff_month, axis=2, initial=0))
+    # Unfinished plans (payments below interest) rank last
+    cost = np.where(np.isnan(months_to_payoff), np.inf, total_interest)
+
+    result = {
+        "names": names,
+        "strategies": strategies,
+        "extra_budgets": extra_budgets,
+        "months_to_payoff": months_to_payoff,
+        "debt_payoff_month": payoff_month,
+        "total_interest": total_interest,
+        "total_paid": total_paid,
+        "best_strategy": [strategies[i] for i in np.argmin(cost, axis=0)],
+    }
+    if schedules:
+        result["schedule"] = {
+            key: np.stack(values) if values else np.zeros((0, n_strategies, n_budgets, n_debts))
+            for key, values in history.items()
+        }
+    return result
+
+
+def sweep_extra_payments(debts: list, extra_budgets, strategies=STRATEGIES, max_months: int = MAX_MONTHS) -> dict:
+    """Compare strategies across many extra-payment levels without keeping schedules."""
+    return simulate_payoff(debts, extra_budgets, strategies, max_months, schedules=False)
+
+
+def _month_after(start: date, months: int) -> str:
+    month_index = start.month - 1 + months
+    return f"{start.year + month_index // 12:04d}-{month_index % 12 + 1:02d}"
+
+
+def payoff_plan(debts: list, extra_budget: float = 0.0, start: date = None) -> dict:
+    """Avalanche vs snowball for one budget, with payoff dates and amortization schedules."""
+    start = start or date.today()
+    simulation = simulate_payoff(debts, [extra_budget])
+    plans = {}
+    for s, strategy in enumerate(simulation["strategies"]):
+        months = simulation["months_to_payoff"][s, 0]
+        schedule = simulation["schedule"]
+        plans[strategy] = {
+            "months": None if np.isnan(months) else int(months),
+            "payoff_date": None if np.isnan(months) else _month_after(start, int(months)),
+            "total_interest": float(simulation["total_interest"][s, 0]),
+            "total_paid": float(simulation["total_paid"][s, 0]),
+            "debts": [
+                {
+                    "name": name,
+                    "payoff_date": None if np.isnan(paid_off) else _month_after(start, int(paid_off)),
+                    "interest": float(schedule["interest"][:, s, 0, d].sum()),
+                }
+                for d, (name, paid_off) in enumerate(zip(simulation["names"], simulation["debt_payoff_month"][s, 0]))
+            ],
+            "schedule": [
+                {
+                    "month": _month_after(start, m + 1),
+                    "payments": schedule["payment"][m, s, 0].round(2).tolist(),
+                    "interest": schedule["interest"][m, s, 0].round(2).tolist(),
+                    "balances": schedule["balance"][m, s, 0].round(2).tolist(),
+                }
+                for m in range(len(schedule["balance"]))
+            ],
+        }
+    return {"names": simulation["names"], "best_strategy": simulation["best_strategy"][0], "plans": plans}
@@ -1,13 +1,58 @@
-def classify_expense(description: str) -> str:
-    """Simple expense classifier based on keywords."""
-    description = description.lower()
-    if any(word in description for word in ["uber", "taxi", "flight", "bus", "transport"]):
-        return "Transportation"
-    elif any(word in description for word in ["grocery", "supermarket", "food", "restaurant"]):
-        return "Groceries"
-    elif any(word in description for word in ["movie", "cinema", "concert", "netflix"]):
-        return "Entertainment"
-    elif any(word in description for word in ["electricity", "water", "internet", "utility"]):
-        return "Utilities"
-    else:
-        return "Other"
\ No newline at end of file
+import json
+import re
+
+CATEGORY_KEYWORDS = {
+    "Transportation": ["uber", "taxi", "flight", "bus", "transport"],
+    "Groceries": ["grocery", "supermarket", "food", "restaurant"],
+    "Entertainment": ["movie", "cinema", "concert", "netflix"],
+    "Utilities": ["electricity", "water", "internet", "utility"],
+}
+
+DEFAULT_CATEGORY = "Other"
+
+
+class ExpenseClassifier:
+    """Keyword classifier compiled from a user taxonomy into a single regex.
+
+    The taxonomy maps category -> keywords. Keywords match as case-insensitive
+    substrings; when several categories match, the one listed first in the
+    taxonomy wins.
+    """
+
+    def __init__(self, taxonomy: dict = None, default_category: str = DEFAULT_CATEGORY):
+        self.taxonomy = taxonomy or CATEGORY_KEYWORDS
+        self.default_category = default_category
+
+        self.keyword_rank = {}  # keyword -> (rank, category)
+        for rank, (category, keywords) in enumerate(self.taxonomy.items()):
+            for keyword in keywords:
+                self.keyword_rank.setdefault(keyword.lower(), (rank, category))
+
+        # Longest keywords first so overlapping keywords resolve to the most specific one
+        alternatives = sorted(self.keyword_rank, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(word) for word in alternatives)) if alternatives else None
+
+    def classify(self, description: str) -> str:
+        if self.pattern is None:
+            return self.default_category
+        matches = self.pattern.findall(description.lower())
+        if not matches:
+            return self.default_category
+        return min(self.keyword_rank[match] for match in matches)[1]
+
+    def classify_batch(self, descriptions) -> list:
+        return [self.classify(description) for description in descriptions]
+
+
+def load_taxonomy(path: str) -> dict:
+    """Load a {category: [keywords]} taxonomy from a JSON file."""
+    with open(path, encoding="utf-8") as f:
+        taxonomy = json.load(f)
+    return {str(category): [str(word) for word in words] for category, words in taxonomy.items()}
+
+
+_default_classifier = ExpenseClassifier()
+
+def classify_expense(description: str) -> str:
+    """Simple expense classifier based on keywords."""
+    return _default_classifier.classify(description)
@@ -0,0 +1,214 @@
+from collections import OrderedDict
+import re
+import sqlite3
+import threading
+import time
+
+from tools.expense_classifier import ExpenseClassifier
+
+# Payment processor prefixes that hide the real merchant name
+_PROCESSOR_PREFIX = re.compile(r"^(?:pos|sq|tst|paypal|pp|sp|dd|ach|debit|purchase)\s*\*?\s+")
+_NOISE = re.compile(r"[^a-z&' ]+")
+
+
+def normalize_merchant(description: str) -> str:
+    """'SQ *BLUE BOTTLE #123 SF' -> 'blue bottle sf': lowercase, no processor prefix, digits or punctuation."""
+    text = _NOISE.sub(" ", description.lower().replace("*", " * "))
+    text = " ".join(text.split())
+    text = _PROCESSOR_PREFIX.sub("", text.replace(" * ", " "))
+    return text.strip() or description.strip().lower()
+
+
+class MerchantIndex:
+    """Memoize expense categories per normalized merchant, with sticky per-user overrides.
+
+    Lookups go: the user's override -> memoized result -> keyword classifier ->
+    optional `fallback(merchant)` (e.g. an LLM) for merchants the keywords do
+    not know. Every merchant is classified at most once while it stays in the
+    bounded LRU; overrides and learned results are persisted to SQLite (in
+    batches) when `path` is given, so the index is warm after a restart.
+    Overrides only apply to the `user` who set them; the memo is shared.
+    When the fallback fails, the merchant gets the default category without
+    asking again for `retry_failed_after` seconds.
+    """
+
+    def __init__(self, classifier: ExpenseClassifier = None, max_entries: int = 100_000, path: str = None,
+                 fallback=None, flush_every: int = 256, retry_failed_after: float = 3600):
+        self.classifier = classifier or ExpenseClassifier()
+        self.max_entries = max_entries
+        self.fallback = fallback
+        self.flush_every = flush_every
+        self.retry_failed_after = retry_failed_after
+        self.overrides = {}  # (user, merchant) -> category
+        self.memo = OrderedDict()  # merchant -> category
+        self.pending = {}  # merchant -> (category, source) not yet written to disk
+        self.failed = OrderedDict()  # merchant -> time.monotonic() when the fallback may be asked again
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fallback_calls = 0
+        self.lock = threading.RLock()
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS merchants (merchant TEXT PRIMARY KEY, category TEXT, source TEXT)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS overrides "
+                "(user TEXT, merchant TEXT, category TEXT, PRIMARY KEY (user, merchant))"
+            )
+            self.db.commit()
+            rows = self.db.execute("SELECT merchant, category, source FROM merchants").fetchall()
+            for merchant, category, source in rows:
+                # "override" rows predate per-user overrides; nobody can tell whose they were
+                if source != "override" and len(self.memo) < max_entries:
+                    self.memo[merchant] = category
+            for user, merchant, category in self.db.execute("SELECT user, merchant, category FROM overrides"):
+                self.overrides[(user, merchant)] = category
+
+    def classify(self, description: str, use_fallback: bool = True, user: str = "") -> str:
+        """The category of the merchant behind `description`, for `user`.
+
+        With use_fallback=False a merchant that needs the fallback gives None
+        instead, so an async caller can run its own fallback and hand the
+        answer to record_fallback().
+        """
+        return self.classify_batch([description], use_fallback, user)[0]
+
+    def classify_batch(self, descriptions, use_fallback: bool = True, user: str = "") -> list:
+        """classify() for many descriptions, asking the fallback once per unknown merchant.
+
+        The lookups share one lock acquisition; the fallback (a slow LLM call)
+        runs after the lock is released, so other users' lookups go on.
+        """
+        categories, unresolved = [], {}  # merchant -> positions waiting for the fallback
+        with self.lock:
+            for description in descriptions:
+                merchant = normalize_merchant(description)
+                category = self._lookup(merchant, description, user)
+                if category is None:
+                    unresolved.setdefault(merchant, []).append(len(categories))
+                categories.append(category)
+
+        if use_fallback:
+            for merchant, positions in unresolved.items():
+                category = self.record_fallback(merchant, self.fallback(merchant))
+                for position in positions:
+                    categories[position] = category
+        return categories
+
+    def _lookup(self, merchant: str, description: str, user: str):
+        """Category from the user's overrides, memo or keywords; None when the fallback has to decide.
+
+        Needs the lock.
+        """
+        override = self.overrides.get((user, merchant))
+        if override is not None:
+            self.hits += 1
+            return override
+
+        category = self.memo.get(merchant)
+        if category is not None:
+            self.memo.move_to_end(merchant)
+            self.hits += 1
+            return category
+
+        self.misses += 1
+        category = self.classifier.classify(description)
+        if category == self.classifier.default_category and self.fallback is not None:
+            retry_at = self.failed.get(merchant)
+            if retry_at is None or retry_at <= time.monotonic():
+                self.failed.pop(merchant, None)
+                return None
+            return category
+        self._remember(merchant, category, "keywords")
+        return category
+
+    def record_fallback(self, merchant: str, category) -> str:
+        """Remember the fallback's answer for a normalized merchant and return the category to use.
+
+        None means the fallback failed: the default category is used, and
+        the merchant is only asked about again after `retry_failed_after`
+        seconds (failures are not persisted, so after a restart too).
+        """
+        with self.lock:
+            self.fallback_calls += 1
+            if category is None:
+                self.failed[merchant] = time.monotonic() + self.retry_failed_after
+                self.failed.move_to_end(merchant)
+                while len(self.failed) > self.max_entries:
+                    self.failed.popitem(last=False)
+                return self.classifier.default_category
+            self.failed.pop(merchant, None)
+            self._remember(merchant, category, "fallback")
+            return category
+
+    def set_override(self, description: str, category: str, user: str = "") -> str:
+        """Always file this merchant under `category` for `user` from now on. Returns the normalized merchant."""
+        merchant = normalize_merchant(description)
+        with self.lock:
+            self.overrides[(user, merchant)] = category
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO overrides (user, merchant, category) VALUES (?, ?, ?)",
+                    (user, merchant, category),
+                )
+                self.db.commit()
+        return merchant
+
+    def for_user(self, user: str) -> "UserMerchantIndex":
+        """This index as `user` sees it, for code that only knows classify()/classify_batch()."""
+        return UserMerchantIndex(self, user)
+
+    def _remember(self, merchant: str, category: str, source: str):
+        self.memo[merchant] = category
+        while len(self.memo) > self.max_entries:
+            self.memo.popitem(last=False)
+            self.evictions += 1
+
+        if self.db is not None:
+            self.pending[merchant] = (category, source)
+            if len(self.pending) >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.db is not None and self.pending:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO merchants (merchant, category, source) VALUES (?, ?, ?)",
+                    [(merchant, category, source) for merchant, (category, source) in self.pending.items()],
+                )
+                self.db.commit()
+            self.pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fallback_calls": self.fallback_calls,
+            "fallback_failures": len(self.failed),
+            "size": len(self.memo),
+            "overrides": len(self.overrides),
+        }
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+
+
+class UserMerchantIndex:
+    """A MerchantIndex bound to one user, whose overrides apply."""
+
+    def __init__(self, index: MerchantIndex, user: str):
+        self.index = index
+        self.user = user
+
+    def classify(self, description: str, use_fallback: bool = True) -> str:
+        return self.index.classify(description, use_fallback, self.user)
+
+    def classify_batch(self, descriptions, use_fallback: bool = True) -> list:
+        return self.index.classify_batch(descriptions, use_fallback, self.user)
@@ -1,7 +1,197 @@
-def analyze_portfolio(returns: list) -> str:
-    """Analyze simple portfolio returns."""
-    average_return = sum(returns) / len(returns) if returns else 0
-    if average_return > 0:
-        return f"📈 Your portfolio is performing well with an average return of {average_return:.2f}%."
-    else:
-        return f"📉 Your portfolio is underperforming with an average return of {average_return:.2f}%."
\ No newline at end of file
+import csv
+
+import numpy as np
+
+from tools.project_evaluator import batch_irr
+
+TRADING_DAYS = 252
+
+
+def analyze_portfolio(returns: list) -> str:
+    """Analyze simple portfolio returns."""
+    average_return = sum(returns) / len(returns) if returns else 0
+    if average_return > 0:
+        return f"📈 Your portfolio is performing well with an average return of {average_return:.2f}%."
+    else:
+        return f"📉 Your portfolio is underperforming with an average return of {average_return:.2f}%."
+
+
+# === Batch engine: T days x N holdings as NumPy matrices ===
+
+def load_price_history(path: str) -> dict:
+    """Read a long-format CSV (date, symbol, price[, units]) into (T, N) matrices.
+
+    Missing prices are NaN; units are forward-filled from the last row that
+    gave them (0 before the first one). Without a units column, units is None.
+    """
+    dates, symbols, prices, units = [], [], [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields = {name.lower().strip(): name for name in reader.fieldnames or []}
+        has_units = "units" in fields
+        for row in reader:
+            dates.append(row[fields["date"]][:10])
+            symbols.append(row[fields["symbol"]].strip().upper())
+            prices.append(float(row[fields["price"]]))
+            if has_units:
+                value = row[fields["units"]].strip()
+                units.append(float(value) if value else np.nan)
+
+    day_values, day_index = np.unique(np.array(dates, dtype="datetime64[D]"), return_inverse=True)
+    symbol_names, symbol_index = np.unique(np.array(symbols), return_inverse=True)
+    shape = (len(day_values), len(symbol_names))
+
+    price_matrix = np.full(shape, np.nan)
+    price_matrix[day_index, symbol_index] = prices
+    unit_matrix = None
+    if has_units:
+        unit_matrix = np.full(shape, np.nan)
+        unit_matrix[day_index, symbol_index] = units
+        unit_matrix = forward_fill(unit_matrix, initial=0.0)
+    return {"dates": day_values, "symbols": symbol_names.tolist(), "prices": price_matrix, "units": unit_matrix}
+
+
+def forward_fill(matrix: np.ndarray, initial: float = np.nan) -> np.ndarray:
+    """Replace NaNs in each column by the last valid value above them."""
+    valid = ~np.isnan(matrix)
+    last_valid_row = np.maximum.accumulate(np.where(valid, np.arange(len(matrix))[:, None], -1), axis=0)
+    filled = matrix[np.maximum(last_valid_row, 0), np.arange(matrix.shape[1])]
+    return np.where(last_valid_row >= 0, filled, initial)
+
+
+def daily_returns(prices: np.ndarray) -> np.ndarray:
+    """(T-1, N) simple returns; NaN wherever either price is missing."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return prices[1:] / prices[:-1] - 1
+
+
+def max_drawdown(returns: np.ndarray) -> np.ndarray:
+    """Largest peak-to-trough fall of each column's wealth curve (a negative fraction)."""
+    wealth = np.cumprod(1 + np.nan_to_num(returns), axis=0)
+    wealth = np.vstack([np.ones((1, returns.shape[1])), wealth])
+    return (wealth / np.maximum.accumulate(wealth, axis=0) - 1).min(axis=0)
+
+
+def covariance_matrix(returns: np.ndarray, periods_per_year: int = TRADING_DAYS) -> np.ndarray:
+    """Annualized (N, N) covariance using every pair of days on which both holdings have returns."""
+    valid = ~np.isnan(returns)
+    centered = np.where(valid, returns - np.nanmean(returns, axis=0), 0.0)
+    # Without gaps every pair shares all days, which saves a second (N, T) x (T, N) product
+    pair_counts = len(returns) if valid.all() else valid.T.astype(float) @ valid.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (centered.T @ centered) / (pair_counts - 1) * periods_per_year
+
+
+def time_weighted_returns(returns: np.ndarray, units: np.ndarray = None, periods_per_year: int = TRADING_DAYS):
+    """(total, annualized) time-weighted return per holding.
+
+    Each day's return is the price move of the units held at the start of the
+    day, so contributions and withdrawals do not distort the result. Days
+    when nothing was held are skipped.
+    """
+    held = ~np.isnan(returns)
+    if units is not None:
+        held &= units[:-1] > 0
+    log_growth = np.where(held, np.log1p(np.where(held, returns, 0.0)), 0.0)
+    days = held.sum(axis=0)
+    total = np.expm1(log_growth.sum(axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annualized = np.where(days > 0, np.expm1(log_growth.sum(axis=0) * periods_per_year / days), np.nan)
+    return np.where(days > 0, total, np.nan), annualized
+
+
+def money_weighted_returns(dates: np.ndarray, prices: np.ndarray, units: np.ndarray) -> np.ndarray:
+    """Annualized money-weighted return (IRR of the investor's flows) per holding.
+
+    Flows are inferred from changes in units at each day's price and bucketed
+    by month, so one batched IRR solve covers every holding.
+    """
+    filled_prices = forward_fill(prices)
+    values = np.nan_to_num(filled_prices * units)
+    flows = np.diff(units, axis=0, prepend=0.0) * np.nan_to_num(filled_prices)  # money put in
+
+    months = dates.astype("datetime64[M]")
+    month_index = (months - months[0]).astype(np.int64)
+    n_months = int(month_index[-1]) + 1
+    monthly_flows = np.zeros((n_months, prices.shape[1]))
+    month_starts = np.flatnonzero(np.diff(month_index, prepend=-1))  # dates are sorted
+    monthly_flows[month_index[month_starts]] = np.add.reduceat(flows, month_starts, axis=0)
+
+    # Money in at month 0 is the "investment"; later money in is negative cash flow, final value positive
+    cash_flows = -monthly_flows[1:].T
+    if n_months > 1:
+        cash_flows[:, -1] += values[-1]
+        monthly_rate, converged = batch_irr(monthly_flows[0], cash_flows)
+        return np.where(converged, (1 + monthly_rate) ** 12 - 1, np.nan)
+    return np.full(prices.shape[1], np.nan)
+
+
+def analyze_holdings(prices: np.ndarray, units: np.ndarray = None, dates: np.ndarray = None,
+                     benchmark: np.ndarray = None, risk_free_rate: float = 0.0,
+                     lag_tolerance: float = 0.0, periods_per_year: int = TRADING_DAYS) -> dict:
+    """Return and risk metrics for N holdings over T days, all computed column-wise.
+
+    `prices` is (T, N) with NaN for missing days; `units` (T, N) enables the
+    money-weighted return; `benchmark` is a (T,) price series. A holding is an
+    underperformer when its annualized return trails the benchmark's over the
+    same days by more than `lag_tolerance`.
+    """
+    prices = np.asarray(prices, dtype=float)
+    returns = daily_returns(prices)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(returns, axis=0)
+        std = np.nanstd(returns, axis=0, ddof=1)
+    total_return, annualized_return = time_weighted_returns(returns, units, periods_per_year)
+    volatility = std * np.sqrt(periods_per_year)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = (mean - risk_free_rate / periods_per_year) / std * np.sqrt(periods_per_year)
+
+    metrics = {
+        "total_return": total_return,
+        "annualized_return": annualized_return,
+        "volatility": volatility,
+        "sharpe": sharpe,
+        "max_drawdown": max_drawdown(returns),
+        "covariance": covariance_matrix(returns, periods_per_year),
+    }
+    if units is not None and dates is not None:
+        metrics["money_weighted_return"] = money_weighted_returns(dates, prices, units)
+
+    if benchmark is not None:
+        benchmark_returns = daily_returns(np.asarray(benchmark, dtype=float).reshape(-1, 1))[:, 0]
+        # Compare each holding with the benchmark over the days it has returns
+        overlap = ~np.isnan(returns) & ~np.isnan(benchmark_returns)[:, None]
+        days = overlap.sum(axis=0)
+        holding_log = np.where(overlap, np.log1p(np.where(overlap, returns, 0.0)), 0.0).sum(axis=0)
+        benchmark_log = (overlap * np.log1p(np.nan_to_num(benchmark_returns))[:, None]).sum(axis=0)
+        active = np.where(overlap, np.nan_to_num(returns) - np.nan_to_num(benchmark_returns)[:, None], np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            excess = np.expm1(holding_log * periods_per_year / days) - np.expm1(benchmark_log * periods_per_year / days)
+            tracking_error = np.nanstd(active, axis=0, ddof=1) * np.sqrt(periods_per_year)
+            information_ratio = np.nanmean(active, axis=0) * periods_per_year / tracking_error
+        metrics.update({
+            "excess_return": excess,
+            "tracking_error": tracking_error,
+            "information_ratio": information_ratio,
+            "underperforming": excess < -lag_tolerance,
+        })
+    return metrics
+
+
+def portfolio_report(history: dict, benchmark_symbol: str = None, risk_free_rate: float = 0.0,
+                     lag_tolerance: float = 0.0) -> dict:
+    """Analyze a loaded price history, using one of its symbols as the benchmark."""
+    symbols, prices, units = history["symbols"], history["prices"], history["units"]
+    benchmark = None
+    if benchmark_symbol:
+        if benchmark_symbol.upper() not in symbols:
+            raise ValueError(f"Benchmark {benchmark_symbol} is not in the price history")
+        column = symbols.index(benchmark_symbol.upper())
+        benchmark = prices[:, column]
+        keep = np.arange(len(symbols)) != column
+        symbols = [symbol for i, symbol in enumerate(symbols) if i != column]
+        prices = prices[:, keep]
+        units = None if units is None else units[:, keep]
+
+    metrics = analyze_holdings(prices, units, history["dates"], benchmark, risk_free_rate, lag_tolerance)
+    return {"symbols": symbols, **metrics}
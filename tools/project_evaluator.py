@@ -1,28 +1,242 @@
-def build_cash_flows(project):
-    """Expand structured project info into a cash flow list."""
-    periods = project["periods"]
-    base_income = project.get("base_income", 0)
-    growth_rate = project.get("growth_rate", 0)
-    expenses = project.get("expenses", 0)
-    unexpected_costs = project.get("unexpected_costs", {})
-
-    cash_flows = []
-
-    for period in range(1, periods + 1):
-        # Grow income if growth_rate > 0
-        income = base_income * ((1 + growth_rate) ** (period - 1))
-        # Calculate basic cash flow
-        net_cash_flow = income - expenses
-        # Apply unexpected cost if exists
-        if str(period) in unexpected_costs:
-            net_cash_flow -= unexpected_costs[str(period)]
-        cash_flows.append(net_cash_flow)
-
-    return cash_flows
-
-def calculate_project_npv(initial_investment, cash_flows, discount_rate):
-    """Calculate the NPV of a project given initial investment and cash flows."""
-    npv = -initial_investment
-    for t, cash_flow in enumerate(cash_flows, start=1):
-        npv += cash_flow / ((1 + discount_rate) ** t)
-    return npv
\ No newline at end of file
+import numpy as np
+
+
+def build_cash_flows(project):
+    """Expand structured project info into a cash flow list."""
+    periods = project["periods"]
+    base_income = project.get("base_income", 0)
+    growth_rate = project.get("growth_rate", 0)
+    expenses = project.get("expenses", 0)
+    unexpected_costs = project.get("unexpected_costs", {})
+
+    cash_flows = []
+
+    for period in range(1, periods + 1):
+        # Grow income if growth_rate > 0
+        income = base_income * ((1 + growth_rate) ** (period - 1))
+        # Calculate basic cash flow
+        net_cash_flow = income - expenses
+        # Apply unexpected cost if exists
+        if str(period) in unexpected_costs:
+            net_cash_flow -= unexpected_costs[str(period)]
+        cash_flows.append(net_cash_flow)
+
+    return cash_flows
+
+def calculate_project_npv(initial_investment, cash_flows, discount_rate):
+    """Calculate the NPV of a project given initial investment and cash flows."""
+    npv = -initial_investment
+    discount_factor = 1.0
+    for cash_flow in cash_flows:
+        discount_factor /= 1 + discount_rate
+        npv += cash_flow * discount_factor
+    return npv
+
+
+# === Batch engine: N projects x T periods as NumPy matrices ===
+
+def cash_flow_matrix(base_income, growth_rate, expenses, periods, horizon=None, unexpected_costs=None):
+    """Build an (N, T) cash flow matrix from per-project parameter arrays.
+
+    Periods after a project's own `periods` are zero, so projects of different
+    lengths can share one matrix. `unexpected_costs` is an optional (N, T)
+    array subtracted from the flows.
+    """
+    base_income = np.asarray(base_income, dtype=float).reshape(-1, 1)
+    growth_rate = np.asarray(growth_rate, dtype=float).reshape(-1, 1)
+    expenses = np.asarray(expenses, dtype=float).reshape(-1, 1)
+    periods = np.asarray(periods, dtype=int).reshape(-1, 1)
+    horizon = int(periods.max()) if horizon is None else horizon
+
+    t = np.arange(1, horizon + 1)
+    flows = base_income * (1 + growth_rate) ** (t - 1) - expenses
+    if unexpected_costs is not None:
+        flows = flows - unexpected_costs
+    return np.where(t <= periods, flows, 0.0)
+
+
+def build_cash_flow_matrix(projects: list):
+    """Turn extracted project dicts into (initial_investments, periods, cash_flows) arrays."""
+    periods = np.array([int(project["periods"]) for project in projects])
+    horizon = int(periods.max()) if len(projects) else 0
+
+    unexpected = np.zeros((len(projects), horizon))
+    for row, project in enumerate(projects):
+        for period, amount in (project.get("unexpected_costs") or {}).items():
+            if 1 <= int(period) <= horizon:
+                unexpected[row, int(period) - 1] += float(amount)
+
+    cash_flows = cash_flow_matrix(
+        [project.get("base_income", 0) for project in projects],
+        [project.get("growth_rate", 0) or 0 for project in projects],
+        [project.get("expenses", 0) or 0 for project in projects],
+        periods,
+        horizon,
+        unexpected,
+    )
+    initial_investments = np.array([float(project["initial_investment"]) for project in projects])
+    return initial_investments, periods, cash_flows
+
+
+def discount_factors(rates, horizon: int):
+    """(R, T) matrix of 1 / (1 + r) ** t, computed once per rate and period."""
+    rates = np.atleast_1d(np.asarray(rates, dtype=float)).reshape(-1, 1)
+    return (1 + rates) ** -np.arange(1, horizon + 1)
+
+
+def batch_npv(initial_investments, cash_flows, rates):
+    """NPV of every project at every rate, shape (N, R)."""
+    cash_flows = np.atleast_2d(cash_flows)
+    factors = discount_factors(rates, cash_flows.shape[1])
+    return cash_flows @ factors.T - np.asarray(initial_investments, dtype=float).reshape(-1, 1)
+
+
+def batch_irr(initial_investments, cash_flows, low=-0.99, high=10.0, tol=1e-10, max_iter=100):
+    """IRR of every project via safeguarded Newton steps inside a bisection bracket.
+
+    Returns (irr, converged). Projects whose NPV does not change sign on
+    [low, high] have no IRR there: irr is NaN and converged is False.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    initial = np.asarray(initial_investments, dtype=float)
+    t = np.arange(1, cash_flows.shape[1] + 1)
+
+    def npv_and_slope(rate):
+        factors = (1 + rate[:, None]) ** -t
+        npv = (cash_flows * factors).sum(axis=1) - initial
+        slope = -(cash_flows * t * factors / (1 + rate[:, None])).sum(axis=1)
+        return npv, slope
+
+    n = len(initial)
+    lo = np.full(n, low)
+    hi = np.full(n, high)
+    converged = np.zeros(n, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        f_lo, _ = npv_and_slope(lo)
+        f_hi, _ = npv_and_slope(hi)
+        # Over long horizons the discount factors near `low` overflow: an NPV of +/-inf still has a sign,
+        # but inf - inf is NaN and says nothing about a sign change, so that project is not bracketed
+        bracketed = ~np.isnan(f_lo) & ~np.isnan(f_hi) & (np.sign(f_lo) != np.sign(f_hi))
+        rate = np.clip(np.where(bracketed, 0.1, np.nan), lo, hi)
+        step = hi - lo
+
+        for _ in range(max_iter):
+            active = bracketed & ~converged
+            if not active.any():
+                break
+
+            f, slope = npv_and_slope(np.where(active, rate, 0.0))
+            converged |= active & (np.abs(f) < tol * np.maximum(1.0, np.abs(initial)))
+
+            # Shrink the bracket around the root
+            same_side_as_lo = np.sign(f) == np.sign(f_lo)
+            lo = np.where(active & same_side_as_lo, rate, lo)
+            f_lo = np.where(active & same_side_as_lo, f, f_lo)
+            hi = np.where(active & ~same_side_as_lo, rate, hi)
+
+            # Newton step, falling back to bisection when it leaves the bracket or would not at least halve
+            # the previous step (from the flat side of a long-horizon NPV curve Newton only creeps along)
+            newton = rate - f / slope
+            use_newton = np.isfinite(newton) & (newton > lo) & (newton < hi) & \
+                (np.abs(newton - rate) < np.abs(step) / 2)
+            next_rate = np.where(use_newton, newton, (lo + hi) / 2)
+            converged |= active & (np.abs(next_rate - rate) < tol)
+            step = np.where(active, next_rate - rate, step)
+            rate = np.where(active & ~converged, next_rate, rate)
+
+    return np.where(bracketed, rate, np.nan), converged
+
+
+def batch_mirr(initial_investments, cash_flows, periods, finance_rate, reinvest_rate):
+    """Modified IRR: positive flows compounded at `reinvest_rate`, outflows discounted at `finance_rate`."""
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    periods = np.asarray(periods, dtype=float)
+    t = np.arange(1, cash_flows.shape[1] + 1)
+
+    inflows = np.where(cash_flows > 0, cash_flows, 0.0)
+    outflows = np.where(cash_flows < 0, -cash_flows, 0.0)
+
+    future_inflows = (inflows * (1 + reinvest_rate) ** (periods[:, None] - t)).sum(axis=1)
+    present_outflows = np.asarray(initial_investments, dtype=float) + (outflows * (1 + finance_rate) ** -t).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (future_inflows / present_outflows) ** (1 / periods) - 1
+
+
+def batch_payback_period(initial_investments, cash_flows, rate=None):
+    """Periods until cumulative (optionally discounted) flows repay the investment; NaN if never."""
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    if rate is not None:
+        cash_flows = cash_flows * discount_factors(rate, cash_flows.shape[1])
+    initial = np.asarray(initial_investments, dtype=float)
+
+    cumulative = np.cumsum(cash_flows, axis=1)
+    repaid = cumulative >= initial[:, None]
+    ever_repaid = repaid.any(axis=1)
+    first = np.argmax(repaid, axis=1)
+
+    rows = np.arange(len(initial))
+    before = np.where(first > 0, cumulative[rows, first - 1], 0.0)
+    flow = cash_flows[rows, first]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(flow != 0, (initial - before) / flow, 0.0)
+
+    return np.where(ever_repaid, first + fraction, np.nan)
+
+
+def batch_profitability_index(initial_investments, cash_flows, rates):
+    """PV of future cash flows over the initial investment, shape (N, R)."""
+    initial = np.asarray(initial_investments, dtype=float).reshape(-1, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (batch_npv(initial_investments, cash_flows, rates) + initial) / initial
+
+
+def evaluate_projects_batch(projects: list, discount_rates, finance_rate=None, reinvest_rate=None) -> dict:
+    """Every metric for every extracted project across a vector of discount rates.
+
+    NPV and profitability index are (N, R); IRR, MIRR and payback are (N,).
+    MIRR uses the first discount rate unless finance/reinvest rates are given.
+    """
+    discount_rates = np.atleast_1d(np.asarray(discount_rates, dtype=float))
+    initial, periods, cash_flows = build_cash_flow_matrix(projects)
+    irr, irr_converged = batch_irr(initial, cash_flows)
+
+    finance_rate = discount_rates[0] if finance_rate is None else finance_rate
+    reinvest_rate = discount_rates[0] if reinvest_rate is None else reinvest_rate
+
+    return {
+        "names": [project.get("name", f"Project {i + 1}") for i, project in enumerate(projects)],
+        "discount_rates": discount_rates,
+        "cash_flows": cash_flows,
+        "periods": periods,
+        "npv": batch_npv(initial, cash_flows, discount_rates),
+        "irr": irr,
+        "irr_converged": irr_converged,
+        "mirr": batch_mirr(initial, cash_flows, periods, finance_rate, reinvest_rate),
+        "payback_period": batch_payback_period(initial, cash_flows),
+        "profitability_index": batch_profitability_index(initial, cash_flows, discount_rates),
+    }
+
+
+def evaluate_project_groups(groups: list) -> list:
+    """evaluate_projects_batch(projects, [rate]) for many (projects, rate) requests at once.
+
+    Requests sharing a discount rate are evaluated in one vectorized call;
+    each gets back its own rows, exactly as if it had been evaluated alone.
+    """
+    by_rate = {}
+    for index, (projects, rate) in enumerate(groups):
+        by_rate.setdefault(float(rate), []).append(index)
+
+    split = [None] * len(groups)
+    for rate, indices in by_rate.items():
+        results = evaluate_projects_batch([project for i in indices for project in groups[i][0]], [rate])
+        start = 0
+        for i in indices:
+            projects = groups[i][0]
+            rows = slice(start, start + len(projects))
+            start = rows.stop
+            split[i] = {key: value if key == "discount_rates" else value[rows] for key, value in results.items()}
+            split[i]["names"] = [project.get("name", f"Project {n + 1}") for n, project in enumerate(projects)]
+    return split
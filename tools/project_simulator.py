@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+import numpy as np
+
+from tools.project_evaluator import cash_flow_matrix, batch_npv
+
+# How uncertain each input is, relative to the project's own figures
+DEFAULT_RISK_MODEL = {
+    "growth_volatility": 0.02,        # std dev of the growth rate, sampled once per path
+    "expense_volatility": 0.10,       # std dev of the per-period expense shock, as a fraction of expenses
+    "cost_event_probability": 0.05,   # chance of an unexpected-cost event in each period
+    "cost_event_size": 0.25,          # mean event size, as a fraction of base income (exponential)
+}
+
+HISTOGRAM_BINS = 4096
+
+# Below this many paths, shipping chunks to worker processes costs more than it saves
+PARALLEL_MIN_PATHS = 1_000_000
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    """The shared worker pool, started on first use with at most `workers` (and CPU count) processes.
+
+    Workers are started with forkserver (spawn where that is unavailable)
+    rather than forked from a process that may be running threads.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _POOL = ProcessPoolExecutor(max_workers=min(workers, os.cpu_count() or 1), mp_context=context)
+        return _POOL
+
+
+def shutdown_pool():
+    """Stop the shared worker pool, if one was started; the next parallel run starts a new one."""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def _sample_npvs(project: dict, discount_rate: float, risk_model: dict, n_paths: int, seed) -> np.ndarray:
+    """NPVs of `n_paths` sampled scenarios of one project."""
+    rng = np.random.default_rng(seed)
+    periods = int(project["periods"])
+    base_income = float(project.get("base_income", 0) or 0)
+    expenses = float(project.get("expenses", 0) or 0)
+
+    growth = rng.normal(float(project.get("growth_rate", 0) or 0), risk_model["growth_volatility"], n_paths)
+    expense_shocks = expenses * (1 + rng.normal(0.0, risk_model["expense_volatility"], (n_paths, periods)))
+    events = rng.random((n_paths, periods)) < risk_model["cost_event_probability"]
+    event_costs = events * rng.exponential(risk_model["cost_event_size"] * abs(base_income) or 1.0, (n_paths, periods))
+
+    known_costs = np.zeros(periods)
+    for period, amount in (project.get("unexpected_costs") or {}).items():
+        if 1 <= int(period) <= periods:
+            known_costs[int(period) - 1] += float(amount)
+
+    flows = cash_flow_matrix(
+        np.full(n_paths, base_income), growth, 0.0, np.full(n_paths, periods), periods,
+        unexpected_costs=expense_shocks + event_costs + known_costs,
+    )
+    return batch_npv(np.full(n_paths, float(project["initial_investment"])), flows, discount_rate)[:, 0]
+
+
+def _summarize_chunk(args) -> dict:
+    """Run one chunk of paths and reduce it to mergeable statistics."""
+    project, discount_rate, risk_model, n_paths, seed, edges = args
+    npvs = _sample_npvs(project, discount_rate, risk_model, n_paths, seed)
+    return _reduce(npvs, edges)
+
+
+def _reduce(npvs: np.ndarray, edges: np.ndarray) -> dict:
+    return {
+        "count": len(npvs),
+        "sum": float(npvs.sum()),
+        "sum_sq": float((npvs ** 2).sum()),
+        "negative": int((npvs < 0).sum()),
+        "min": float(npvs.min()),
+        "max": float(npvs.max()),
+        "histogram": np.histogram(np.clip(npvs, edges[0], edges[-1]), bins=edges)[0],
+    }
+
+
+def _merge(stats: list) -> dict:
+    merged = dict(stats[0])
+    for part in stats[1:]:
+        merged["count"] += part["count"]
+        merged["sum"] += part["sum"]
+        merged["sum_sq"] += part["sum_sq"]
+        merged["negative"] += part["negative"]
+        merged["min"] = min(merged["min"], part["min"])
+        merged["max"] = max(merged["max"], part["max"])
+        merged["histogram"] = merged["histogram"] + part["histogram"]
+    return merged
+
+
+def _percentile(histogram: np.ndarray, edges: np.ndarray, q: float) -> float:
+    """Percentile from histogram counts, interpolating linearly inside the bin."""
+    cumulative = np.cumsum(histogram)
+    target = q * cumulative[-1]
+    index = int(np.searchsorted(cumulative, target))
+    index = min(index, len(histogram) - 1)
+    before = cumulative[index - 1] if index else 0
+    fraction = (target - before) / histogram[index] if histogram[index] else 0.0
+    return float(edges[index] + fraction * (edges[index + 1] - edges[index]))
+
+
+def simulate_project_npv(project: dict, discount_rate: float, n_paths: int = 100_000, seed: int = None,
+                         chunk_size: int = 20_000, workers: int = None, risk_model: dict = None) -> dict:
+    """Monte Carlo NPV distribution for one project.
+
+    Paths are generated in chunks of `chunk_size`, so memory stays bounded
+    however many paths are requested, and each chunk is reduced to a
+    fixed-size histogram plus running sums. Chunks run on the shared process
+    pool when `workers` > 1 and there are at least PARALLEL_MIN_PATHS paths.
+    Every chunk gets its own child of `seed`, so results are reproducible
+    regardless of the number of workers.
+    """
+    risk_model = {**DEFAULT_RISK_MODEL, **(risk_model or {})}
+    chunk_seeds = np.random.SeedSequence(seed).spawn(max(1, -(-n_paths // chunk_size)))
+    chunk_sizes = [min(chunk_size, n_paths - i * chunk_size) for i in range(len(chunk_seeds))]
+
+    # The first chunk fixes the histogram range shared by all chunks
+    pilot = _sample_npvs(project, discount_rate, risk_model, chunk_sizes[0], chunk_seeds[0])
+    spread = max(float(pilot.max() - pilot.min()), 1e-9)
+    edges = np.linspace(pilot.min() - spread, pilot.max() + spread, HISTOGRAM_BINS + 1)
+    stats = [_reduce(pilot, edges)]
+
+    jobs = [
+        (project, discount_rate, risk_model, size, chunk_seed, edges)
+        for size, chunk_seed in zip(chunk_sizes[1:], chunk_seeds[1:])
+    ]
+    if jobs and workers and workers > 1 and n_paths >= PARALLEL_MIN_PATHS:
+        stats.extend(_pool(workers).map(_summarize_chunk, jobs))
+    else:
+        stats.extend(_summarize_chunk(job) for job in jobs)
+
+    merged = _merge(stats)
+    count = merged["count"]
+    mean = merged["sum"] / count
+    variance = max(merged["sum_sq"] / count - mean ** 2, 0.0)
+
+    return {
+        "n_paths": count,
+        "mean": mean,
+        "std": variance ** 0.5,
+        "p5": _percentile(merged["histogram"], edges, 0.05),
+        "p50": _percentile(merged["histogram"], edges, 0.50),
+        "p95": _percentile(merged["histogram"], edges, 0.95),
+        "prob_negative": merged["negative"] / count,
+        "min": merged["min"],
+        "max": merged["max"],
+    }
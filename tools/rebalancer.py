@@ -0,0 +1,147 @@
+import numpy as np
+
+DEFAULT_BAND = 0.05
+DEFAULT_COST_RATE = 0.001
+DEFAULT_RISK_AVERSION = 10.0
+
+
+def project_to_simplex(v: np.ndarray, lower: np.ndarray) -> np.ndarray:
+    """Row-wise Euclidean projection onto {w >= lower, sum(w) = 1}."""
+    budget = 1.0 - lower.sum(axis=1, keepdims=True)
+    shifted = v - lower
+    ordered = -np.sort(-shifted, axis=1)
+    cumulative = np.cumsum(ordered, axis=1) - budget
+    k = np.arange(1, v.shape[1] + 1)
+    # Largest k whose threshold keeps the k-th largest entry positive
+    rho = (ordered - cumulative / k > 0).sum(axis=1, keepdims=True)
+    theta = np.take_along_axis(cumulative, rho - 1, axis=1) / rho
+    return lower + np.maximum(shifted - theta, 0.0)
+
+
+def _account_arrays(values, targets, locked):
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    targets = np.broadcast_to(np.atleast_2d(np.asarray(targets, dtype=float)), values.shape)
+    targets = targets / targets.sum(axis=1, keepdims=True)
+    locked = np.zeros_like(values) if locked is None else np.broadcast_to(np.atleast_2d(np.asarray(locked, dtype=float)), values.shape)
+    return values, targets, np.minimum(locked, values)
+
+
+def band_weights(weights: np.ndarray, targets: np.ndarray, lower: np.ndarray, band: float = DEFAULT_BAND) -> np.ndarray:
+    """Threshold-band rebalancing: accounts with a holding (or cash) outside target +/- band go back to target."""
+    cash_weight = 1.0 - weights.sum(axis=1)
+    drifted = (np.abs(weights - targets) > band).any(axis=1) | (cash_weight > band)
+    return np.where(drifted[:, None], project_to_simplex(targets, lower), weights)
+
+
+def mean_variance_weights(weights: np.ndarray, targets: np.ndarray, lower: np.ndarray, covariance: np.ndarray = None,
+                          expected_returns: np.ndarray = None, risk_aversion: float = DEFAULT_RISK_AVERSION,
+                          cost_rate: float = DEFAULT_COST_RATE, warm_start: np.ndarray = None,
+                          tol: float = 1e-9, max_iter: int = 500):
+    """Solve min ½(w - t)'Q(w - t) - μ'w + c·|w - w0|₁ over {w >= lower, Σw = 1} for every account.
+
+    Q is `risk_aversion` times the covariance plus a small ridge, so without
+    expected returns the solution tracks the target as closely as the
+    trading costs justify. Proximal gradient steps (soft-threshold around the
+    current weights for the cost term, then projection onto the feasible
+    simplex) run on all accounts at once. Starting from `warm_start`, e.g.
+    yesterday's solution, a re-solve after small price moves needs only a
+    few iterations. Returns (weights, iterations).
+    """
+    n = weights.shape[1]
+    covariance = np.eye(n) * 0.04 if covariance is None else np.asarray(covariance, dtype=float)
+    q = risk_aversion * covariance + 1e-6 * np.eye(n)
+    mu = np.zeros(n) if expected_returns is None else np.asarray(expected_returns, dtype=float)
+    step = 1.0 / np.linalg.eigvalsh(q).max()
+
+    w = weights.copy() if warm_start is None else project_to_simplex(np.atleast_2d(warm_start).astype(float), lower)
+    for iteration in range(1, max_iter + 1):
+        gradient = (w - targets) @ q - mu
+        v = w - step * gradient
+        # Prox of the trading cost: shrink moves away from the current weights
+        v = weights + np.sign(v - weights) * np.maximum(np.abs(v - weights) - step * cost_rate, 0.0)
+        updated = project_to_simplex(v, lower)
+        if np.abs(updated - w).max() < tol:
+            return updated, iteration
+        w = updated
+    return w, max_iter
+
+
+def rebalance_accounts(values, targets, cash=0.0, method: str = "band", band: float = DEFAULT_BAND,
+                       cost_rate: float = DEFAULT_COST_RATE, min_trade: float = 0.0, locked=None,
+                       covariance=None, expected_returns=None, risk_aversion: float = DEFAULT_RISK_AVERSION,
+                       warm_start=None) -> dict:
+    """Trade lists for A accounts x N holdings at once.
+
+    `values` and `targets` are (A, N) (targets may be one shared (N,) row);
+    `cash` is each account's uninvested cash, which is spent buying toward
+    target. `locked` is the value per holding that may not be sold (no-sell
+    lots). Trades smaller than `min_trade` are dropped and their amount stays
+    in cash. Proportional `cost_rate` is charged on every trade.
+    """
+    values, targets, locked = _account_arrays(values, targets, locked)
+    cash = np.broadcast_to(np.asarray(cash, dtype=float), (values.shape[0],)).reshape(-1, 1)
+    totals = values.sum(axis=1, keepdims=True) + cash
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.where(totals > 0, values / totals, 0.0)
+        lower = np.where(totals > 0, locked / totals, 0.0)
+
+    iterations = 0
+    if method == "band":
+        proposed = band_weights(weights, targets, lower, band)
+    elif method == "mean_variance":
+        proposed, iterations = mean_variance_weights(
+            weights, targets, lower, covariance, expected_returns, risk_aversion, cost_rate, warm_start
+        )
+    else:
+        raise ValueError(f"Unknown rebalancing method: {method}")
+
+    trades = (proposed - weights) * totals
+    trades[np.abs(trades) < max(min_trade, 0.005)] = 0.0
+    # Scale buys down so that buys plus trading costs never exceed sale proceeds plus cash
+    bought = np.where(trades > 0, trades, 0.0).sum(axis=1)
+    sold = np.where(trades < 0, -trades, 0.0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        affordable = (cash[:, 0] + sold * (1 - cost_rate)) / (bought * (1 + cost_rate))
+    scale = np.where(bought > 0, np.clip(affordable, 0.0, 1.0), 1.0)
+    trades = np.where(trades > 0, trades * scale[:, None], trades)
+    costs = np.abs(trades).sum(axis=1) * cost_rate
+    cash_after = cash[:, 0] - trades.sum(axis=1) - costs
+    values_after = values + trades
+    totals_after = values_after.sum(axis=1, keepdims=True) + cash_after[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights_after = np.where(totals_after > 0, values_after / totals_after, 0.0)
+    return {
+        "trades": trades,
+        "weights": proposed,
+        "weights_after": weights_after,
+        "cash_after": cash_after,
+        "costs": costs,
+        "turnover": np.abs(trades).sum(axis=1) / np.where(totals[:, 0] > 0, totals[:, 0], 1.0),
+        "iterations": iterations,
+    }
+
+
+def rebalance_portfolio(holdings: dict, targets: dict, cash: float = 0.0, **options) -> dict:
+    """Trade list for one account given {symbol: value} holdings and {symbol: weight} targets."""
+    symbols = sorted(set(holdings) | set(targets))
+    locked = options.pop("locked", None)
+    warm_start = options.pop("warm_start", None)
+    result = rebalance_accounts(
+        [float(holdings.get(symbol, 0.0)) for symbol in symbols],
+        [float(targets.get(symbol, 0.0)) for symbol in symbols],
+        cash,
+        locked=None if locked is None else [float(locked.get(symbol, 0.0)) for symbol in symbols],
+        warm_start=None if warm_start is None else [float(warm_start.get(symbol, 0.0)) for symbol in symbols],
+        **options,
+    )
+    return {
+        "symbols": symbols,
+        "trades": {symbol: float(trade) for symbol, trade in zip(symbols, result["trades"][0]) if trade},
+        "weights": dict(zip(symbols, result["weights"][0].tolist())),
+        "weights_after": dict(zip(symbols, result["weights_after"][0].tolist())),
+        "cash_after": float(result["cash_after"][0]),
+        "cost": float(result["costs"][0]),
+        "turnover": float(result["turnover"][0]),
+        "iterations": result["iterations"],
+    }
@@ -0,0 +1,214 @@
+import csv
+import json
+import os
+import re
+from datetime import date, datetime
+from itertools import islice
+
+from tools.expense_classifier import ExpenseClassifier
+
+# Column names bank exports commonly use for each transaction field
+CSV_COLUMNS = {
+    "date": ["date", "posted date", "transaction date", "booking date", "posting date"],
+    "description": ["description", "name", "merchant", "payee", "details", "memo", "narrative"],
+    "amount": ["amount", "value", "transaction amount"],
+    # Exports without a signed amount column split it into money out and money in
+    "debit": ["debit", "debit amount", "withdrawal", "withdrawals", "money out", "paid out"],
+    "credit": ["credit", "credit amount", "deposit", "deposits", "money in", "paid in"],
+    # ...or mark the direction of an unsigned amount in a column of its own
+    "type": ["type", "transaction type", "debit/credit", "dr/cr"],
+}
+
+# Tried in order when no date format is given; day-first exports need an explicit `date_format`
+DATE_FORMATS = ["%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%d.%m.%Y", "%d %b %Y", "%b %d, %Y", "%d-%b-%Y", "%Y%m%d"]
+
+_DEBIT_TYPES = {"debit", "dr", "withdrawal", "payment", "purchase"}
+
+_OFX_FIELD = re.compile(r"<(DTPOSTED|TRNAMT|NAME|MEMO|FITID|TRNTYPE)>([^<\r\n]*)", re.IGNORECASE)
+
+
+class _BadRow:
+    """A transaction a reader could not parse, at `line` of the file."""
+
+    def __init__(self, line: int, reason: str):
+        self.line = line
+        self.reason = reason
+
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("csv", "ofx", "qfx", "jsonl"):
+        return "ofx" if extension == "qfx" else extension
+    raise ValueError(f"Unsupported transaction file type: {path}")
+
+
+def _parse_amount(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace("$", "").replace(",", "")
+    if text.startswith("(") and text.endswith(")"):
+        text = "-" + text[1:-1]
+    return float(text) if text else 0.0
+
+
+def _parse_date(value, date_format: str = None) -> str:
+    """An ISO date (YYYY-MM-DD) from a bank export's date; "" when there is none."""
+    text = str(value or "").strip()
+    if not text:
+        return ""
+    if date_format:
+        return datetime.strptime(text, date_format).date().isoformat()
+    try:
+        return date.fromisoformat(text[:10]).isoformat()
+    except ValueError:
+        pass
+    for candidate in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, candidate).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date '{text}'")
+
+
+def _csv_amount(row: dict, columns: dict) -> float:
+    """A signed amount (outflows negative) from an amount column or a debit/credit pair."""
+    if columns["amount"]:
+        amount = _parse_amount(row.get(columns["amount"]) or 0)
+        if columns["type"] and str(row.get(columns["type"]) or "").strip().lower() in _DEBIT_TYPES:
+            return -abs(amount)
+        return amount
+    debit = _parse_amount(row.get(columns["debit"]) or 0) if columns["debit"] else 0.0
+    credit = _parse_amount(row.get(columns["credit"]) or 0) if columns["credit"] else 0.0
+    return abs(credit) - abs(debit)
+
+
+def _read_csv(path: str, date_format: str = None):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        header = {name.strip().lower(): name for name in reader.fieldnames or []}
+        columns = {
+            field: next((header[name] for name in candidates if name in header), None)
+            for field, candidates in CSV_COLUMNS.items()
+        }
+        if columns["description"] is None:
+            raise ValueError(f"No description column found in {path}")
+
+        for row in reader:
+            try:
+                yield {
+                    "date": _parse_date(row.get(columns["date"]), date_format) if columns["date"] else "",
+                    "description": row[columns["description"]] or "",
+                    "amount": _csv_amount(row, columns),
+                }
+            except ValueError as e:
+                yield _BadRow(reader.line_num, str(e))
+
+
+def _read_jsonl(path: str, date_format: str = None):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                    yield {
+                        "date": _parse_date(record.get("date"), date_format),
+                        "description": record.get("description") or record.get("merchant") or "",
+                        "amount": _parse_amount(record.get("amount", 0)),
+                    }
+                except (ValueError, AttributeError) as e:
+                    yield _BadRow(line_number, str(e) or "not a JSON object")
+
+
+def _read_ofx(path: str, date_format: str = None):
+    """Stream <STMTTRN> blocks of an OFX/QFX file (SGML or XML flavour) one line at a time."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        current = None
+        for line_number, line in enumerate(f, 1):
+            upper = line.upper()
+            if "<STMTTRN>" in upper:
+                current = {}
+            if current is not None:
+                for tag, value in _OFX_FIELD.findall(line):
+                    current[tag.upper()] = value.strip()
+            if "</STMTTRN>" in upper and current is not None:
+                try:
+                    yield {
+                        # OFX dates are always YYYYMMDD[HHMMSS...]
+                        "date": _parse_date(current.get("DTPOSTED", "")[:8], "%Y%m%d"),
+                        "description": current.get("NAME") or current.get("MEMO", ""),
+                        "amount": _parse_amount(current.get("TRNAMT", 0)),
+                    }
+                except ValueError as e:
+                    yield _BadRow(line_number, str(e))
+                current = None
+
+
+READERS = {"csv": _read_csv, "jsonl": _read_jsonl, "ofx": _read_ofx}
+
+
+def read_transactions(path: str, file_format: str = None, date_format: str = None, skipped: list = None):
+    """Yield {date, description, amount} dicts from a bank export without loading it into memory.
+
+    Dates come out as YYYY-MM-DD and outflows as negative amounts. Rows that
+    cannot be parsed are appended to `skipped` as (line, reason) and left
+    out; without a `skipped` list the first one raises ValueError.
+    """
+    for record in READERS[file_format or detect_format(path)](path, date_format):
+        if isinstance(record, _BadRow):
+            if skipped is None:
+                raise ValueError(f"line {record.line}: {record.reason}")
+            skipped.append((record.line, record.reason))
+        else:
+            yield record
+
+
+def batched(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def classify_transactions_file(input_path: str, output_path: str, classifier: ExpenseClassifier = None,
+                               batch_size: int = 10_000, file_format: str = None, on_transaction=None,
+                               date_format: str = None) -> dict:
+    """Classify every transaction in a bank export, writing results as they are produced.
+
+    Output is JSONL (or CSV when `output_path` ends in .csv). Only one batch
+    is held in memory at a time. `on_transaction(record, category)` is called
+    for every classified transaction. Returns transaction counts and spend
+    totals per category, and the (line, reason) of every row that was skipped.
+    """
+    classifier = classifier or ExpenseClassifier()
+    counts = {}
+    totals = {}
+    skipped = []
+
+    with open(output_path, "w", newline="", encoding="utf-8") as out:
+        as_csv = output_path.lower().endswith(".csv")
+        writer = csv.writer(out) if as_csv else None
+        if writer:
+            writer.writerow(["date", "description", "amount", "category"])
+
+        for batch in batched(read_transactions(input_path, file_format, date_format, skipped), batch_size):
+            categories = classifier.classify_batch(record["description"] for record in batch)
+            if writer:
+                writer.writerows(
+                    (record["date"], record["description"], record["amount"], category)
+                    for record, category in zip(batch, categories)
+                )
+            else:
+                out.writelines(
+                    json.dumps({**record, "category": category}) + "\n"
+                    for record, category in zip(batch, categories)
+                )
+
+            for record, category in zip(batch, categories):
+                counts[category] = counts.get(category, 0) + 1
+                totals[category] = totals.get(category, 0.0) + record["amount"]
+                if on_transaction is not None:
+                    on_transaction(record, category)
+
+    return {"counts": counts, "totals": totals, "skipped": skipped}
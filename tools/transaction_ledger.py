@@ -0,0 +1,268 @@
+from contextlib import contextmanager
+import json
+import os
+import threading
+import numpy as np
+
+from tools.merchant_index import normalize_merchant
+
+try:
+    import fcntl
+except ImportError:  # Windows: only writers within this process are serialized
+    fcntl = None
+
+# One append-only binary file per column, memory-mapped on read
+COLUMNS = {
+    "date": np.dtype("datetime64[D]"),
+    "amount": np.dtype("float64"),
+    "category": np.dtype("int32"),
+    "merchant": np.dtype("int32"),
+}
+
+
+_PROCESS_LOCK = threading.Lock()
+
+
+@contextmanager
+def _ledger_lock(path: str, shared: bool = False):
+    """Hold the lock file of a ledger directory, against writers in this or any other process."""
+    if fcntl is None:
+        with _PROCESS_LOCK:
+            yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _to_day(value) -> np.datetime64:
+    if value is None or value == "":
+        return np.datetime64("today", "D")
+    return np.datetime64(str(value)[:10], "D")
+
+
+def _merge_names(names: list, local_names: list):
+    """Add the `local_names` missing from `names` (in place); returns local id -> id in `names`."""
+    ids = {name: i for i, name in enumerate(names)}
+    remap = np.empty(len(local_names), dtype=np.int64)
+    for local_id, name in enumerate(local_names):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        remap[local_id] = ids[name]
+    return remap
+
+
+class TransactionLedger:
+    """Append-only columnar transaction store backed by NumPy files.
+
+    Each column lives in its own binary file under `directory`; categories
+    and merchants are dictionary-encoded as integer ids. Reads memory-map
+    the columns, and a date-sorted permutation (rebuilt only when rows were
+    added) turns any date range into a contiguous slice, so aggregations over
+    millions of rows are a handful of vectorized NumPy operations.
+    Amounts are signed: spending is negative, income positive.
+
+    Several ledgers (threads, server workers) may share a directory: each
+    flush merges the vocabulary on disk under a file lock before writing its
+    rows, so a name has the same id for every writer.
+    """
+
+    def __init__(self, directory: str, buffer_size: int = 50_000):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        os.makedirs(directory, exist_ok=True)
+
+        self.vocab_path = os.path.join(directory, "vocab.json")
+        self.lock_path = os.path.join(directory, ".lock")
+        self._set_vocab(*self._read_vocab())
+
+        self.buffer = {name: [] for name in COLUMNS}
+        self._columns = None
+        self._order = None
+
+    # === Writing ===
+
+    def append(self, when, amount: float, category: str, description: str = ""):
+        """Buffer one transaction; buffered rows are written in batches."""
+        self.buffer["date"].append(_to_day(when))
+        self.buffer["amount"].append(float(amount))
+        self.buffer["category"].append(self._encode(self.category_ids, self.categories, category))
+        self.buffer["merchant"].append(self._encode(self.merchant_ids, self.merchants, normalize_merchant(description)))
+        if len(self.buffer["amount"]) >= self.buffer_size:
+            self.flush()
+
+    def append_many(self, records):
+        """Append {date, amount, category, description} dicts."""
+        for record in records:
+            self.append(record.get("date"), record["amount"], record["category"], record.get("description", ""))
+
+    def _encode(self, ids: dict, names: list, name: str) -> int:
+        code = ids.get(name)
+        if code is None:
+            code = ids[name] = len(names)
+            names.append(name)
+        return code
+
+    def flush(self):
+        if not self.buffer["amount"]:
+            return
+        with _ledger_lock(self.lock_path):
+            # Another writer may have added names since this ledger loaded its vocabulary: names get the
+            # ids on disk, new ones are added after them, and the buffered ids are translated to match
+            categories, merchants = self._read_vocab()
+            remap_categories = _merge_names(categories, self.categories)
+            remap_merchants = _merge_names(merchants, self.merchants)
+            tmp_path = self.vocab_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"categories": categories, "merchants": merchants}, f)
+            os.replace(tmp_path, self.vocab_path)
+
+            self.buffer["category"] = remap_categories[np.asarray(self.buffer["category"], dtype=np.int64)]
+            self.buffer["merchant"] = remap_merchants[np.asarray(self.buffer["merchant"], dtype=np.int64)]
+            for name, dtype in COLUMNS.items():
+                with open(self._column_path(name), "ab") as f:
+                    np.asarray(self.buffer[name], dtype=dtype).tofile(f)
+                self.buffer[name] = []
+
+        self._set_vocab(categories, merchants)
+        self._columns = None
+        self._order = None
+
+    def _read_vocab(self):
+        if not os.path.exists(self.vocab_path):
+            return [], []
+        with open(self.vocab_path, encoding="utf-8") as f:
+            vocab = json.load(f)
+        return vocab["categories"], vocab["merchants"]
+
+    def _set_vocab(self, categories: list, merchants: list):
+        self.categories, self.merchants = categories, merchants
+        self.category_ids = {name: i for i, name in enumerate(categories)}
+        self.merchant_ids = {name: i for i, name in enumerate(merchants)}
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.bin")
+
+    # === Reading ===
+
+    def columns(self) -> dict:
+        """Memory-mapped columns (flushes pending rows first)."""
+        self.flush()
+        if self._columns is None:
+            self._columns = {}
+            # Rows other writers added come with names this ledger has not seen yet: map and reload together
+            with _ledger_lock(self.lock_path, shared=True):
+                for name, dtype in COLUMNS.items():
+                    path = self._column_path(name)
+                    if os.path.exists(path) and os.path.getsize(path):
+                        self._columns[name] = np.memmap(path, dtype=dtype, mode="r")
+                    else:
+                        self._columns[name] = np.empty(0, dtype=dtype)
+                self._set_vocab(*self._read_vocab())
+        return self._columns
+
+    def __len__(self) -> int:
+        return len(self.columns()["amount"])
+
+    def _date_order(self):
+        """(permutation, sorted dates); the permutation is None when rows are already in date order.
+
+        The permutation is cached on disk until new rows arrive.
+        """
+        if self._order is not None:
+            return self._order
+        dates = self.columns()["date"]
+        if len(dates) < 2 or not (dates[1:] < dates[:-1]).any():
+            self._order = (None, dates)
+            return self._order
+
+        order_path = os.path.join(self.directory, "date_order.npy")
+        order = np.load(order_path, mmap_mode="r") if os.path.exists(order_path) else None
+        if order is None or len(order) != len(dates):
+            order = np.argsort(dates, kind="stable")
+            np.save(order_path, order)
+        self._order = (order, dates[order])
+        return self._order
+
+    def select(self, start=None, end=None, category: str = None) -> dict:
+        """Rows with start <= date <= end (ISO strings), optionally for one category."""
+        order, sorted_dates = self._date_order()
+        lo = 0 if start is None else int(np.searchsorted(sorted_dates, _to_day(start), side="left"))
+        hi = len(sorted_dates) if end is None else int(np.searchsorted(sorted_dates, _to_day(end), side="right"))
+
+        columns = self.columns()
+        if order is None:
+            selected = {name: column[lo:hi] for name, column in columns.items()}
+        else:
+            rows = order[lo:hi]
+            selected = {name: column[rows] for name, column in columns.items()}
+
+        if category is not None:
+            code = self.category_ids.get(category, -1)
+            mask = selected["category"] == code
+            selected = {name: column[mask] for name, column in selected.items()}
+        return selected
+
+    def spend_by_category_by_month(self, start=None, end=None) -> dict:
+        """{category: {"YYYY-MM": spend}} with spending reported as positive amounts."""
+        rows = self.select(start, end)
+        if not len(rows["amount"]):
+            return {}
+        spend = np.where(rows["amount"] < 0, -rows["amount"], 0.0)
+        # Map days to months through a small per-day lookup table instead of converting every row
+        days = rows["date"].astype(np.int64)
+        first_day = days.min()
+        calendar = np.arange(first_day, days.max() + 1).astype("datetime64[D]").astype("datetime64[M]")
+        first_month = calendar[0]
+        month_index = (calendar - first_month).astype(np.int64)[days - first_day]
+        n_months = int((calendar[-1] - first_month).astype(np.int64)) + 1
+
+        totals = np.bincount(
+            rows["category"].astype(np.int64) * n_months + month_index,
+            weights=spend,
+            minlength=len(self.categories) * n_months,
+        ).reshape(len(self.categories), n_months)
+
+        report = {}
+        for category_id, month_id in zip(*np.nonzero(totals)):
+            month = str(first_month + np.timedelta64(int(month_id), "M"))
+            report.setdefault(self.categories[category_id], {})[month] = float(totals[category_id, month_id])
+        return report
+
+    def top_merchants(self, start=None, end=None, n: int = 10, category: str = None) -> list:
+        """[(merchant, spend)] for the `n` merchants with the most spending."""
+        rows = self.select(start, end, category)
+        if not len(rows["amount"]):
+            return []
+        spend = np.where(rows["amount"] < 0, -rows["amount"], 0.0)
+        totals = np.bincount(rows["merchant"], weights=spend, minlength=len(self.merchants))
+        n = min(n, len(totals))
+        top = np.argpartition(-totals, n - 1)[:n]
+        top = top[np.argsort(-totals[top])]
+        return [(self.merchants[i], float(totals[i])) for i in top if totals[i] > 0]
+
+    def rolling_average(self, window_days: int = 30, start=None, end=None, category: str = None) -> dict:
+        """Average daily spend over a trailing window, for every day in the range."""
+        rows = self.select(start, end, category)
+        if not len(rows["amount"]):
+            return {"start": start, "window_days": window_days, "daily_average": np.empty(0)}
+        spend = np.where(rows["amount"] < 0, -rows["amount"], 0.0)
+        first_day = _to_day(start) if start else rows["date"].min()
+        last_day = _to_day(end) if end else rows["date"].max()
+        day_index = (rows["date"] - first_day).astype(np.int64)
+        n_days = int((last_day - first_day).astype(np.int64)) + 1
+
+        daily = np.bincount(day_index, weights=spend, minlength=n_days)[:n_days]
+        cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+        days = np.arange(n_days)
+        window_start = np.maximum(days + 1 - window_days, 0)
+        averages = (cumulative[days + 1] - cumulative[window_start]) / (days + 1 - window_start)
+        return {"start": str(first_day), "window_days": window_days, "daily_average": averages}
+
+    def total_spend(self, start=None, end=None, category: str = None) -> float:
+        amounts = self.select(start, end, category)["amount"]
+        return float(-amounts[amounts < 0].sum())